@@ -0,0 +1,53 @@
+"""
+Compares cache row size and encode/decode time for one channel's video list
+(JSON text + pydantic validation vs. the binary codec, with and without zlib).
+
+Run from the repo root: python -m benchmarks.bench_cache_codec
+"""
+import json
+import timeit
+from datetime import datetime, timezone
+
+from cache_codec import BinaryCodec
+from youtube_client import Video, validate_videos
+
+ROUNDS = 2000
+
+def make_videos(n: int) -> list[Video]:
+    return [
+        Video(
+            title=f"I Built The World's Largest Thing #{i}", view_count=12_345_678 + i,
+            like_count=456_789 + i, comment_count=12_345 + i,
+            url=f"https://www.youtube.com/watch?v=vid{i:08d}", video_id=f"vid{i:08d}",
+            type="VOD", published_at=datetime(2024, 3, 1, 17, 0, 12, tzinfo=timezone.utc)
+        )
+        for i in range(n)
+    ]
+
+def bench_json(videos):
+    encode = lambda: json.dumps([v.to_json() for v in videos])
+    raw = encode()
+    decode = lambda: validate_videos(json.loads(raw))
+    return len(raw.encode()), encode, decode
+
+def bench_binary(videos, level):
+    codec = BinaryCodec(level=level)
+    encode = lambda: codec.encode(videos)
+    raw = encode()
+    decode = lambda: codec.decode(raw)
+    return len(raw), encode, decode
+
+def main():
+    for n in (3, 50):
+        videos = make_videos(n)
+        print(f"{n} videos per entry ({ROUNDS} rounds)")
+        print(f"  {'format':<14} {'bytes':>7} {'encode us':>10} {'decode us':>10}")
+        cases = [("json", bench_json(videos))]
+        cases += [(f"binary zlib={lvl}", bench_binary(videos, lvl)) for lvl in (0, 1, 6)]
+        for label, (size, encode, decode) in cases:
+            enc = timeit.timeit(encode, number=ROUNDS) / ROUNDS * 1e6
+            dec = timeit.timeit(decode, number=ROUNDS) / ROUNDS * 1e6
+            print(f"  {label:<14} {size:>7} {enc:>10.1f} {dec:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measures how long chart rendering stalls the event loop: inline matplotlib
+vs. the ChartPool worker processes, for a burst of /compare charts.
+
+Run from the repo root: python -m benchmarks.bench_chart_pool
+"""
+import asyncio
+import time
+from datetime import datetime
+
+from chart_pool import ChartPool
+from plotting import generate_comparison_chart
+from youtube_client import Video
+
+CHARTS = 8
+
+def make_data() -> list[dict]:
+    video = Video(
+        title="Top", view_count=1_234_567, like_count=1, comment_count=1,
+        url="url", video_id="v", type="VOD", published_at=datetime.now()
+    )
+    return [{'title': f'Channel {i}', 'videos': [video]} for i in range(4)]
+
+async def worst_stall(stop: asyncio.Event) -> float:
+    """Longest gap between 1 ms ticks, i.e. how long other updates would have waited."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        worst = max(worst, time.perf_counter() - start)
+    return worst
+
+async def measure(render) -> tuple[float, float]:
+    stop = asyncio.Event()
+    probe = asyncio.create_task(worst_stall(stop))
+    start = time.perf_counter()
+    await render()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await probe
+
+async def main():
+    data = make_data()
+    generate_comparison_chart(data)  # Warm the inline path too
+
+    async def inline():
+        for _ in range(CHARTS):
+            generate_comparison_chart(data)
+            await asyncio.sleep(0)
+
+    pool = ChartPool(workers=2, max_queue=CHARTS)
+    await pool.start()
+
+    async def pooled():
+        await asyncio.gather(*(pool.render(generate_comparison_chart, data) for _ in range(CHARTS)))
+
+    print(f"{CHARTS} comparison charts")
+    print(f"  {'mode':<8} {'total ms':>9} {'worst loop stall ms':>20}")
+    for label, render in (("inline", inline), ("pool x2", pooled)):
+        elapsed, stall = await measure(render)
+        print(f"  {label:<8} {elapsed * 1000:>9.0f} {stall * 1000:>20.0f}")
+    await asyncio.sleep(0.1)
+    print(f"  pool stats: {pool.stats()}")
+    pool.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
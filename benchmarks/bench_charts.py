@@ -0,0 +1,32 @@
+"""
+Compares comparison-chart render time and output size: the pyplot path vs.
+the reused object-oriented Agg canvas, as PNG and WebP.
+
+Run from the repo root: python -m benchmarks.bench_charts
+"""
+import timeit
+
+from plotting import _agg_chart, _pyplot_comparison_chart
+
+ROUNDS = 20
+NAMES = ["MrBeast", "PewDiePie", "Markiplier", "Dude Perfect", "Veritasium"]
+VALUES = [312_000_000, 98_500_000, 41_200_000, 77_000_000, 23_400_000]
+
+def main():
+    agg = _agg_chart()
+    cases = [
+        ("pyplot png 6", lambda: _pyplot_comparison_chart(NAMES, VALUES, 'png', 6)),
+        ("agg png 6", lambda: agg.render(NAMES, VALUES, 'png', 6)),
+        ("agg png 1", lambda: agg.render(NAMES, VALUES, 'png', 1)),
+        ("agg webp 4", lambda: agg.render(NAMES, VALUES, 'webp', 4)),
+        ("agg webp 0", lambda: agg.render(NAMES, VALUES, 'webp', 0)),
+    ]
+    print(f"5-channel comparison chart, {ROUNDS} rounds")
+    print(f"  {'backend':<14} {'ms/chart':>9} {'bytes':>8}")
+    for label, render in cases:
+        render()  # Warm up
+        ms = timeit.timeit(render, number=ROUNDS) / ROUNDS * 1000
+        print(f"  {label:<14} {ms:>9.1f} {len(render()):>8}")
+
+if __name__ == "__main__":
+    main()
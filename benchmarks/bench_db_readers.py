@@ -0,0 +1,96 @@
+"""
+Cache-read throughput with reads on the single writer connection vs. spread
+over a pool of read-only connections, under concurrent load. Runs with
+write-behind on, as the bot does, next to either a light stream of API-style
+writes (a quota_usage bump per call, the odd cache refresh) or bulk writes
+and prunes.
+
+Run from the repo root: python -m benchmarks.bench_db_readers
+(needs BOT_TOKEN / YOUTUBE_API_KEY set, any value, for config import)
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from database import Database
+
+ROWS = 2000
+CONCURRENCY = 64
+READS_PER_WORKER = 200
+
+async def run(read_pool_size: int, path: str, writes: str | None) -> tuple[float, float]:
+    """(reads/s, share of reads that had to go to the writer)."""
+    db = Database(path, write_behind=True, read_pool_size=read_pool_size)
+    await db.init_db()
+    done = False
+    on_writer = 0
+    pick_reader = db._reader
+
+    def counting_reader(table, keys=()):
+        nonlocal on_writer
+        conn = pick_reader(table, keys)
+        on_writer += conn is db.db
+        return conn
+    db._reader = counting_reader
+
+    async def worker():
+        for _ in range(READS_PER_WORKER):
+            await db.get_cache(f"vods:UC{random.randrange(ROWS)}")
+
+    async def api_writer():
+        # Each API call bumps quota_usage; every tenth refreshes a cached video list
+        i = 0
+        while not done:
+            await db.add_quota_usage("2024-01-01", 1)
+            if i % 10 == 0:
+                await db.set_cache(f"vods:UC{random.randrange(ROWS)}", [{"title": "x" * 60, "view_count": i}])
+            i += 1
+            await asyncio.sleep(0.001)
+
+    async def bulk_writer():
+        # Bulk writes + prunes, like a cache refresh burst next to the hourly prune
+        i = 0
+        while not done:
+            await db.db.executemany(
+                'INSERT OR REPLACE INTO cache (key, data, timestamp) VALUES (?, ?, ?)',
+                [(f"tmp:{i}:{n}", "x" * 500, 0) for n in range(500)]
+            )
+            await db.db.commit()
+            await db.prune_cache(ttl=3600)
+            i += 1
+
+    writer = {'api': api_writer, 'bulk': bulk_writer}.get(writes)
+    write_task = asyncio.create_task(writer()) if writer else None
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    done = True
+    if write_task:
+        await write_task
+    await db.close()
+    reads = CONCURRENCY * READS_PER_WORKER
+    return reads / elapsed, on_writer / reads
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = Database(path)
+        await db.init_db()
+        payload = [{"title": "x" * 60, "view_count": i} for i in range(3)]
+        for i in range(ROWS):
+            await db.set_cache(f"vods:UC{i}", payload)
+        await db.close()
+
+        print(f"get_cache throughput with write-behind, {CONCURRENCY} concurrent readers")
+        print(f"  {'connections':<12} {'reads only':>12} {'+ API writes':>13} {'on writer':>10} {'+ bulk writes':>14}")
+        for pool in (0, 1, 2, 4, 8):
+            label = "writer only" if pool == 0 else f"{pool} reader(s)"
+            idle, _ = await run(pool, path, writes=None)
+            api, api_on_writer = await run(pool, path, writes='api')
+            bulk, _ = await run(pool, path, writes='bulk')
+            print(f"  {label:<12} {idle:>12.0f} {api:>13.0f} {api_on_writer:>10.1%} {bulk:>14.0f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Compares videos.list payload size and parse time per channel (50 uploads)
+for the full snippet+statistics response vs. the field-masked one.
+
+Run from the repo root: python -m benchmarks.bench_payloads
+"""
+import json
+import timeit
+from datetime import datetime
+
+from youtube_client import Video, parse_video, validate_videos
+
+VIDEOS_PER_CHANNEL = 50
+ROUNDS = 200
+
+def full_item(i: int) -> dict:
+    """Roughly what videos.list returns for part='snippet,statistics' without a field mask."""
+    thumb = lambda size, w, h: {"url": f"https://i.ytimg.com/vi/vid{i:08d}/{size}.jpg", "width": w, "height": h}
+    return {
+        "kind": "youtube#video",
+        "etag": f"etag-{i:020d}",
+        "id": f"vid{i:08d}",
+        "snippet": {
+            "publishedAt": "2024-03-01T17:00:12Z",
+            "channelId": "UCxxxxxxxxxxxxxxxxxxxxxx",
+            "title": f"I Built The World's Largest Thing #{i}",
+            "description": ("Subscribe for more videos! Links, merch, sponsors and socials below.\n" * 25),
+            "thumbnails": {
+                "default": thumb("default", 120, 90),
+                "medium": thumb("mqdefault", 320, 180),
+                "high": thumb("hqdefault", 480, 360),
+                "standard": thumb("sddefault", 640, 480),
+                "maxres": thumb("maxresdefault", 1280, 720),
+            },
+            "channelTitle": "Some Creator",
+            "tags": [f"tag{t}" for t in range(20)],
+            "categoryId": "24",
+            "liveBroadcastContent": "none",
+            "defaultLanguage": "en",
+            "localized": {
+                "title": f"I Built The World's Largest Thing #{i}",
+                "description": ("Subscribe for more videos! Links, merch, sponsors and socials below.\n" * 25),
+            },
+            "defaultAudioLanguage": "en",
+        },
+        "statistics": {
+            "viewCount": str(1_000_000 + i),
+            "likeCount": str(50_000 + i),
+            "favoriteCount": "0",
+            "commentCount": str(4_000 + i),
+        },
+    }
+
+def masked_item(i: int) -> dict:
+    item = full_item(i)
+    return {
+        "id": item["id"],
+        "snippet": {"title": item["snippet"]["title"], "publishedAt": item["snippet"]["publishedAt"]},
+        "statistics": {k: item["statistics"][k] for k in ("viewCount", "likeCount", "commentCount")},
+    }
+
+def parse_validated(item: dict) -> Video:
+    """The previous parse path: full pydantic validation per video."""
+    stats = item.get('statistics', {})
+    snippet = item.get('snippet', {})
+    return validate_videos([dict(
+        title=snippet.get('title', 'Unknown'),
+        view_count=int(stats.get('viewCount', 0)),
+        like_count=int(stats.get('likeCount', 0)),
+        comment_count=int(stats.get('commentCount', 0)),
+        url=f"https://www.youtube.com/watch?v={item['id']}",
+        video_id=item['id'],
+        type='VOD',
+        published_at=datetime.fromisoformat(snippet['publishedAt'].replace('Z', '+00:00')),
+    )])[0]
+
+def main():
+    full = json.dumps({"kind": "youtube#videoListResponse", "etag": "x",
+                       "items": [full_item(i) for i in range(VIDEOS_PER_CHANNEL)]})
+    masked = json.dumps({"etag": "x", "items": [masked_item(i) for i in range(VIDEOS_PER_CHANNEL)]})
+
+    before = timeit.timeit(lambda: [parse_validated(it) for it in json.loads(full)["items"]], number=ROUNDS)
+    after = timeit.timeit(lambda: [parse_video(it, 'VOD') for it in json.loads(masked)["items"]], number=ROUNDS)
+
+    print(f"videos.list payload per channel ({VIDEOS_PER_CHANNEL} videos)")
+    print(f"  full:   {len(full):>8} bytes   {before / ROUNDS * 1000:7.3f} ms/parse")
+    print(f"  masked: {len(masked):>8} bytes   {after / ROUNDS * 1000:7.3f} ms/parse")
+    print(f"  size:   {len(full) / len(masked):.1f}x smaller, parse {before / after:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Time to pick a channel's top 3 videos by each metric: per-video Python metrics
+plus a full sort vs. ranking.top (one NumPy pass plus partial selection), from
+50 uploads up to an all-time index's worth of videos.
+
+Run from the repo root: python -m benchmarks.bench_ranking
+"""
+import random
+import time
+import timeit
+from datetime import datetime, timedelta, timezone
+
+import ranking
+from youtube_client import Video
+
+SIZES = (50, 1000, 5000)
+K = 3
+
+def make_videos(n: int) -> list[Video]:
+    rng = random.Random(n)
+    now = datetime.now(timezone.utc)
+    videos = []
+    for i in range(n):
+        views = int(rng.lognormvariate(11, 2))
+        videos.append(Video(
+            title=f"Video {i}", view_count=views, like_count=int(views * rng.uniform(0, 0.05)),
+            comment_count=int(views * rng.uniform(0, 0.005)), url=f"https://www.youtube.com/watch?v=v{i}",
+            video_id=f"v{i}", type="VOD", published_at=now - timedelta(days=rng.uniform(0, 3000)),
+        ))
+    return videos
+
+def python_top(videos: list[Video], sort: str, k: int, now: float) -> list[Video]:
+    """The straightforward version: a metric per video, then sorted()."""
+    def score(v):
+        if sort == 'engagement':
+            return (v.like_count + v.comment_count) / v.view_count if v.view_count else 0.0
+        if sort == 'daily':
+            return v.view_count / max((now - v.published_at.timestamp()) / 86400, ranking.MIN_AGE_DAYS)
+        return v.view_count
+    return sorted(videos, key=score, reverse=True)[:k]
+
+def main():
+    now = time.time()
+    print(f"top {K} per channel, us per ranking")
+    print(f"  {'videos':>6} {'metric':<11} {'python sort':>12} {'numpy':>9}")
+    for n in SIZES:
+        videos = make_videos(n)
+        rounds = max(20, 20000 // n)
+        for sort in ranking.SORT_METRICS:
+            expected = [v.video_id for v in python_top(videos, sort, K, now)]
+            assert [r.video.video_id for r in ranking.top(videos, sort, K, now)] == expected
+            py = timeit.timeit(lambda: python_top(videos, sort, K, now), number=rounds) / rounds * 1e6
+            np_ = timeit.timeit(lambda: ranking.top(videos, sort, K, now), number=rounds) / rounds * 1e6
+            print(f"  {n:>6} {sort:<11} {py:>12.1f} {np_:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Construction cost and per-object memory of one 50-video batch: the pydantic
+model Video used to be vs. the tuple-backed Video record, for each way videos
+get built (trusted values from the API parser, dict rows from a JSON cache hit,
+binary cache rows).
+
+Run from the repo root: python -m benchmarks.bench_video_record
+"""
+import json
+import timeit
+import tracemalloc
+from datetime import datetime, timezone
+
+from pydantic import BaseModel
+
+from cache_codec import BinaryCodec
+from youtube_client import Video, validate_videos
+
+BATCH = 50
+ROUNDS = 2000
+
+class ModelVideo(BaseModel):
+    """The previous definition of Video."""
+    title: str
+    view_count: int
+    like_count: int
+    comment_count: int
+    url: str
+    video_id: str
+    type: str
+    published_at: datetime
+
+def make_fields(n: int) -> list[dict]:
+    published = datetime(2024, 3, 1, 17, 0, 12, tzinfo=timezone.utc)
+    return [
+        dict(
+            title=f"I Built The World's Largest Thing #{i}", view_count=12_345_678 + i,
+            like_count=456_789 + i, comment_count=12_345 + i,
+            url=f"https://www.youtube.com/watch?v=vid{i:08d}", video_id=f"vid{i:08d}",
+            type="VOD", published_at=published,
+        )
+        for i in range(n)
+    ]
+
+def per_object_bytes(build) -> float:
+    """
+    Bytes allocated per video by build(): the object, plus any field values it had
+    to create (decoded strings, datetimes). Trusted values are shared inputs.
+    """
+    build()  # Warm up lazily built schemas and caches
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return (allocated - 8 * len(objects)) / len(objects)  # Minus the result list's slots
+
+def main():
+    fields = make_fields(BATCH)
+    rows = json.loads(json.dumps([Video(**f).to_json() for f in fields]))  # What a JSON cache hit yields
+    raw = BinaryCodec().encode([Video(**f) for f in fields])
+
+    cases = [
+        ("trusted values", [
+            ("model", lambda: [ModelVideo(**f) for f in fields]),
+            ("model_construct", lambda: [ModelVideo.model_construct(**f) for f in fields]),
+            ("record", lambda: [Video(**f) for f in fields]),
+        ]),
+        ("JSON cache rows", [
+            ("model per item", lambda: [ModelVideo(**r) for r in rows]),
+            ("record, batch", lambda: validate_videos(rows)),
+        ]),
+        ("binary cache row", [
+            ("record", lambda: BinaryCodec().decode(raw)),
+        ]),
+    ]
+
+    print(f"{BATCH}-video batch ({ROUNDS} rounds)")
+    print(f"  {'source':<18} {'built as':<16} {'us/batch':>9} {'bytes/obj':>10}")
+    for source, builds in cases:
+        for label, build in builds:
+            us = timeit.timeit(build, number=ROUNDS) / ROUNDS * 1e6
+            size = per_object_bytes(build)
+            print(f"  {source:<18} {label:<16} {us:>9.1f} {size:>10.0f}")
+
+if __name__ == "__main__":
+    main()
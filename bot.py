@@ -1,3 +1,6 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
@@ -5,44 +8,194 @@ from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
 from config import settings
+from cache_codec import make_codec
+from cache_backend import KVCacheBackend
 from database import Database
 from youtube_client import YoutubeClient
+from quota import QuotaBudget
+from video_index import VideoIndex
 from handlers import router
+from services import ChannelService
+from memory_cache import MemoryCache
+from render_cache import RenderCache
+from chart_pool import ChartPool
 from middlewares import LoggingMiddleware, ThrottlingMiddleware
+from webhook import WebhookServer, run_webhook
+from utils import StartupTimer
 
 logging.basicConfig(level=logging.INFO)
 
-async def cache_pruner(db: Database):
+startup_timer = StartupTimer(started=_IMPORT_STARTED)
+startup_timer.record('imports', _IMPORT_STARTED)
+
+async def cache_pruner(db: Database, client: YoutubeClient):
     while True:
         await asyncio.sleep(3600)  # Run every hour
         try:
-            await db.prune_cache()
-            logging.info("Cache pruned.")
+            report = await db.prune(
+                # Keep expired rows for a while so they can be served stale when quota runs out
+                cache_ttl=settings.CACHE_RETENTION_HOURS * 3600,
+                message_state_ttl=settings.MESSAGE_STATE_RETENTION_DAYS * 86400,
+                # /compare records are kept for the popularity window whether or not pre-warming runs
+                channel_requests_ttl=settings.PREWARM_WINDOW_DAYS * 86400,
+                batch_size=settings.PRUNE_BATCH_SIZE,
+                pause=settings.PRUNE_BATCH_PAUSE_MS / 1000,
+            )
+            logging.info(f"Pruned expired rows: {report}")
+            logging.info(f"Video batching: {client.video_batcher.stats()}")
+            logging.info(f"ETag revalidation: {client.etag_stats()}")
+            logging.info(f"Channel resolution tiers: {dict(ChannelService.resolution_stats)}")
+            logging.info(f"Cache tiers: {ChannelService.cache_stats()}")
         except Exception as e:
             logging.error(f"Error pruning cache: {e}")
 
-async def on_startup(bot: Bot, db: Database, client: YoutubeClient):
-    await db.init_db()
+async def cache_prewarmer(db: Database, client: YoutubeClient, video_index: VideoIndex | None):
+    """Keeps favorite and frequently compared channels warm by refreshing them before they expire."""
+    service = ChannelService(db, client, video_index)
+    while True:
+        await asyncio.sleep(settings.PREWARM_INTERVAL_SECONDS)
+        try:
+            budget = service.prewarm_budget(settings.PREWARM_BUDGET_UNITS, settings.PREWARM_DAILY_FRACTION)
+            if budget <= 0:
+                logging.info("Pre-warming skipped: its daily share of the API quota is used up.")
+                continue
+            window = settings.PREWARM_WINDOW_DAYS * 86400
+            channel_ids = await service.hot_channels(window, settings.PREWARM_MAX_CHANNELS)
+            refreshed = await service.prewarm(
+                channel_ids,
+                budget_units=budget,
+                # Anything expiring before the next run gets refreshed in this one
+                lead=settings.PREWARM_INTERVAL_SECONDS * 2,
+                spacing=settings.PREWARM_SPACING_SECONDS,
+            )
+            logging.info(f"Pre-warmed {refreshed} cache entries for {len(channel_ids)} hot channels.")
+        except Exception as e:
+            logging.error(f"Error pre-warming cache: {e}")
+
+async def warm_up(client: YoutubeClient):
+    """Loads what startup deferred (matplotlib, the discovery client) once updates are flowing."""
+    started = time.perf_counter()
+    try:
+        if not ChannelService.chart_pool:
+            # Charts render in this process; the pool's workers warm themselves
+            import plotting
+            await asyncio.to_thread(plotting.warm_up)
+        if client.transport == 'discovery':
+            await asyncio.to_thread(client.warm_up)
+        logging.info(f"Background warm-up done in {(time.perf_counter() - started) * 1000:.0f}ms")
+    except Exception as e:
+        logging.error(f"Error during warm-up: {e}")
+
+async def on_startup(bot: Bot, db: Database, client: YoutubeClient, video_index: VideoIndex | None = None):
+    with startup_timer.phase('init_db'):
+        await db.init_db()
+    if ChannelService.chart_pool:
+        with startup_timer.phase('chart_pool'):
+            await ChannelService.chart_pool.start()
+    if client.quota:
+        with startup_timer.phase('quota_load'):
+            await client.quota.load()
     # Start background tasks
-    asyncio.create_task(cache_pruner(db))
+    asyncio.create_task(cache_pruner(db, client))
+    if settings.PREWARM_ENABLED:
+        asyncio.create_task(cache_prewarmer(db, client, video_index))
+    asyncio.create_task(warm_up(client))
+    logging.info(f"Startup timings: {startup_timer.report()}")
     logging.info("Bot started.")
 
 async def on_shutdown(bot: Bot, db: Database, client: YoutubeClient):
+    # Closing flushes any pending group commit first
     await db.close()
-    client.close()
+    if ChannelService.cache_backend:
+        await ChannelService.cache_backend.close()
+    if ChannelService.chart_pool:
+        ChannelService.chart_pool.close()
+    await client.aclose()
     logging.info("Bot stopped.")
 
 async def main():
-    # Initialize dependencies
-    db = Database()
-    client = YoutubeClient(api_key=settings.YOUTUBE_API_KEY)
+    with startup_timer.phase('dependencies'):
+        client, db = build_dependencies()
+
+    with startup_timer.phase('dispatcher'):
+        bot, dp = build_dispatcher(db, client)
 
+    if settings.DELIVERY_MODE == "webhook":
+        server = WebhookServer(
+            dp, bot,
+            secret_token=settings.WEBHOOK_SECRET,
+            path=settings.WEBHOOK_PATH,
+            max_in_flight=settings.WEBHOOK_MAX_IN_FLIGHT,
+            drain_timeout=settings.WEBHOOK_DRAIN_SECONDS,
+        )
+        await run_webhook(dp, bot, server, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT, url=settings.WEBHOOK_URL)
+        return
+
+    logging.info("Starting polling...")
+    await dp.start_polling(bot)
+
+def build_dependencies() -> tuple[YoutubeClient, Database]:
+    codec = make_codec(settings.CACHE_CODEC, level=settings.CACHE_COMPRESSION_LEVEL)
+    db = Database(
+        write_behind=settings.DB_WRITE_BEHIND,
+        flush_interval=settings.DB_FLUSH_INTERVAL_MS / 1000,
+        flush_max_pending=settings.DB_FLUSH_MAX_PENDING,
+        read_pool_size=settings.DB_READ_POOL_SIZE,
+        codec=codec,
+    )
+    if settings.CACHE_BACKEND_URL:
+        ChannelService.cache_backend = KVCacheBackend.from_url(
+            settings.CACHE_BACKEND_URL,
+            codec=codec,
+            # Expired entries stay around for stale serving, as with the SQLite pruner
+            retention=settings.CACHE_RETENTION_HOURS * 3600,
+        )
+    ChannelService.memory_cache = MemoryCache(
+        max_entries=settings.MEMORY_CACHE_MAX_ENTRIES,
+        max_bytes=settings.MEMORY_CACHE_MAX_MB * 1024 * 1024,
+    )
+    ChannelService.render_cache = RenderCache(max_bytes=settings.RENDER_CACHE_MAX_MB * 1024 * 1024)
+    if settings.CHART_WORKERS > 0:
+        ChannelService.chart_pool = ChartPool(
+            workers=settings.CHART_WORKERS,
+            max_queue=settings.CHART_QUEUE_DEPTH,
+            timeout=settings.CHART_TIMEOUT_SECONDS,
+        )
+    ChannelService.stale_grace = settings.STALE_GRACE_SECONDS
+    ChannelService.max_staleness = settings.MAX_STALENESS_SECONDS
+    quota = QuotaBudget(
+        db,
+        daily_limit=settings.YOUTUBE_DAILY_QUOTA,
+        background_reserve=settings.QUOTA_BACKGROUND_RESERVE,
+        search_floor=settings.QUOTA_SEARCH_FLOOR,
+    )
+    client = YoutubeClient(
+        api_key=settings.YOUTUBE_API_KEY,
+        transport=settings.YOUTUBE_TRANSPORT,
+        max_concurrency=settings.YOUTUBE_MAX_CONCURRENCY,
+        base_url=settings.YOUTUBE_API_URL,
+        batch_window=settings.VIDEO_BATCH_WINDOW_MS / 1000,
+        batch_max_size=settings.VIDEO_BATCH_MAX_SIZE,
+        quota=quota,
+        combined_uploads=settings.COMBINED_UPLOADS,
+        shorts_max_duration=settings.SHORTS_MAX_DURATION,
+        etag_store=db if settings.ETAG_REVALIDATION else None,
+    )
+    return client, db
+
+def build_dispatcher(db: Database, client: YoutubeClient) -> tuple[Bot, Dispatcher]:
     # Initialize Bot and Dispatcher
     bot = Bot(token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
     dp = Dispatcher()
 
+    video_index = None
+    if settings.RANKING_SCOPE == "all_time":
+        video_index = VideoIndex(
+            db, client, pages_per_visit=settings.INDEX_PAGES_PER_VISIT, candidates=settings.RANKING_CANDIDATES
+        )
+
     # Inject dependencies via workflow_data
-    dp.workflow_data.update({"db": db, "client": client})
+    dp.workflow_data.update({"db": db, "client": client, "video_index": video_index})
 
     # Register events
     dp.startup.register(on_startup)
@@ -54,9 +207,7 @@ async def main():
 
     # Register routers
     dp.include_router(router)
-
-    logging.info("Starting polling...")
-    await dp.start_polling(bot)
+    return bot, dp
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import logging
+import struct
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from cache_codec import CacheDecodeError, JsonCodec
+
+class CacheBackend:
+    """
+    Where ChannelService keeps cached API results and the name -> channel map.
+
+    Entries are (data, timestamp) pairs; freshness is decided by the caller from the
+    timestamp, so expired entries can still be served stale. `ttl` on writes is a
+    hint for how long the entry is worth keeping at all (None = backend default).
+    """
+    async def get_entry(self, key: str):
+        """(data, timestamp) regardless of age, or None."""
+        raise NotImplementedError
+
+    async def get_entries(self, keys: list[str]) -> dict:
+        """{key: (data, timestamp)} for the keys that exist."""
+        raise NotImplementedError
+
+    async def set(self, key: str, data, ttl: float | None = None):
+        raise NotImplementedError
+
+    async def get_channel(self, name: str):
+        """(channel_id, title, last_updated) or None."""
+        raise NotImplementedError
+
+    async def set_channel(self, name: str, channel_id: str, title: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class SqliteCacheBackend(CacheBackend):
+    """The per-process default: the `cache` and `channel_map` tables, pruned by Database.prune."""
+    def __init__(self, db):
+        self.db = db
+
+    async def get_entry(self, key: str):
+        return await self.db.get_cache_entry(key)
+
+    async def get_entries(self, keys: list[str]) -> dict:
+        return await self.db.get_cache_entries(keys)
+
+    async def set(self, key: str, data, ttl: float | None = None):
+        await self.db.set_cache(key, data)
+
+    async def get_channel(self, name: str):
+        return await self.db.get_channel_id(name)
+
+    async def set_channel(self, name: str, channel_id: str, title: str):
+        await self.db.set_channel_id(name, channel_id, title)
+
+class KVError(Exception):
+    """Error reply from the key-value server."""
+
+class RespConnection:
+    """
+    Minimal asyncio client for the Redis wire protocol (RESP2).
+    Commands from concurrent callers are written back to back without waiting
+    for replies; replies arrive in order and are matched up FIFO by a reader task.
+    """
+    def __init__(self, host: str = 'localhost', port: int = 6379, password: str | None = None,
+                 db: int = 0, timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._waiters: deque[asyncio.Future] = deque()
+        self._connect_lock = asyncio.Lock()
+
+    @staticmethod
+    def _pack(args) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            elif isinstance(arg, (int, float)):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout
+            )
+            self._reader, self._writer = reader, writer
+            self._read_task = asyncio.create_task(self._read_replies(reader))
+            setup = []
+            if self.password:
+                setup.append(('AUTH', self.password))
+            if self.db:
+                setup.append(('SELECT', self.db))
+            if setup:
+                await self.pipeline(setup)
+
+    async def _read_reply(self, reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            return KVError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [await self._read_reply(reader) for _ in range(length)]
+        raise ConnectionError(f"unexpected reply {line!r}")
+
+    async def _read_replies(self, reader):
+        try:
+            while True:
+                reply = await self._read_reply(reader)
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    if isinstance(reply, KVError):
+                        waiter.set_exception(reply)
+                    else:
+                        waiter.set_result(reply)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._reset(e if isinstance(e, OSError) else ConnectionError(str(e) or type(e).__name__))
+
+    def _reset(self, error: Exception):
+        """Fails everything in flight; the next command reconnects."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(error)
+
+    async def pipeline(self, commands: list[tuple]) -> list:
+        """Sends all commands in one write and returns their replies in order."""
+        if self._writer is None:
+            await self._connect()
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in commands]
+        self._waiters.extend(futures)
+        self._writer.write(b''.join(self._pack(args) for args in commands))
+        try:
+            await self._writer.drain()
+            return await asyncio.wait_for(asyncio.gather(*futures), self.timeout)
+        except asyncio.TimeoutError:
+            # Replies may still arrive for these; drop the connection rather than mismatch them
+            self._reset(ConnectionError("timed out waiting for reply"))
+            raise ConnectionError("timed out waiting for reply")
+
+    async def execute(self, *args):
+        return (await self.pipeline([args]))[0]
+
+    async def close(self):
+        if self._read_task:
+            self._read_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+class KVCacheBackend(CacheBackend):
+    """
+    Shared cache in a Redis-compatible server, so several bot replicas share one warm cache.
+
+    Values are an 8-byte write timestamp followed by the codec's encoding. Entries
+    expire natively after `retention` seconds (or the ttl given on write); channel map
+    entries after `channel_retention`. Server errors degrade to cache misses and
+    dropped writes instead of failing the request.
+    """
+    _timestamp = struct.Struct('<d')
+
+    def __init__(self, connection: RespConnection, codec=None, prefix: str = 'vantage:',
+                 retention: float = 48 * 3600, channel_retention: float = 60 * 86400):
+        self.conn = connection
+        self.codec = codec or JsonCodec()
+        self.prefix = prefix
+        self.retention = retention
+        self.channel_retention = channel_retention
+        self.errors = 0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> 'KVCacheBackend':
+        """redis://[:password@]host[:port][/db]"""
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip('/') or 0)
+        connection = RespConnection(parsed.hostname or 'localhost', parsed.port or 6379, parsed.password, db)
+        return cls(connection, **kwargs)
+
+    def _encode(self, data) -> bytes:
+        raw = self.codec.encode(data)
+        if isinstance(raw, str):
+            raw = raw.encode()
+        return self._timestamp.pack(time.time()) + raw
+
+    def _decode(self, value: bytes):
+        (timestamp,) = self._timestamp.unpack_from(value)
+        return self.codec.decode(value[self._timestamp.size:]), timestamp
+
+    def _failed(self, op: str, e: Exception):
+        self.errors += 1
+        logging.warning(f"Shared cache {op} failed: {e}")
+
+    async def get_entry(self, key: str):
+        return (await self.get_entries([key])).get(key)
+
+    async def get_entries(self, keys: list[str]) -> dict:
+        if not keys:
+            return {}
+        try:
+            values = await self.conn.execute('MGET', *(self.prefix + key for key in keys))
+        except (OSError, KVError) as e:
+            self._failed('read', e)
+            return {}
+        entries = {}
+        for key, value in zip(keys, values):
+            if value is None:
+                continue
+            try:
+                entries[key] = self._decode(value)
+            except (CacheDecodeError, ValueError, struct.error) as e:
+                logging.warning(f"Unreadable shared cache entry {key}: {e}")
+        return entries
+
+    async def set(self, key: str, data, ttl: float | None = None):
+        expire = max(1, int(ttl if ttl is not None else self.retention))
+        try:
+            await self.conn.execute('SET', self.prefix + key, self._encode(data), 'EX', expire)
+        except (OSError, KVError) as e:
+            self._failed('write', e)
+
+    async def get_channel(self, name: str):
+        try:
+            value = await self.conn.execute('GET', f"{self.prefix}channel:{name.lower()}")
+        except (OSError, KVError) as e:
+            self._failed('read', e)
+            return None
+        if value is None:
+            return None
+        channel_id, title, last_updated = json.loads(value)
+        return channel_id, title, last_updated
+
+    async def set_channel(self, name: str, channel_id: str, title: str):
+        value = json.dumps([channel_id, title, time.time()])
+        try:
+            await self.conn.execute(
+                'SET', f"{self.prefix}channel:{name.lower()}", value, 'EX', int(self.channel_retention)
+            )
+        except (OSError, KVError) as e:
+            self._failed('write', e)
+
+    async def close(self):
+        await self.conn.close()
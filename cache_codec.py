@@ -0,0 +1,148 @@
+import functools
+import json
+import struct
+import zlib
+from datetime import datetime, timezone
+from typing import Any
+
+from youtube_client import Video
+
+class CacheDecodeError(ValueError):
+    """Raised for cache rows this build can't read (corrupt, or written by a newer format)."""
+
+# Builds a Video straight from a field tuple, skipping the keyword-argument __new__
+_make_video = functools.partial(tuple.__new__, Video)
+
+def _jsonable(data: Any) -> Any:
+    if isinstance(data, list) and data and isinstance(data[0], Video):
+        return [v.to_json() for v in data]
+    return data
+
+class JsonCodec:
+    """The original format: JSON text. Video lists come back as plain dicts."""
+    name = 'json'
+
+    def encode(self, data: Any) -> str:
+        return json.dumps(_jsonable(data))
+
+    def decode(self, raw: str | bytes) -> Any:
+        return json.loads(raw)
+
+class BinaryCodec:
+    """
+    Compact binary rows:
+
+        magic (2) | version (1) | flags (1) | kind (1) | payload
+
+    Video lists (KIND_VIDEOS) are a count followed by fixed-order records with
+    integer stats and an epoch-seconds timestamp; the URL is rebuilt from the ID
+    unless it differs from the canonical one. Anything else is stored as JSON
+    (KIND_JSON). Payloads over `compress_min_size` bytes are zlib-compressed
+    when `level` > 0.
+
+    Decoding trusts its own rows: videos are built without validation.
+    TEXT rows from before this codec still decode as JSON.
+    """
+    name = 'binary'
+
+    MAGIC = b'\xa7V'
+    VERSION = 1
+    FLAG_ZLIB = 0x01
+    KIND_JSON = 0
+    KIND_VIDEOS = 1
+
+    _header = struct.Struct('<2sBBB')
+    _count = struct.Struct('<I')
+    # views, likes, comments, published_at (epoch s), is_short, len(title), len(video_id), len(url)
+    _record = struct.Struct('<qqqqBHHH')
+
+    def __init__(self, level: int = 1, compress_min_size: int = 256):
+        self.level = level
+        self.compress_min_size = compress_min_size
+
+    def encode(self, data: Any) -> bytes:
+        if isinstance(data, list) and data and isinstance(data[0], Video):
+            kind, payload = self.KIND_VIDEOS, self._pack_videos(data)
+        else:
+            kind, payload = self.KIND_JSON, json.dumps(data).encode()
+        flags = 0
+        if self.level > 0 and len(payload) > self.compress_min_size:
+            payload = zlib.compress(payload, self.level)
+            flags |= self.FLAG_ZLIB
+        return self._header.pack(self.MAGIC, self.VERSION, flags, kind) + payload
+
+    def decode(self, raw: str | bytes) -> Any:
+        if isinstance(raw, str):
+            return json.loads(raw)  # Legacy JSON row
+        if len(raw) < self._header.size:
+            raise CacheDecodeError("truncated cache row")
+        magic, version, flags, kind = self._header.unpack_from(raw)
+        if magic != self.MAGIC or version > self.VERSION:
+            raise CacheDecodeError(f"unsupported cache row (magic={magic!r}, version={version})")
+        payload = memoryview(raw)[self._header.size:]
+        if flags & self.FLAG_ZLIB:
+            try:
+                payload = zlib.decompress(payload)
+            except zlib.error as e:
+                raise CacheDecodeError(str(e)) from e
+        if kind == self.KIND_VIDEOS:
+            return self._unpack_videos(payload)
+        if kind == self.KIND_JSON:
+            return json.loads(bytes(payload))
+        raise CacheDecodeError(f"unknown cache row kind {kind}")
+
+    @staticmethod
+    def _canonical_url(video_id: str, is_short: bool) -> str:
+        if is_short:
+            return f"https://www.youtube.com/shorts/{video_id}"
+        return f"https://www.youtube.com/watch?v={video_id}"
+
+    def _pack_videos(self, videos: list[Video]) -> bytes:
+        parts = [self._count.pack(len(videos))]
+        for v in videos:
+            is_short = v.type == 'Short'
+            title = v.title.encode()
+            video_id = v.video_id.encode()
+            url = b'' if v.url == self._canonical_url(v.video_id, is_short) else v.url.encode()
+            published = v.published_at
+            if published.tzinfo is None:
+                published = published.replace(tzinfo=timezone.utc)
+            parts.append(self._record.pack(
+                v.view_count, v.like_count, v.comment_count, int(published.timestamp()),
+                is_short, len(title), len(video_id), len(url)
+            ))
+            parts += (title, video_id, url)
+        return b''.join(parts)
+
+    def _unpack_videos(self, payload) -> list[Video]:
+        buf = bytes(payload)
+        (count,) = self._count.unpack_from(buf)
+        offset = self._count.size
+        record = self._record
+        utc = timezone.utc
+        make = _make_video
+        videos = []
+        try:
+            for _ in range(count):
+                views, likes, comments, ts, is_short, title_len, id_len, url_len = record.unpack_from(buf, offset)
+                offset += record.size
+                title = buf[offset:offset + title_len].decode()
+                offset += title_len
+                video_id = buf[offset:offset + id_len].decode()
+                offset += id_len
+                url = buf[offset:offset + url_len].decode() if url_len else self._canonical_url(video_id, is_short)
+                offset += url_len
+                videos.append(make((
+                    title, views, likes, comments, url, video_id,
+                    'Short' if is_short else 'VOD', datetime.fromtimestamp(ts, utc),
+                )))
+        except (struct.error, UnicodeDecodeError) as e:
+            raise CacheDecodeError(str(e)) from e
+        return videos
+
+def make_codec(name: str, level: int = 1):
+    if name == 'json':
+        return JsonCodec()
+    if name == 'binary':
+        return BinaryCodec(level=level)
+    raise ValueError(f"Unknown cache codec: {name}")
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class ChartPoolSaturated(Exception):
+    """All workers are busy and the queue is full; the caller should reply without a chart."""
+
+def _warm_worker():
+    # Pay for the matplotlib import (and font cache load) once per worker, not on the first chart
+    import plotting
+    plotting.warm_up()
+
+def _ping() -> int:
+    return 0
+
+def _run(func, args: tuple, submitted: float):
+    started = time.time()
+    result = func(*args)
+    return result, started - submitted, time.time() - started
+
+def _percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+class ChartPool:
+    """
+    Renders charts in `workers` pre-warmed processes, keeping matplotlib off the event loop.
+
+    At most `workers + max_queue` renders are admitted at once; beyond that render()
+    raises ChartPoolSaturated right away. A render not done within `timeout` raises
+    asyncio.TimeoutError; if it was still queued it is dropped, otherwise the worker
+    finishes it in the background and it stays counted until then. Queue wait and
+    render time of recent renders are kept for stats().
+
+    If a worker dies the executor breaks and every render on it raises
+    BrokenProcessPool; the executor is then replaced, so later renders get fresh workers.
+    """
+    def __init__(self, workers: int = 2, max_queue: int = 4, timeout: float = 10.0, samples: int = 200):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.restarts = 0
+        self.queue_waits = deque(maxlen=samples)
+        self.render_times = deque(maxlen=samples)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: forking a process that runs an event loop and SQLite threads isn't safe
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_warm_worker,
+        )
+
+    async def start(self):
+        self._executor = self._new_executor()
+        loop = asyncio.get_running_loop()
+        # Workers start lazily; one task each gets them all running and warm now
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _ping) for _ in range(self.workers)))
+
+    def _done(self, future):
+        self.in_flight -= 1
+        if future.cancelled():
+            return  # Timed out while still queued
+        if future.exception() is not None:
+            self.failed += 1
+            return
+        _, queue_wait, render_time = future.result()
+        self.completed += 1
+        self.queue_waits.append(queue_wait)
+        self.render_times.append(render_time)
+
+    async def render(self, func, *args):
+        """Runs func(*args) in a worker and returns its result."""
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise ChartPoolSaturated()
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            future = executor.submit(_run, func, args, time.time())
+        except BrokenProcessPool:
+            self.failed += 1
+            self._restart(executor)
+            raise
+        self.in_flight += 1
+        future.add_done_callback(lambda f: loop.is_closed() or loop.call_soon_threadsafe(self._done, f))
+        try:
+            result, _, _ = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logging.warning(f"Chart render timed out after {self.timeout}s")
+            raise
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+        return result
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        """Replaces a broken executor, once, however many renders saw it break."""
+        if self._executor is not broken:
+            return
+        logging.error("Chart worker died, restarting the chart pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_executor()
+        self.restarts += 1
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'failed': self.failed,
+            'restarts': self.restarts,
+            'queue_wait_p50_ms': round(_percentile(self.queue_waits, 0.5) * 1000, 1),
+            'queue_wait_p95_ms': round(_percentile(self.queue_waits, 0.95) * 1000, 1),
+            'render_p50_ms': round(_percentile(self.render_times, 0.5) * 1000, 1),
+            'render_p95_ms': round(_percentile(self.render_times, 0.95) * 1000, 1),
+        }
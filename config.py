@@ -7,7 +7,58 @@ load_dotenv()
 class Settings(BaseSettings):
     BOT_TOKEN: str = Field(..., description="Telegram Bot Token")
     YOUTUBE_API_KEY: str = Field(..., description="YouTube Data API Key")
+    DELIVERY_MODE: str = Field("polling", description="How updates arrive: 'polling' or 'webhook' (embedded HTTP server)")
+    WEBHOOK_URL: str = Field("", description="Public HTTPS base URL Telegram posts to; registered on startup when set")
+    WEBHOOK_PATH: str = Field("/webhook", description="Path updates are posted to")
+    WEBHOOK_SECRET: str = Field("", description="Secret token Telegram must send with every update; required in webhook mode (A-Z, a-z, 0-9, _, -)")
+    WEBHOOK_HOST: str = Field("0.0.0.0", description="Address the webhook server listens on")
+    WEBHOOK_PORT: int = Field(8080, description="Port the webhook server listens on")
+    WEBHOOK_MAX_IN_FLIGHT: int = Field(100, description="Updates handled at once; more are refused with 503 for Telegram to retry")
+    WEBHOOK_DRAIN_SECONDS: float = Field(25.0, description="On shutdown, how long in-flight updates may finish before they're cancelled")
     DB_PATH: str = Field("bot_data.db", description="Path to SQLite database")
+    CACHE_BACKEND_URL: str = Field("", description="redis://host:port/db of a cache shared by all replicas (empty = local SQLite)")
+    CACHE_CODEC: str = Field("binary", description="Encoding of cache rows: 'binary' or 'json' (old rows stay readable either way)")
+    CACHE_COMPRESSION_LEVEL: int = Field(1, description="zlib level for binary cache rows (0 = no compression)")
+    DB_READ_POOL_SIZE: int = Field(2, description="Read-only SQLite connections reads are spread over (0 = read on the writer)")
+    DB_WRITE_BEHIND: bool = Field(True, description="Group-commit database writes instead of committing each one")
+    DB_FLUSH_INTERVAL_MS: int = Field(50, description="Max delay before pending writes are committed")
+    DB_FLUSH_MAX_PENDING: int = Field(200, description="Commit immediately once this many writes are pending")
+    YOUTUBE_TRANSPORT: str = Field("discovery", description="'discovery' (googleapiclient in threads) or 'rest' (native aiohttp)")
+    YOUTUBE_MAX_CONCURRENCY: int = Field(20, description="Max concurrent YouTube API connections for the rest transport")
+    VIDEO_BATCH_WINDOW_MS: float = Field(5.0, description="How long videos.list lookups are collected before a batch is sent")
+    VIDEO_BATCH_MAX_SIZE: int = Field(50, description="Max video IDs per batched videos.list call (API limit is 50)")
+    YOUTUBE_DAILY_QUOTA: int = Field(10000, description="Daily YouTube API quota in units")
+    QUOTA_BACKGROUND_RESERVE: float = Field(0.2, description="Fraction of the daily quota background jobs may not touch")
+    QUOTA_SEARCH_FLOOR: float = Field(0.1, description="Refuse search.list calls once less than this fraction is left")
+    CACHE_RETENTION_HOURS: int = Field(48, description="How long expired cache rows are kept around for stale serving")
+    MESSAGE_STATE_RETENTION_DAYS: int = Field(7, description="How long /compare messages keep working mode-switch buttons")
+    PRUNE_BATCH_SIZE: int = Field(500, description="Rows deleted per pruning transaction")
+    PRUNE_BATCH_PAUSE_MS: int = Field(10, description="Pause between pruning batches so other writes get through")
+    COMBINED_UPLOADS: bool = Field(False, description="Classify Shorts/VODs from one uploads fetch instead of a 100-unit Shorts search")
+    SHORTS_MAX_DURATION: int = Field(60, description="Uploads at most this many seconds long count as Shorts in combined mode")
+    ETAG_REVALIDATION: bool = Field(True, description="Revalidate uploads playlist pages with If-None-Match")
+    RANKING_SCOPE: str = Field("recent", description="'recent' ranks the last 50 uploads, 'all_time' uses the crawled video index")
+    RANKING_CANDIDATES: int = Field(1000, description="With 'all_time' scope, the most viewed indexed videos per channel considered for ranking")
+    INDEX_PAGES_PER_VISIT: int = Field(10, description="Max uploads-playlist pages (50 videos, 2 units each) crawled per channel visit")
+    MEMORY_CACHE_MAX_ENTRIES: int = Field(2000, description="Max entries in the in-process cache tier")
+    MEMORY_CACHE_MAX_MB: int = Field(32, description="Approximate memory limit of the in-process cache tier")
+    CHART_BACKEND: str = Field("agg", description="Comparison chart renderer: 'agg' (reused canvas, no pyplot) or 'pyplot'")
+    CHART_FORMAT: str = Field("png", description="Comparison chart image format: 'png' or 'webp'")
+    CHART_COMPRESSION: int = Field(6, description="PNG zlib level (0-9) or WebP method (0-6)")
+    CHART_WORKERS: int = Field(2, description="Processes rendering charts off the event loop (0 = render inline)")
+    CHART_QUEUE_DEPTH: int = Field(4, description="Charts allowed to wait for a worker before replies go out without one")
+    CHART_TIMEOUT_SECONDS: float = Field(10.0, description="Give up on a chart (and reply text-only) after this long")
+    RENDER_CACHE_MAX_MB: int = Field(64, description="Memory for rendered reports and chart images")
+    STALE_GRACE_SECONDS: int = Field(3600, description="Serve expired video lists for this long past the TTL while refreshing in the background (0 disables)")
+    MAX_STALENESS_SECONDS: int = Field(12 * 3600, description="Never serve video lists older than this without blocking on a refresh")
+    PREWARM_ENABLED: bool = Field(True, description="Refresh caches of hot channels in the background")
+    PREWARM_INTERVAL_SECONDS: int = Field(900, description="How often the pre-warming scheduler runs")
+    PREWARM_BUDGET_UNITS: int = Field(300, description="Max quota units one pre-warming run may spend")
+    PREWARM_DAILY_FRACTION: float = Field(0.3, description="Pre-warming stops once the day's total API usage reaches this fraction of YOUTUBE_DAILY_QUOTA, so it never uses more than that share (3,000 units by default)")
+    PREWARM_MAX_CHANNELS: int = Field(50, description="Max channels considered per pre-warming run")
+    PREWARM_WINDOW_DAYS: int = Field(7, description="How far back /compare requests count towards popularity")
+    PREWARM_SPACING_SECONDS: float = Field(2.0, description="Pause between pre-warm refreshes to spread API load")
+    YOUTUBE_API_URL: str = Field("https://www.googleapis.com/youtube/v3", description="Base URL for the rest transport")
 
     class Config:
         env_file = ".env"
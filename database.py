@@ -1,15 +1,53 @@
+import asyncio
 import aiosqlite
 import json
+import logging
 import time
+from collections import Counter
+from pathlib import Path
+from cache_codec import CacheDecodeError, JsonCodec
 from config import settings
 
 class Database:
-    def __init__(self, db_path=None):
+    """
+    With write_behind=True, write methods don't commit on their own: pending writes
+    are group-committed after `flush_interval` seconds or once `flush_max_pending`
+    accumulate. Writes run on one connection, which sees its own uncommitted
+    changes, so reads in this process always observe earlier writes.
+
+    With read_pool_size > 0, reads are spread round-robin over that many read-only
+    connections (WAL lets them run alongside the writer). Pending writes are tracked
+    per table (per key for the cache and etag_cache tables); a read goes to the writer
+    only while what it reads has uncommitted writes, so it still sees them.
+
+    `codec` encodes `cache` rows (see cache_codec); JSON text by default.
+    """
+    def __init__(self, db_path=None, write_behind: bool = False,
+                 flush_interval: float = 0.05, flush_max_pending: int = 200,
+                 read_pool_size: int = 0, codec=None):
         self.db_path = db_path or settings.DB_PATH
-        self.db = None
+        self.codec = codec or JsonCodec()
+        self.db = None  # Writer connection
+        self.read_pool_size = read_pool_size
+        self.readers: list[aiosqlite.Connection] = []
+        self._next_reader = 0
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_max_pending = flush_max_pending
+        self.pending_writes = 0
+        self._pending = Counter()  # table, or (table, key), -> uncommitted writes
+        self.commits = 0
+        self._flush_timer = None
+        self._flush_task = None
 
     async def init_db(self):
         self.db = await aiosqlite.connect(self.db_path)
+        # WAL lets readers proceed during commits; NORMAL sync is durable across app crashes in WAL mode
+        await self.db.execute('PRAGMA journal_mode=WAL')
+        await self.db.execute('PRAGMA synchronous=NORMAL')
+        await self.db.execute('PRAGMA cache_size=-16000')  # ~16 MB page cache
+        await self.db.execute('PRAGMA temp_store=MEMORY')
+        await self.db.execute('PRAGMA busy_timeout=5000')
         await self.db.execute('''
             CREATE TABLE IF NOT EXISTS channel_map (
                 name TEXT PRIMARY KEY,
@@ -31,14 +69,25 @@ class Database:
                 timestamp REAL NOT NULL
             )
         ''')
+        await self.db.execute('CREATE INDEX IF NOT EXISTS idx_cache_ts ON cache (timestamp)')
         await self.db.execute('''
             CREATE TABLE IF NOT EXISTS message_state (
                 chat_id INTEGER,
                 message_id INTEGER,
                 channel_ids TEXT,
+                created_at REAL,
                 PRIMARY KEY (chat_id, message_id)
             )
         ''')
+        try:
+            await self.db.execute('SELECT created_at FROM message_state LIMIT 1')
+        except aiosqlite.OperationalError:
+            await self.db.execute('ALTER TABLE message_state ADD COLUMN created_at REAL')
+            # Existing rows start their retention window now
+            await self.db.execute('UPDATE message_state SET created_at = ?', (time.time(),))
+        await self.db.execute(
+            'CREATE INDEX IF NOT EXISTS idx_message_state_created ON message_state (created_at)'
+        )
         await self.db.execute('''
             CREATE TABLE IF NOT EXISTS favorites (
                 user_id INTEGER,
@@ -47,21 +96,156 @@ class Database:
                 PRIMARY KEY (user_id, channel_id)
             )
         ''')
+        await self.db.execute('''
+            CREATE TABLE IF NOT EXISTS etag_cache (
+                key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                data TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            )
+        ''')
+        await self.db.execute('CREATE INDEX IF NOT EXISTS idx_etag_cache_ts ON etag_cache (timestamp)')
+        await self.db.execute('''
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT PRIMARY KEY,
+                channel_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                title TEXT NOT NULL,
+                view_count INTEGER NOT NULL,
+                like_count INTEGER NOT NULL,
+                comment_count INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                published_at TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        await self.db.execute(
+            'CREATE INDEX IF NOT EXISTS idx_videos_rank ON videos (channel_id, type, view_count DESC)'
+        )
+        # Stats history: one point per video per fetch, clustered by (video_id, ts) for range scans
+        await self.db.execute('''
+            CREATE TABLE IF NOT EXISTS video_stats (
+                video_id TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                views INTEGER NOT NULL,
+                likes INTEGER NOT NULL,
+                comments INTEGER NOT NULL,
+                PRIMARY KEY (video_id, ts)
+            ) WITHOUT ROWID
+        ''')
+        # How far back each compaction tier (by bucket size) has already thinned video_stats
+        await self.db.execute('''
+            CREATE TABLE IF NOT EXISTS video_stats_compaction (
+                bucket INTEGER PRIMARY KEY,
+                cutoff INTEGER NOT NULL
+            )
+        ''')
+        await self.db.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_state (
+                channel_id TEXT PRIMARY KEY,
+                newest_video_id TEXT,
+                next_page_token TEXT,
+                complete INTEGER NOT NULL DEFAULT 0,
+                last_crawled REAL
+            )
+        ''')
+        await self.db.execute('''
+            CREATE TABLE IF NOT EXISTS channel_requests (
+                channel_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            )
+        ''')
+        await self.db.execute(
+            'CREATE INDEX IF NOT EXISTS idx_channel_requests_ts ON channel_requests (timestamp)'
+        )
+        await self.db.execute('''
+            CREATE TABLE IF NOT EXISTS quota_usage (
+                day TEXT PRIMARY KEY,
+                units INTEGER NOT NULL
+            )
+        ''')
         await self.db.commit()
+        # Read-only connections can only open once the schema exists
+        await self._open_readers()
 
     async def close(self):
         if self.db:
+            if self._flush_task and not self._flush_task.done():
+                await self._flush_task
+            await self.flush()
+            for reader in self.readers:
+                await reader.close()
+            self.readers = []
             await self.db.close()
 
+    async def _open_readers(self):
+        uri = Path(self.db_path).absolute().as_uri() + '?mode=ro'
+        for _ in range(self.read_pool_size):
+            reader = await aiosqlite.connect(uri, uri=True)
+            await reader.execute('PRAGMA cache_size=-16000')
+            await reader.execute('PRAGMA busy_timeout=5000')
+            self.readers.append(reader)
+
+    def _reader(self, table: str, keys: tuple | list = ()) -> aiosqlite.Connection:
+        """A connection for reading `table` (or just `keys` of it) that sees every earlier write."""
+        if not self.readers or self._has_pending(table, keys):
+            return self.db
+        self._next_reader = (self._next_reader + 1) % len(self.readers)
+        return self.readers[self._next_reader]
+
+    def _has_pending(self, table: str, keys: tuple | list = ()) -> bool:
+        if not self._pending:
+            return False
+        return table in self._pending or any((table, key) in self._pending for key in keys)
+
+    async def _commit(self, table: str, key: str | None = None):
+        """Commits a write to `table` (to one `key` of it, if given), or queues it for the group commit."""
+        if not self.write_behind:
+            await self.db.commit()
+            self.commits += 1
+            return
+        self.pending_writes += 1
+        self._pending[table if key is None else (table, key)] += 1
+        if self.pending_writes >= self.flush_max_pending:
+            await self.flush()
+        elif self._flush_timer is None:
+            loop = asyncio.get_running_loop()
+            self._flush_timer = loop.call_later(self.flush_interval, self._schedule_flush)
+
+    def _schedule_flush(self):
+        self._flush_timer = None
+        self._flush_task = asyncio.ensure_future(self._timed_flush())
+
+    async def _timed_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"Error flushing database writes: {e}")
+
+    async def flush(self):
+        """Group-commits all pending writes."""
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        pending = self.pending_writes
+        if pending:
+            committed = self._pending.copy()
+            await self.db.commit()
+            # Only now may reads move back to the pool; writes queued during the commit stay pending
+            self.pending_writes -= pending
+            self._pending -= committed
+            self.commits += 1
+
     async def save_message_state(self, chat_id: int, message_id: int, channel_ids: list[str]):
         await self.db.execute(
-            'INSERT OR REPLACE INTO message_state (chat_id, message_id, channel_ids) VALUES (?, ?, ?)',
-            (chat_id, message_id, json.dumps(channel_ids))
+            'INSERT OR REPLACE INTO message_state (chat_id, message_id, channel_ids, created_at) VALUES (?, ?, ?, ?)',
+            (chat_id, message_id, json.dumps(channel_ids), time.time())
         )
-        await self.db.commit()
+        await self._commit('message_state')
 
     async def get_message_state(self, chat_id: int, message_id: int):
-        async with self.db.execute(
+        async with self._reader('message_state').execute(
             'SELECT channel_ids FROM message_state WHERE chat_id = ? AND message_id = ?',
             (chat_id, message_id)
         ) as cursor:
@@ -72,7 +256,7 @@ class Database:
 
     async def get_channel_id(self, name: str):
         """Returns (channel_id, title, last_updated)."""
-        async with self.db.execute('SELECT channel_id, title, last_updated FROM channel_map WHERE name = ?', (name.lower(),)) as cursor:
+        async with self._reader('channel_map').execute('SELECT channel_id, title, last_updated FROM channel_map WHERE name = ?', (name.lower(),)) as cursor:
             row = await cursor.fetchone()
             return row if row else None
 
@@ -81,53 +265,332 @@ class Database:
             'INSERT OR REPLACE INTO channel_map (name, channel_id, title, last_updated) VALUES (?, ?, ?, ?)',
             (name.lower(), channel_id, title, time.time())
         )
-        await self.db.commit()
+        await self._commit('channel_map')
 
     async def get_cache(self, key: str, ttl: int = 6 * 3600):
         """Returns cached data if valid (less than TTL seconds old), else None."""
-        async with self.db.execute('SELECT data, timestamp FROM cache WHERE key = ?', (key,)) as cursor:
+        entry = await self.get_cache_entry(key)
+        if entry:
+            data, timestamp = entry
+            if time.time() - timestamp < ttl:
+                return data
+        return None
+
+    async def get_cache_entry(self, key: str):
+        """Returns (data, timestamp) regardless of age, or None."""
+        async with self._reader('cache', (key,)).execute('SELECT data, timestamp FROM cache WHERE key = ?', (key,)) as cursor:
             row = await cursor.fetchone()
             if row:
-                data_json, timestamp = row
-                if time.time() - timestamp < ttl:
-                    return json.loads(data_json)
+                raw, timestamp = row
+                try:
+                    return self.codec.decode(raw), timestamp
+                except CacheDecodeError as e:
+                    # e.g. written by a newer format; treat as a miss and let it be overwritten
+                    logging.warning(f"Unreadable cache entry {key}: {e}")
         return None
 
-    async def set_cache(self, key: str, data: dict):
+    async def get_cache_entries(self, keys: list[str]) -> dict:
+        """{key: (data, timestamp)} for the keys that exist, regardless of age."""
+        entries = {}
+        for i in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+            chunk = keys[i:i + 500]
+            async with self._reader('cache', chunk).execute(
+                f"SELECT key, data, timestamp FROM cache WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ) as cursor:
+                async for key, raw, timestamp in cursor:
+                    try:
+                        entries[key] = self.codec.decode(raw), timestamp
+                    except CacheDecodeError as e:
+                        logging.warning(f"Unreadable cache entry {key}: {e}")
+        return entries
+
+    async def set_cache(self, key: str, data):
         await self.db.execute(
             'INSERT OR REPLACE INTO cache (key, data, timestamp) VALUES (?, ?, ?)',
-            (key, json.dumps(data), time.time())
+            (key, self.codec.encode(data), time.time())
         )
-        await self.db.commit()
+        await self._commit('cache', key)
 
     async def add_favorite(self, user_id: int, channel_id: str, title: str):
         await self.db.execute(
             'INSERT OR REPLACE INTO favorites (user_id, channel_id, title) VALUES (?, ?, ?)',
             (user_id, channel_id, title)
         )
-        await self.db.commit()
+        await self._commit('favorites')
 
     async def remove_favorite(self, user_id: int, channel_id: str):
         await self.db.execute(
             'DELETE FROM favorites WHERE user_id = ? AND channel_id = ?',
             (user_id, channel_id)
         )
-        await self.db.commit()
+        await self._commit('favorites')
 
     async def get_favorites(self, user_id: int):
-        async with self.db.execute(
+        async with self._reader('favorites').execute(
             'SELECT channel_id, title FROM favorites WHERE user_id = ?', (user_id,)
         ) as cursor:
             return await cursor.fetchall()
 
     async def is_favorite(self, user_id: int, channel_id: str) -> bool:
-        async with self.db.execute(
+        async with self._reader('favorites').execute(
             'SELECT 1 FROM favorites WHERE user_id = ? AND channel_id = ?', (user_id, channel_id)
         ) as cursor:
             return await cursor.fetchone() is not None
 
-    async def prune_cache(self, ttl: int = 6 * 3600):
-        """Removes cache entries older than TTL seconds."""
+    async def get_favorite_channels(self) -> list[tuple[str, str, int]]:
+        """All favorited channels as (channel_id, title, number_of_users)."""
+        async with self._reader('favorites').execute(
+            'SELECT channel_id, MAX(title), COUNT(*) FROM favorites GROUP BY channel_id ORDER BY COUNT(*) DESC'
+        ) as cursor:
+            return await cursor.fetchall()
+
+    async def record_channel_requests(self, channels: list[tuple[str, str]]):
+        now = time.time()
+        await self.db.executemany(
+            'INSERT INTO channel_requests (channel_id, title, timestamp) VALUES (?, ?, ?)',
+            [(channel_id, title, now) for channel_id, title in channels]
+        )
+        await self._commit('channel_requests')
+
+    async def get_popular_channels(self, since: float, limit: int = 50) -> list[tuple[str, str, int]]:
+        """Most requested channels since the given time as (channel_id, title, requests)."""
+        async with self._reader('channel_requests').execute(
+            'SELECT channel_id, MAX(title), COUNT(*) AS hits FROM channel_requests WHERE timestamp >= ? '
+            'GROUP BY channel_id ORDER BY hits DESC LIMIT ?',
+            (since, limit)
+        ) as cursor:
+            return await cursor.fetchall()
+
+    async def get_etag_entry(self, key: str):
+        """Returns (etag, data, size_in_bytes) for a stored API response, or None."""
+        async with self._reader('etag_cache', (key,)).execute('SELECT etag, data FROM etag_cache WHERE key = ?', (key,)) as cursor:
+            row = await cursor.fetchone()
+            if row:
+                etag, data_json = row
+                return etag, json.loads(data_json), len(data_json)
+        return None
+
+    async def set_etag_entry(self, key: str, etag: str, data: dict):
+        await self.db.execute(
+            'INSERT OR REPLACE INTO etag_cache (key, etag, data, timestamp) VALUES (?, ?, ?, ?)',
+            (key, etag, json.dumps(data), time.time())
+        )
+        await self._commit('etag_cache', key)
+
+    async def touch_etag_entry(self, key: str):
+        await self.db.execute('UPDATE etag_cache SET timestamp = ? WHERE key = ?', (time.time(), key))
+        await self._commit('etag_cache', key)
+
+    async def upsert_videos(self, channel_id: str, videos: list):
+        now = time.time()
+        await self.db.executemany(
+            'INSERT OR REPLACE INTO videos (video_id, channel_id, type, title, view_count, like_count, '
+            'comment_count, url, published_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (v.video_id, channel_id, v.type, v.title, v.view_count, v.like_count,
+                 v.comment_count, v.url, v.published_at.isoformat(), now)
+                for v in videos
+            ]
+        )
+        await self._commit('videos')
+
+    async def top_videos(self, channel_id: str, video_type: str | None = None, limit: int = 3) -> list[dict]:
+        """Most viewed indexed videos of a channel, optionally of one type ('VOD'/'Short')."""
+        query = ('SELECT video_id, type, title, view_count, like_count, comment_count, url, published_at '
+                 'FROM videos WHERE channel_id = ?')
+        params = [channel_id]
+        if video_type:
+            query += ' AND type = ?'
+            params.append(video_type)
+        query += ' ORDER BY view_count DESC LIMIT ?'
+        params.append(limit)
+        async with self._reader('videos').execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+        columns = ('video_id', 'type', 'title', 'view_count', 'like_count', 'comment_count', 'url', 'published_at')
+        return [dict(zip(columns, row)) for row in rows]
+
+    async def add_video_stats(self, videos: list, ts: float | None = None):
+        """Appends a (views, likes, comments) snapshot per video; repeats within the same second are ignored."""
+        if not videos:
+            return
+        ts = int(ts if ts is not None else time.time())
+        await self.db.executemany(
+            'INSERT OR IGNORE INTO video_stats (video_id, ts, views, likes, comments) VALUES (?, ?, ?, ?, ?)',
+            [(v.video_id, ts, v.view_count, v.like_count, v.comment_count) for v in videos]
+        )
+        await self._commit('video_stats')
+
+    async def get_video_stats(self, video_ids: list[str], since: float, until: float | None = None,
+                              bucket: int = 0) -> dict[str, list[tuple]]:
+        """
+        Snapshots of video_ids within [since, until] as {video_id: [(ts, views, likes, comments), ...]}
+        in time order. With bucket > 0 only the last point of each bucket-second window is returned.
+        """
+        if not video_ids:
+            return {}
+        placeholders = ','.join('?' * len(video_ids))
+        params = [*video_ids, int(since), int(until if until is not None else time.time())]
+        if bucket > 0:
+            # SQLite returns the other columns from the row that holds MAX(ts)
+            query = (f'SELECT video_id, MAX(ts), views, likes, comments FROM video_stats '
+                     f'WHERE video_id IN ({placeholders}) AND ts BETWEEN ? AND ? '
+                     f'GROUP BY video_id, ts / ? ORDER BY video_id, 2')
+            params.append(bucket)
+        else:
+            query = (f'SELECT video_id, ts, views, likes, comments FROM video_stats '
+                     f'WHERE video_id IN ({placeholders}) AND ts BETWEEN ? AND ? ORDER BY video_id, ts')
+        series = {}
+        async with self._reader('video_stats').execute(query, params) as cursor:
+            async for video_id, ts, views, likes, comments in cursor:
+                series.setdefault(video_id, []).append((ts, views, likes, comments))
+        return series
+
+    async def compact_video_stats(self, tiers: tuple = ((2 * 86400, 3600), (30 * 86400, 86400)),
+                                  batch_size: int = 500, pause: float = 0.0) -> int:
+        """
+        Downsamples old history: for each (age, bucket) tier, points older than `age`
+        seconds are thinned to the last one per bucket-second window. Returns rows removed.
+
+        Only windows that have aged past the tier since its previous pass are visited.
+        Videos are handled batch_size at a time, each with (video_id, ts) range seeks on
+        the primary key, committing and yielding between batches like _delete_older_than.
+        """
+        removed = 0
+        now = int(time.time())
+        for age, bucket in tiers:
+            # Whole buckets only, so a window is never thinned while it can still gain points
+            cutoff = (now - age) // bucket * bucket
+            start = await self._compaction_cutoff(bucket)
+            if cutoff <= start:
+                continue
+            after = ''
+            while True:
+                video_ids = await self._video_ids_after(after, batch_size)
+                if not video_ids:
+                    break
+                cursor = await self.db.executemany(
+                    'DELETE FROM video_stats WHERE video_id = ?1 AND ts >= ?2 AND ts < ?3 AND ts NOT IN '
+                    '(SELECT MAX(ts) FROM video_stats WHERE video_id = ?1 AND ts >= ?2 AND ts < ?3 GROUP BY ts / ?4)',
+                    [(video_id, start, cutoff, bucket) for video_id in video_ids]
+                )
+                deleted = cursor.rowcount
+                await cursor.close()
+                if deleted > 0:
+                    removed += deleted
+                    await self._commit('video_stats')
+                    await self.flush()
+                if len(video_ids) < batch_size:
+                    break
+                after = video_ids[-1]
+                await asyncio.sleep(pause)
+            await self.db.execute(
+                'INSERT OR REPLACE INTO video_stats_compaction (bucket, cutoff) VALUES (?, ?)', (bucket, cutoff)
+            )
+            await self._commit('video_stats_compaction')
+            await self.flush()
+        return removed
+
+    async def _compaction_cutoff(self, bucket: int) -> int:
+        async with self.db.execute('SELECT cutoff FROM video_stats_compaction WHERE bucket = ?', (bucket,)) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+
+    async def _video_ids_after(self, after: str, limit: int) -> list[str]:
+        """The next `limit` distinct video_ids of video_stats, one primary key seek each."""
+        async with self.db.execute(
+            'WITH RECURSIVE ids(video_id) AS ('
+            ' SELECT (SELECT MIN(video_id) FROM video_stats WHERE video_id > ?)'
+            ' UNION ALL'
+            ' SELECT (SELECT MIN(video_id) FROM video_stats WHERE video_id > ids.video_id)'
+            ' FROM ids WHERE ids.video_id IS NOT NULL LIMIT ?'
+            ') SELECT video_id FROM ids WHERE video_id IS NOT NULL',
+            (after, limit)
+        ) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def get_crawl_state(self, channel_id: str):
+        """Returns (newest_video_id, next_page_token, complete, last_crawled) or None."""
+        async with self._reader('crawl_state').execute(
+            'SELECT newest_video_id, next_page_token, complete, last_crawled FROM crawl_state WHERE channel_id = ?',
+            (channel_id,)
+        ) as cursor:
+            return await cursor.fetchone()
+
+    async def set_crawl_state(self, channel_id: str, newest_video_id: str | None,
+                              next_page_token: str | None, complete: bool):
+        await self.db.execute(
+            'INSERT OR REPLACE INTO crawl_state (channel_id, newest_video_id, next_page_token, complete, last_crawled) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (channel_id, newest_video_id, next_page_token, int(complete), time.time())
+        )
+        await self._commit('crawl_state')
+
+    async def get_quota_usage(self, day: str) -> int:
+        async with self._reader('quota_usage').execute('SELECT units FROM quota_usage WHERE day = ?', (day,)) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+
+    async def add_quota_usage(self, day: str, units: int):
+        await self.db.execute(
+            'INSERT INTO quota_usage (day, units) VALUES (?, ?) '
+            'ON CONFLICT(day) DO UPDATE SET units = units + excluded.units',
+            (day, units)
+        )
+        await self._commit('quota_usage')
+
+    async def _delete_older_than(self, table: str, column: str, cutoff: float,
+                                 batch_size: int = 500, pause: float = 0.0) -> int:
+        """
+        Deletes rows with `column` < cutoff in batches of batch_size (an index range
+        scan each), committing and yielding between batches so the writer lock is
+        never held for long. Returns the number of rows removed.
+        """
+        removed = 0
+        while True:
+            cursor = await self.db.execute(
+                f'DELETE FROM {table} WHERE rowid IN '
+                f'(SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?)',
+                (cutoff, batch_size)
+            )
+            deleted = cursor.rowcount
+            await cursor.close()
+            if deleted <= 0:
+                break
+            removed += deleted
+            await self._commit(table)
+            await self.flush()
+            if deleted < batch_size:
+                break
+            await asyncio.sleep(pause)
+        return removed
+
+    async def prune_cache(self, ttl: int = 6 * 3600, batch_size: int = 500, pause: float = 0.0) -> dict:
+        """Removes cache and ETag entries older than TTL seconds. Returns rows removed per table."""
         cutoff = time.time() - ttl
-        await self.db.execute('DELETE FROM cache WHERE timestamp < ?', (cutoff,))
-        await self.db.commit()
+        return {
+            'cache': await self._delete_older_than('cache', 'timestamp', cutoff, batch_size, pause),
+            'etag_cache': await self._delete_older_than('etag_cache', 'timestamp', cutoff, batch_size, pause),
+        }
+
+    async def prune_message_state(self, max_age: float, batch_size: int = 500, pause: float = 0.0) -> int:
+        """Forgets the channels behind /compare messages older than max_age seconds."""
+        return await self._delete_older_than(
+            'message_state', 'created_at', time.time() - max_age, batch_size, pause
+        )
+
+    async def prune_channel_requests(self, max_age: float, batch_size: int = 500, pause: float = 0.0) -> int:
+        """Drops /compare popularity records older than max_age seconds."""
+        return await self._delete_older_than(
+            'channel_requests', 'timestamp', time.time() - max_age, batch_size, pause
+        )
+
+    async def prune(self, cache_ttl: float, message_state_ttl: float, channel_requests_ttl: float,
+                    batch_size: int = 500, pause: float = 0.0) -> dict:
+        """One retention pass over the expiring tables: rows removed per table, plus seconds taken."""
+        start = time.perf_counter()
+        report = await self.prune_cache(cache_ttl, batch_size, pause)
+        report['message_state'] = await self.prune_message_state(message_state_ttl, batch_size, pause)
+        report['channel_requests'] = await self.prune_channel_requests(channel_requests_ttl, batch_size, pause)
+        report['video_stats'] = await self.compact_video_stats(batch_size=batch_size, pause=pause)
+        report['seconds'] = round(time.perf_counter() - start, 3)
+        return report
@@ -6,19 +6,37 @@ from aiogram.utils.chat_action import ChatActionSender
 from database import Database
 from youtube_client import YoutubeClient
 from services import ChannelService
-from utils import parse_compare_args, split_text
-from plotting import generate_comparison_chart
+from ranking import SORT_METRICS, DEFAULT_SORT
+from video_index import VideoIndex
+from utils import parse_compare_args, split_text, format_number
+from plotting import generate_trend_chart, chart_filename
 from aiogram.types import BufferedInputFile
 
 router = Router()
 
-def get_keyboard(current_mode: str) -> InlineKeyboardMarkup:
+TREND_WINDOW = 7 * 86400
+
+def get_keyboard(current_mode: str, sort: str = DEFAULT_SORT) -> InlineKeyboardMarkup:
     target_mode = "Shorts" if current_mode == "VODs" else "VODs"
     callback_data = "mode:short" if current_mode == "VODs" else "mode:vod"
+    if sort != DEFAULT_SORT:
+        # Carried in the button so switching modes keeps the ranking
+        callback_data += f":{sort}"
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=f"Switch to {target_mode}", callback_data=callback_data)]
     ])
 
+def pop_sort(args: list[str]) -> tuple[list[str], str | None]:
+    """Splits a sort=<metric> argument off the channel names. None for an unknown metric."""
+    sort = DEFAULT_SORT
+    names = []
+    for arg in args:
+        if arg.lower().startswith("sort="):
+            sort = arg[5:].lower()
+        else:
+            names.append(arg)
+    return names, (sort if sort in SORT_METRICS else None)
+
 @router.message(Command("start", "help"))
 async def cmd_welcome(message: Message):
     text = (
@@ -26,28 +44,76 @@ async def cmd_welcome(message: Message):
         f"I can help you compare the most popular videos of your favorite YouTubers.\n\n"
         f"<b>Commands:</b>\n"
         f"• /compare [channel1] [channel2] ... — Compare top 3 VODs/Shorts.\n"
-        f"  <i>Example:</i> <code>/compare PewDiePie \"MrBeast Gaming\"</code>\n\n"
+        f"  <i>Example:</i> <code>/compare PewDiePie \"MrBeast Gaming\"</code>\n"
+        f"  Add <code>sort=engagement</code> or <code>sort=daily</code> (views/day) to rank by something other than views.\n"
+        f"• /trend [channel] [shorts] — View velocity of a channel's top videos over the past week.\n"
+        f"• /quota — Remaining YouTube API quota for today.\n\n"
         f"I support quotes for names with spaces!"
     )
     await message.answer(text)
 
-@router.message(Command("compare"))
-async def cmd_compare(message: Message, db: Database, client: YoutubeClient):
+@router.message(Command("quota"))
+async def cmd_quota(message: Message, client: YoutubeClient):
+    if not client.quota:
+        await message.answer("Quota tracking is disabled.")
+        return
+    q = client.quota.snapshot()
+    await message.answer(
+        f"📈 <b>API quota</b> ({q['day']}, resets at midnight PT)\n"
+        f"Used: {format_number(q['used'])} / {format_number(q['limit'])}\n"
+        f"Remaining: {format_number(q['remaining'])}\n"
+        f"Refused calls: {q['refused']}"
+    )
+
+@router.message(Command("trend"))
+async def cmd_trend(message: Message, db: Database, client: YoutubeClient, video_index: VideoIndex | None = None):
     args = parse_compare_args(message.text)
-    if not args:
-        await message.answer("Usage: /compare [blogger1] [blogger2] ...")
+    mode = "VODs"
+    if args and args[-1].lower() in ("shorts", "short"):
+        mode = "Shorts"
+        args = args[:-1]
+    if len(args) != 1:
+        await message.answer("Usage: /trend [channel] [shorts]")
+        return
+
+    service = ChannelService(db, client, video_index)
+    async with ChatActionSender.upload_photo(bot=message.bot, chat_id=message.chat.id):
+        resolved = await service.resolve_channel(args[0])
+        if resolved is None:
+            await message.answer(f"❌ Channel {html.quote(args[0])} not found.")
+            return
+        channel_id, title, _ = resolved
+        # Built from stats recorded by earlier /compare fetches, no API calls
+        series = await service.view_velocity(channel_id, mode, window=TREND_WINDOW)
+        chart_bytes = await service.render_chart(generate_trend_chart, series, title) if series else None
+
+    if not chart_bytes:
+        await message.answer(
+            f"Not enough history for {html.bold(html.quote(title))} yet. "
+            f"Stats are recorded each time its {mode} are fetched, try again after a few /compare runs."
+        )
         return
+    await message.answer_photo(
+        BufferedInputFile(chart_bytes, filename="trend.png"),
+        caption=f"📈 {html.quote(title)} — {mode} views per hour"
+    )
 
-    service = ChannelService(db, client)
+@router.message(Command("compare"))
+async def cmd_compare(message: Message, db: Database, client: YoutubeClient, video_index: VideoIndex | None = None):
+    args, sort = pop_sort(parse_compare_args(message.text))
+    if not args or sort is None:
+        await message.answer(f"Usage: /compare [blogger1] [blogger2] ... [sort={'|'.join(SORT_METRICS)}]")
+        return
+
+    service = ChannelService(db, client, video_index)
 
     # Send initial status
     status_msg = await message.answer(f"🔍 Searching for {len(args)} channels...")
 
     # Show typing action
     async with ChatActionSender.typing(bot=message.bot, chat_id=message.chat.id):
-        # 1. Resolve all channels concurrently
-        resolve_tasks = [service.resolve_channel(name) for name in args]
-        resolved_results = await asyncio.gather(*resolve_tasks)
+        # 1. Resolve all channels concurrently (IDs are looked up in one batch)
+        resolved_results = await service.resolve_channels(args)
 
         valid_channels = [r for r in resolved_results if r is not None]
         missing_channels = [args[i] for i, r in enumerate(resolved_results) if r is None]
@@ -58,7 +124,7 @@ async def cmd_compare(message: Message, db: Database, client: YoutubeClient):
 
         # 2. Fetch data for valid channels concurrently (Default VODs)
         fetch_tasks = [
-            service.fetch_data_for_channel(c_id, c_title, "VODs")
+            service.fetch_data_for_channel(c_id, c_title, "VODs", sort)
             for c_id, c_title, _ in valid_channels
         ]
         results = await asyncio.gather(*fetch_tasks)
@@ -71,6 +137,9 @@ async def cmd_compare(message: Message, db: Database, client: YoutubeClient):
                  'videos': videos
              })
 
+        # Popularity feeds the background pre-warming
+        await db.record_channel_requests([(c_id, c_title) for c_id, c_title, _ in valid_channels])
+
         # Save state for this message
         state_data = [{'id': c_id, 'title': c_title} for c_id, c_title, _ in valid_channels]
         await db.save_message_state(message.chat.id, status_msg.message_id, state_data)
@@ -86,7 +155,7 @@ async def cmd_compare(message: Message, db: Database, client: YoutubeClient):
         chart_bytes = None
         if len(valid_channels) > 1:
             try:
-                chart_bytes = generate_comparison_chart(all_videos_data)
+                chart_bytes = await service.comparison_chart(all_videos_data, sort)
             except Exception:
                 pass
 
@@ -114,12 +183,12 @@ async def cmd_compare(message: Message, db: Database, client: YoutubeClient):
         # If multipart, last part gets button. If chart exists, last part still gets button?
         # Yes, let's keep controls on text.
 
-        await status_msg.edit_text(parts[0], reply_markup=get_keyboard("VODs") if len(parts) == 1 else None)
+        await status_msg.edit_text(parts[0], reply_markup=get_keyboard("VODs", sort) if len(parts) == 1 else None)
 
         # Send remaining parts
         for i, part in enumerate(parts[1:], 1):
             is_last = i == len(parts) - 1
-            last_msg = await message.answer(part, reply_markup=get_keyboard("VODs") if is_last else None)
+            last_msg = await message.answer(part, reply_markup=get_keyboard("VODs", sort) if is_last else None)
             if is_last:
                 # We need to save state for this new message too if it has buttons
                 await db.save_message_state(message.chat.id, last_msg.message_id, state_data)
@@ -127,13 +196,15 @@ async def cmd_compare(message: Message, db: Database, client: YoutubeClient):
         # Send chart (without buttons to avoid state issues for now)
         if chart_bytes:
             await message.answer_photo(
-                BufferedInputFile(chart_bytes, filename="chart.png"),
+                BufferedInputFile(chart_bytes, filename=chart_filename("chart")),
                 caption="📊 View Comparison"
             )
 
 @router.callback_query(F.data.startswith("mode:"))
-async def on_mode_switch(callback: CallbackQuery, db: Database, client: YoutubeClient):
-    target_mode = "Shorts" if callback.data == "mode:short" else "VODs"
+async def on_mode_switch(callback: CallbackQuery, db: Database, client: YoutubeClient, video_index: VideoIndex | None = None):
+    _, mode, *rest = callback.data.split(":")
+    target_mode = "Shorts" if mode == "short" else "VODs"
+    sort = rest[0] if rest and rest[0] in SORT_METRICS else DEFAULT_SORT
     message = callback.message
 
     # Retrieve state from DB
@@ -145,7 +216,7 @@ async def on_mode_switch(callback: CallbackQuery, db: Database, client: YoutubeC
 
     await callback.answer(f"Switching to {target_mode}...")
 
-    service = ChannelService(db, client)
+    service = ChannelService(db, client, video_index)
     channels_data = channel_ids
 
     async with ChatActionSender.typing(bot=message.bot, chat_id=message.chat.id):
@@ -160,7 +231,7 @@ async def on_mode_switch(callback: CallbackQuery, db: Database, client: YoutubeC
                 c_title = c_data['title']
 
             titles.append(c_title)
-            tasks.append(service.fetch_data_for_channel(c_id, c_title, target_mode))
+            tasks.append(service.fetch_data_for_channel(c_id, c_title, target_mode, sort))
 
         results = await asyncio.gather(*tasks)
 
@@ -179,7 +250,7 @@ async def on_mode_switch(callback: CallbackQuery, db: Database, client: YoutubeC
         chart_bytes = None
         if len(titles) > 1:
             try:
-                chart_bytes = generate_comparison_chart(all_videos_data)
+                chart_bytes = await service.comparison_chart(all_videos_data, sort)
             except Exception:
                 pass
 
@@ -189,19 +260,19 @@ async def on_mode_switch(callback: CallbackQuery, db: Database, client: YoutubeC
 
         try:
             # Edit first part
-            await message.edit_text(parts[0], reply_markup=get_keyboard(target_mode) if len(parts) == 1 else None)
+            await message.edit_text(parts[0], reply_markup=get_keyboard(target_mode, sort) if len(parts) == 1 else None)
 
             # Send others
             for i, part in enumerate(parts[1:], 1):
                 is_last = i == len(parts) - 1
-                last_msg = await message.answer(part, reply_markup=get_keyboard(target_mode) if is_last else None)
+                last_msg = await message.answer(part, reply_markup=get_keyboard(target_mode, sort) if is_last else None)
                 if is_last:
                     await db.save_message_state(message.chat.id, last_msg.message_id, channels_data)
 
             # Send chart if available
             if chart_bytes:
                  await message.answer_photo(
-                    BufferedInputFile(chart_bytes, filename="chart.png"),
+                    BufferedInputFile(chart_bytes, filename=chart_filename("chart")),
                     caption=f"📊 {target_mode} View Comparison"
                 )
 
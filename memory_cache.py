@@ -0,0 +1,95 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+MISS = object()
+
+def approx_size(value: Any) -> int:
+    """Rough in-memory footprint in bytes, good enough to bound the cache."""
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+class MemoryCache:
+    """
+    Bounded in-process LRU cache of already-decoded values.
+    Every entry keeps the timestamp it was written with (so readers can apply
+    their own TTL, like Database.get_cache) and a max age after which it is
+    dead. When over the entry or byte limit, dead entries go first, then the
+    least recently used ones.
+    """
+    def __init__(self, max_entries: int = 2000, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, tuple[Any, float, float, int]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, ttl: float) -> Any:
+        """Returns the value if written less than `ttl` seconds ago, else MISS."""
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[1] >= ttl:
+            self.misses += 1
+            return MISS
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def get_entry(self, key: Hashable):
+        """Returns (value, timestamp) regardless of age, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def set(self, key: Hashable, value: Any, max_age: float, timestamp: float | None = None,
+            size: int | None = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        size = approx_size(value) if size is None else size
+        self.delete(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, timestamp, timestamp + max_age, size)
+        self.bytes += size
+        self._evict()
+
+    def delete(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.bytes -= entry[3]
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def _evict(self):
+        if len(self._entries) <= self.max_entries and self.bytes <= self.max_bytes:
+            return
+        now = time.time()
+        for key in [k for k, e in self._entries.items() if e[2] <= now]:
+            self.delete(key)
+            self.evictions += 1
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self.bytes -= entry[3]
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
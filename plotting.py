@@ -1,10 +1,31 @@
-import matplotlib
-matplotlib.use('Agg') # Non-interactive backend
-import matplotlib.pyplot as plt
+import functools
 import io
+import threading
 from typing import List
 from youtube_client import Video
-from matplotlib.ticker import FuncFormatter
+from config import settings
+import ranking
+
+# matplotlib (~1s with its font cache) is imported on first render or by warm_up(),
+# not when handlers import this module.
+
+@functools.cache
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg') # Non-interactive backend
+    import matplotlib.pyplot as plt
+    return plt
+
+def warm_up():
+    """Imports the rendering stack ahead of the first chart."""
+    _pyplot()
+    from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: F401
+    from matplotlib.figure import Figure  # noqa: F401
+    from PIL import Image  # noqa: F401
+
+def _formatter(func=None):
+    from matplotlib.ticker import FuncFormatter
+    return FuncFormatter(func or format_axis)
 
 def format_axis(x, pos):
     if x >= 1_000_000:
@@ -13,35 +34,130 @@ def format_axis(x, pos):
         return f'{x*1e-3:.0f}K'
     return f'{int(x)}'
 
-def generate_comparison_chart(channels_data: List[dict]) -> bytes:
+def format_percent(x, pos):
+    return f'{x*100:.1f}%'
+
+# Chart title, y label and value format per ranking metric
+_METRIC_AXES = {
+    'views': ('Top Video Views Comparison', 'Views', format_axis),
+    'engagement': ('Top Video Engagement Comparison', 'Engagement (likes + comments / views)', format_percent),
+    'daily': ('Top Video Views per Day Comparison', 'Views / day', format_axis),
+}
+
+def _top_values(channels_data: List[dict], sort: str = 'views') -> tuple[list[str], list[float]]:
+    names = []
+    values = []
+    for data in channels_data:
+        leaders = ranking.top(data['videos'], sort, 1)
+        if not leaders:
+            continue
+        names.append(data['title'][:15]) # Truncate long names
+        values.append(getattr(leaders[0], sort))
+    return names, values
+
+def chart_filename(stem: str) -> str:
+    return f"{stem}.{settings.CHART_FORMAT}"
+
+def _pil_options(fmt: str, compression: int) -> dict:
+    if fmt == 'webp':
+        # Lossless keeps flat colors and text crisp; method trades CPU for size (0-6)
+        return {'lossless': True, 'method': max(0, min(compression, 6))}
+    return {'compress_level': max(0, min(compression, 9))}
+
+def generate_comparison_chart(channels_data: List[dict], sort: str = 'views') -> bytes:
     """
-    Generates a bar chart comparing top video views.
+    Generates a bar chart comparing each channel's top video by `sort` (a ranking metric).
     channels_data: list of dicts {'title': str, 'videos': List[Video]}
+    Rendered by the CHART_BACKEND ('agg' or 'pyplot') as CHART_FORMAT (png/webp).
     """
-    with plt.style.context('dark_background'):
-        fig, ax = plt.subplots(figsize=(10, 6))
+    names, values = _top_values(channels_data, sort)
+    if not names:
+        return None
+    if settings.CHART_BACKEND == 'pyplot':
+        return _pyplot_comparison_chart(names, values, settings.CHART_FORMAT, settings.CHART_COMPRESSION, sort)
+    return _agg_chart().render(names, values, settings.CHART_FORMAT, settings.CHART_COMPRESSION, sort)
+
+class _AggComparisonChart:
+    """
+    The comparison chart drawn on one long-lived Figure/FigureCanvasAgg, without pyplot.
+    Axes styling, labels and layout are set up once; each render only swaps the bars
+    and their labels, redraws, and encodes the RGBA buffer with Pillow.
+    """
+    def __init__(self):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        self.fig = Figure(figsize=(10, 6), dpi=100, facecolor='black')
+        self.canvas = FigureCanvasAgg(self.fig)
+        # Fixed margins instead of tight_layout: names are truncated to 15 chars anyway
+        self.fig.subplots_adjust(left=0.09, right=0.97, top=0.88, bottom=0.2)
+        ax = self.ax = self.fig.add_subplot()
+        ax.set_facecolor('black')
+        ax.set_xlabel('Channel', color='white', fontsize=12)
+        ax.tick_params(colors='white')
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['left'].set_color('white')
+        ax.spines['bottom'].set_color('white')
+        ax.grid(axis='y', linestyle='--', alpha=0.3, color='gray')
+        ax.set_axisbelow(True)
+        self._artists = []
+        self._metric = None
+
+    def _set_metric(self, sort: str):
+        if sort == self._metric:
+            return
+        title, ylabel, fmt = _METRIC_AXES[sort]
+        self.ax.set_title(title, color='white', fontsize=14, pad=20)
+        self.ax.set_ylabel(ylabel, color='white', fontsize=12)
+        self.ax.yaxis.set_major_formatter(_formatter(fmt))
+        self._metric = sort
+
+    def render(self, names: list[str], values: list[float], fmt: str = 'png', compression: int = 6,
+               sort: str = 'views') -> bytes:
+        ax = self.ax
+        self._set_metric(sort)
+        for artist in self._artists:
+            artist.remove()
+        positions = range(len(names))
+        value_format = _METRIC_AXES[sort][2]
+        bars = ax.bar(positions, values, color='#FFD700', edgecolor='white', alpha=0.8)
+        labels = ax.bar_label(
+            bars, labels=[value_format(v, None) for v in values], color='white', fontweight='bold'
+        )
+        self._artists = [bars, *labels]
+        ax.set_xticks(positions, names, rotation=45, ha='right')
+        ax.set_xlim(-0.6, len(names) - 0.4)
+        ax.set_ylim(0, max(values) * 1.08 or 1)
+
+        from PIL import Image
+        self.canvas.draw()
+        image = Image.frombuffer('RGBA', self.canvas.get_width_height(), self.canvas.buffer_rgba())
+        buf = io.BytesIO()
+        image.convert('RGB').save(buf, format=fmt.upper(), **_pil_options(fmt, compression))
+        return buf.getvalue()
 
-        names = []
-        top_views = []
+_agg_local = threading.local()
 
-        for data in channels_data:
-            if not data['videos']:
-                continue
-            # Take the top video
-            top_video = data['videos'][0]
-            names.append(data['title'][:15]) # Truncate long names
-            top_views.append(top_video.view_count)
+def _agg_chart() -> _AggComparisonChart:
+    # One canvas per thread: the event loop thread or a chart pool worker
+    chart = getattr(_agg_local, 'chart', None)
+    if chart is None:
+        chart = _agg_local.chart = _AggComparisonChart()
+    return chart
 
-        if not names:
-            plt.close(fig)
-            return None
+def _pyplot_comparison_chart(names: list[str], top_views: list[float], fmt: str = 'png', compression: int = 6,
+                             sort: str = 'views') -> bytes:
+    plt = _pyplot()
+    title, ylabel, value_format = _METRIC_AXES[sort]
+    with plt.style.context('dark_background'):
+        fig, ax = plt.subplots(figsize=(10, 6))
 
         # Gold color for bars
         bars = ax.bar(names, top_views, color='#FFD700', edgecolor='white', alpha=0.8)
 
-        ax.set_title('Top Video Views Comparison', color='white', fontsize=14, pad=20)
+        ax.set_title(title, color='white', fontsize=14, pad=20)
         ax.set_xlabel('Channel', color='white', fontsize=12)
-        ax.set_ylabel('Views', color='white', fontsize=12)
+        ax.set_ylabel(ylabel, color='white', fontsize=12)
 
         # Rotate x labels
         plt.xticks(rotation=45, ha='right', color='white')
@@ -55,18 +171,55 @@ def generate_comparison_chart(channels_data: List[dict]) -> bytes:
         ax.grid(axis='y', linestyle='--', alpha=0.3, color='gray')
 
         # Format Y axis to normal numbers
-        ax.yaxis.set_major_formatter(FuncFormatter(format_axis))
+        ax.yaxis.set_major_formatter(_formatter(value_format))
 
         # Add value labels
         for bar in bars:
             height = bar.get_height()
-            label = format_axis(height, None)
+            label = value_format(height, None)
             ax.text(bar.get_x() + bar.get_width()/2., height,
                     label,
                     ha='center', va='bottom', color='white', fontweight='bold')
 
         plt.tight_layout()
 
+        buf = io.BytesIO()
+        plt.savefig(buf, format=fmt, pil_kwargs=_pil_options(fmt, compression))
+        buf.seek(0)
+        plt.close(fig)
+
+        return buf.getvalue()
+
+def generate_trend_chart(series: List[dict], title: str) -> bytes:
+    """
+    Generates a line chart of view velocity over time.
+    series: list of dicts {'title': str, 'points': List[(datetime, views_per_hour)]}
+    """
+    series = [s for s in series if s['points']]
+    if not series:
+        return None
+
+    plt = _pyplot()
+    with plt.style.context('dark_background'):
+        fig, ax = plt.subplots(figsize=(10, 6))
+
+        for s in series:
+            times = [t for t, _ in s['points']]
+            rates = [r for _, r in s['points']]
+            ax.plot(times, rates, marker='o', markersize=3, linewidth=2, label=s['title'][:30])
+
+        ax.set_title(f'View Velocity — {title[:30]}', color='white', fontsize=14, pad=20)
+        ax.set_ylabel('Views / hour', color='white', fontsize=12)
+        ax.yaxis.set_major_formatter(_formatter())
+        fig.autofmt_xdate()
+
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.grid(linestyle='--', alpha=0.3, color='gray')
+        ax.legend(loc='upper left', fontsize=9, frameon=False)
+
+        plt.tight_layout()
+
         buf = io.BytesIO()
         plt.savefig(buf, format='png')
         buf.seek(0)
@@ -0,0 +1,118 @@
+import contextvars
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from enum import IntEnum
+
+try:
+    from zoneinfo import ZoneInfo
+    PACIFIC = ZoneInfo("America/Los_Angeles")
+except Exception:
+    # No tz database in the image, PST is close enough for a daily counter
+    PACIFIC = timezone(timedelta(hours=-8))
+
+# Units billed per call by the YouTube Data API v3
+API_COSTS = {
+    'search': 100,
+    'playlistItems': 1,
+    'videos': 1,
+    'channels': 1,
+}
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+_current_priority = contextvars.ContextVar('quota_priority', default=Priority.INTERACTIVE)
+
+@contextmanager
+def priority(level: Priority):
+    """Runs the block (and any tasks it creates) at the given quota priority."""
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def current_priority() -> Priority:
+    return _current_priority.get()
+
+def quota_day(now: datetime | None = None) -> str:
+    """The API quota resets at midnight Pacific time."""
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(PACIFIC).date().isoformat()
+
+class QuotaExceededError(Exception):
+    def __init__(self, resource: str, cost: int, remaining: int):
+        super().__init__(f"Quota budget refused {resource} ({cost} units, {remaining} remaining)")
+        self.resource = resource
+        self.cost = cost
+        self.remaining = remaining
+
+class QuotaBudget:
+    """
+    Tracks the daily API spend and decides which calls may go out.
+    Background calls can't dip into the last `background_reserve` fraction of the
+    day's quota, which is kept for interactive requests. Searches (100 units) are
+    refused once less than `search_floor` of the quota is left so the remainder
+    stays available for cheap lookups.
+    """
+    def __init__(self, db=None, daily_limit: int = 10000,
+                 background_reserve: float = 0.2, search_floor: float = 0.1):
+        self.db = db
+        self.daily_limit = daily_limit
+        self.background_reserve = background_reserve
+        self.search_floor = search_floor
+        self.day = quota_day()
+        self.used = 0
+        self.refused = 0
+
+    async def load(self):
+        """Restores today's spend from the database."""
+        self.day = quota_day()
+        if self.db:
+            self.used = await self.db.get_quota_usage(self.day)
+
+    def _roll_day(self):
+        today = quota_day()
+        if today != self.day:
+            self.day = today
+            self.used = 0
+            self.refused = 0
+
+    @property
+    def remaining(self) -> int:
+        self._roll_day()
+        return max(0, self.daily_limit - self.used)
+
+    def can_spend(self, resource: str, level: Priority | None = None) -> bool:
+        level = _current_priority.get() if level is None else level
+        cost = API_COSTS.get(resource, 1)
+        left = self.remaining - cost
+        if level == Priority.BACKGROUND and left < self.daily_limit * self.background_reserve:
+            return False
+        if resource == 'search' and left < self.daily_limit * self.search_floor:
+            return False
+        return left >= 0
+
+    async def charge(self, resource: str):
+        """Reserves units for one call, raising QuotaExceededError if the budget says no."""
+        cost = API_COSTS.get(resource, 1)
+        if not self.can_spend(resource):
+            self.refused += 1
+            raise QuotaExceededError(resource, cost, self.remaining)
+        self.used += cost
+        if self.db:
+            try:
+                await self.db.add_quota_usage(self.day, cost)
+            except Exception as e:
+                logging.error(f"Error persisting quota usage: {e}")
+
+    def snapshot(self) -> dict:
+        return {
+            'day': self.day,
+            'limit': self.daily_limit,
+            'used': self.used,
+            'remaining': self.remaining,
+            'refused': self.refused,
+        }
@@ -0,0 +1,93 @@
+import time
+from datetime import datetime
+from operator import itemgetter
+from typing import NamedTuple
+
+import numpy as np
+
+from youtube_client import Video
+
+# sort= values accepted by reports, charts and /compare
+SORT_METRICS = ('views', 'engagement', 'daily')
+DEFAULT_SORT = 'views'
+
+# Field positions in the Video tuple
+_VIEWS, _LIKES, _COMMENTS, _PUBLISHED = 1, 2, 3, 7
+
+# Videos younger than this count as this old for views/day, so a fresh upload
+# isn't extrapolated from its first few hours
+MIN_AGE_DAYS = 1.0
+
+class Ranked(NamedTuple):
+    """A video picked by top(), with its metrics."""
+    video: Video
+    views: int
+    engagement: float   # (likes + comments) / views
+    daily: float        # views per day since published_at
+    percentile: float   # share of the channel's videos that score lower by the sort metric, 0-100
+
+def check_sort(sort: str) -> str:
+    if sort not in SORT_METRICS:
+        raise ValueError(f"Unknown sort metric {sort!r}, expected one of {', '.join(SORT_METRICS)}")
+    return sort
+
+def _column(videos: list[Video], field: int, dtype=np.int64) -> np.ndarray:
+    return np.fromiter(map(itemgetter(field), videos), dtype=dtype, count=len(videos))
+
+def metric(videos: list[Video], sort: str, now: float | None = None, views: np.ndarray | None = None) -> np.ndarray:
+    """
+    One metric for every video, reading only the fields it needs.
+    `views` may be passed in when the caller already has that column.
+    """
+    views = _column(videos, _VIEWS) if views is None else views
+    if sort == 'views':
+        return views
+    if sort == 'engagement':
+        reactions = _column(videos, _LIKES) + _column(videos, _COMMENTS)
+        return np.where(views > 0, reactions / np.maximum(views, 1), 0.0)
+    if sort == 'daily':
+        now = time.time() if now is None else now
+        published = np.fromiter(
+            map(datetime.timestamp, map(itemgetter(_PUBLISHED), videos)), dtype=np.float64, count=len(videos)
+        )
+        return views / np.maximum((now - published) / 86400, MIN_AGE_DAYS)
+    check_sort(sort)
+
+def compute_metrics(videos: list[Video], now: float | None = None) -> dict[str, np.ndarray]:
+    """Every metric in SORT_METRICS for every video."""
+    views = _column(videos, _VIEWS)
+    return {sort: metric(videos, sort, now, views) for sort in SORT_METRICS}
+
+def top_indices(values: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest values, largest first, without sorting the rest."""
+    n = len(values)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        # Everything above the k-th largest value, then ties at it in list order:
+        # argpartition alone would pick among ties arbitrarily and reports would flap
+        threshold = np.partition(values, n - k)[n - k]
+        above = np.flatnonzero(values > threshold)
+        tied = np.flatnonzero(values == threshold)[:k - len(above)]
+        candidates = np.sort(np.concatenate((above, tied)))
+    else:
+        candidates = np.arange(n)
+    # Only the k winners get ordered; stable, so ties keep list order
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+def top(videos: list[Video], sort: str = DEFAULT_SORT, k: int = 3, now: float | None = None) -> list[Ranked]:
+    """The k best videos by `sort`, with all metrics and their percentile by `sort`."""
+    values = metric(videos, check_sort(sort), now)
+    picked = top_indices(values, k)
+    if not len(picked):
+        return []
+    # The other metrics and percentiles are only needed for the winners: k comparisons
+    # against the channel's values instead of a full ranking
+    winners = [videos[i] for i in picked]
+    shown = compute_metrics(winners, now)
+    below = (values[None, :] < values[picked][:, None]).sum(axis=1)
+    return [
+        Ranked(video, int(shown['views'][j]), float(shown['engagement'][j]), float(shown['daily'][j]),
+               100.0 * int(below[j]) / len(videos))
+        for j, video in enumerate(winners)
+    ]
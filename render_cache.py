@@ -0,0 +1,75 @@
+import hashlib
+from typing import Any, Callable
+
+from memory_cache import MemoryCache, MISS
+
+def fingerprint(*parts: Any) -> str:
+    """
+    Stable digest of render inputs. Videos contribute only what the output shows
+    (ID, title, counts, publish date), so identical data maps to the same key
+    however it was loaded.
+    """
+    h = hashlib.blake2b(digest_size=16)
+
+    def feed(value):
+        if hasattr(value, 'video_id'):
+            # Checked first: videos are tuples too
+            feed((value.video_id, value.title, value.view_count, value.like_count,
+                  value.comment_count, value.published_at.isoformat()))
+        elif isinstance(value, (list, tuple)):
+            h.update(b'[')
+            for item in value:
+                feed(item)
+            h.update(b']')
+        elif isinstance(value, dict):
+            h.update(b'{')
+            for key in sorted(value):
+                feed(key)
+                feed(value[key])
+            h.update(b'}')
+        else:
+            h.update(repr(value).encode())
+            h.update(b'\x00')
+
+    for part in parts:
+        feed(part)
+    return h.hexdigest()
+
+class RenderCache:
+    """
+    Bounded store of rendered output (report HTML, chart PNG bytes) keyed by
+    (kind, fingerprint of the inputs), so identical requests skip rendering.
+    `max_age` bounds how long an entry is reused; reports include relative times
+    ("3h ago") and use a short one.
+    """
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024):
+        self.store = MemoryCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.renders = 0
+
+    def get_or_render(self, kind: str, key: str, max_age: float, render: Callable[[], Any]) -> Any:
+        value = self.store.get((kind, key), max_age)
+        if value is not MISS:
+            return value
+        value = render()
+        self.renders += 1
+        self.store.set((kind, key), value, max_age=max_age)
+        return value
+
+    async def aget_or_render(self, kind: str, key: str, max_age: float, render) -> Any:
+        """Async variant: `render` is awaited, and a None result (nothing rendered) isn't stored."""
+        value = self.store.get((kind, key), max_age)
+        if value is not MISS:
+            return value
+        value = await render()
+        if value is not None:
+            self.renders += 1
+            self.store.set((kind, key), value, max_age=max_age)
+        return value
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self) -> dict:
+        stats = self.store.stats()
+        stats['renders'] = self.renders
+        return stats
@@ -1,77 +1,551 @@
 import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timezone
 from aiogram import html
 from database import Database
-from youtube_client import YoutubeClient, Video
-from utils import format_number, time_ago
+from youtube_client import YoutubeClient, Video, validate_videos
+from singleflight import SingleFlight
+from quota import QuotaExceededError, Priority, priority
+from video_index import VideoIndex
+from memory_cache import MemoryCache, MISS
+from cache_backend import CacheBackend, SqliteCacheBackend
+from render_cache import RenderCache, fingerprint
+from plotting import generate_comparison_chart
+import ranking
+from chart_pool import ChartPool, ChartPoolSaturated
+from utils import format_number, time_ago, parse_channel_ref
+
+SORT_LABELS = {'views': 'views', 'engagement': 'engagement', 'daily': 'views/day'}
+
+def format_metric(ranked: ranking.Ranked, sort: str) -> str:
+    if sort == 'engagement':
+        return f"📈 {ranked.engagement * 100:.1f}% engagement"
+    if sort == 'daily':
+        return f"⚡ {format_number(int(ranked.daily))}/day"
+    return f"👁️ {format_number(ranked.views)}"
 
 class ChannelService:
-    def __init__(self, db: Database, client: YoutubeClient):
+    # Shared across instances (one ChannelService is created per request)
+    resolve_flights = SingleFlight()
+    fetch_flights = SingleFlight()
+    # How each resolution was answered: cache, negative_cache, id, handle, username, search, not_found
+    resolution_stats = Counter()
+    # In-process L1 of decoded values in front of SQLite (L2), replaced at startup with configured limits
+    memory_cache = MemoryCache()
+    # L2 shared by all replicas when set (e.g. KVCacheBackend); otherwise this process's SQLite tables
+    cache_backend: CacheBackend | None = None
+    l2_stats = Counter()
+    # Rendered reports and charts, keyed by a fingerprint of what they show
+    render_cache = RenderCache()
+    # Worker processes for matplotlib; None renders inline on the event loop
+    chart_pool: ChartPool | None = None
+    # Reports contain relative times ("3h ago"), so reuse them only briefly
+    REPORT_RENDER_TTL = 300
+    # Videos listed per channel in a report
+    REPORT_TOP = 3
+
+    VIDEOS_TTL = 6 * 3600
+    # Stale-while-revalidate: expired video lists are still served (and refreshed in the
+    # background) for `stale_grace` seconds past the TTL, but never once older than `max_staleness`
+    stale_grace = 0
+    max_staleness = 24 * 3600
+    refresh_flights = SingleFlight()
+    swr_stats = Counter()
+    _background_tasks = set()
+    NOT_FOUND_TTL = 3600
+    CHANNEL_TTL = 30 * 24 * 3600
+
+    def __init__(self, db: Database, client: YoutubeClient, index: VideoIndex | None = None):
         self.db = db
         self.client = client
+        self.cache = self.cache_backend or SqliteCacheBackend(db)
+        # When set, rankings come from the full-history index instead of the last 50 uploads
+        self.index = index
 
     async def resolve_channel(self, name: str) -> tuple[str, str, str] | None:
         """Returns (channel_id, title, original_name) or None."""
-        import time
+        found = await self.resolve_flights.do(name.strip().lower(), lambda: self._resolve_channel(name))
+        if found is None:
+            return None
+        channel_id, title = found
+        return channel_id, title, name
+
+    async def resolve_channels(self, names: list[str]) -> list[tuple[str, str, str] | None]:
+        """
+        Resolves several names at once. Raw channel IDs are looked up together
+        in a single channels.list call, everything else goes through resolve_channel.
+        """
+        ids = {}
+        for name in names:
+            kind, value = parse_channel_ref(name)
+            if kind == 'id':
+                ids[name] = value
+
+        found_ids = {}
+        if len(ids) > 1:
+            found_ids = await self._lookup_ids(list(ids.items()))
 
+        async def resolve(name):
+            if name in found_ids:
+                found = found_ids[name]
+                return (found[0], found[1], name) if found else None
+            return await self.resolve_channel(name)
+
+        return await asyncio.gather(*(resolve(name) for name in names))
+
+    async def _lookup_ids(self, named_ids: list[tuple[str, str]]) -> dict[str, tuple[str, str] | None]:
+        """Batch lookup of uncached channel IDs. Returns {name: (channel_id, title) or None}."""
+        pending = []
+        for name, channel_id in named_ids:
+            channel_info = await self._get_channel_info(name)
+            if not (channel_info and channel_info[2] and time.time() - channel_info[2] < self.CHANNEL_TTL):
+                pending.append((name, channel_id))
+        if not pending:
+            return {}
+
+        try:
+            titles = await self.client.get_channels_by_ids([c for _, c in pending])
+        except QuotaExceededError:
+            return {}
+        if titles is None:
+            return {}
+
+        results = {}
+        for name, channel_id in pending:
+            if channel_id in titles:
+                self.resolution_stats['id'] += 1
+                await self._store_channel(name, channel_id, titles[channel_id])
+                results[name] = channel_id, titles[channel_id]
+            else:
+                self.resolution_stats['not_found'] += 1
+                await self._store_not_found(name)
+                results[name] = None
+        return results
+
+    async def _resolve_channel(self, name: str) -> tuple[str, str] | None:
         # Check negative cache (1 hour TTL)
-        if await self.db.get_cache(f"not_found:{name.lower()}", ttl=3600):
+        if await self._get_cached(f"not_found:{name.lower()}", self.NOT_FOUND_TTL):
+            self.resolution_stats['negative_cache'] += 1
             return None
 
-        channel_info = await self.db.get_channel_id(name)
+        channel_info = await self._get_channel_info(name)
         if channel_info:
-            # Check staleness (30 days = 2592000s)
+            # Check staleness (30 days)
             c_id, title, last_updated = channel_info
             # Handle migration where last_updated might be None
-            if last_updated and (time.time() - last_updated < 2592000):
-                return c_id, title, name
+            if last_updated and (time.time() - last_updated < self.CHANNEL_TTL):
+                self.resolution_stats['cache'] += 1
+                return c_id, title
             # Else fall through to refresh
 
-        found = await self.client.search_channel(name)
+        try:
+            found, tier = await self._lookup_channel(name)
+        except QuotaExceededError:
+            # Out of budget: a stale mapping is better than nothing, and
+            # we must not cache a "not found" we never actually checked
+            if channel_info:
+                return channel_info[0], channel_info[1]
+            return None
         if found:
+            self.resolution_stats[tier] += 1
             channel_id, title = found
-            await self.db.set_channel_id(name, channel_id, title)
-            return channel_id, title, name
+            await self._store_channel(name, channel_id, title)
+            return channel_id, title
 
         # Cache negative result
-        await self.db.set_cache(f"not_found:{name.lower()}", {"found": False})
+        self.resolution_stats['not_found'] += 1
+        await self._store_not_found(name)
         return None
 
-    async def fetch_data_for_channel(self, channel_id: str, channel_title: str, mode: str) -> tuple[str, list[Video]]:
-        cache_key = f"{'shorts' if mode == 'Shorts' else 'vods'}:{channel_id}"
-
-        # Try cache
-        cached_data = await self.db.get_cache(cache_key)
-        if cached_data:
-            # Check if cached data is a valid list (it could be empty list for 'no videos')
-            # Assuming cache stores lists.
-            videos = [Video(**v) for v in cached_data]
-            return self.generate_report(channel_title, channel_id, videos, mode), videos
+    async def _lookup_channel(self, name: str) -> tuple[tuple[str, str] | None, str]:
+        """Tries the 1-unit exact lookups the input allows, then the 100-unit search."""
+        kind, value = parse_channel_ref(name)
+        if kind == 'id':
+            titles = await self.client.get_channels_by_ids([value])
+            # A well-formed ID that doesn't exist won't be found by searching either
+            return ((value, titles[value]) if titles and value in titles else None), 'id'
+        if kind == 'handle':
+            found = await self.client.get_channel(handle=value)
+            if found:
+                return found, 'handle'
+        if kind == 'username':
+            found = await self.client.get_channel(username=value)
+            if found:
+                return found, 'username'
+        return await self.client.search_channel(value), 'search'
 
-        # Fetch from API
-        if mode == "Shorts":
-            videos = await self.client.get_shorts(channel_id)
-        else:
-            videos = await self.client.get_vods(channel_id)
+    async def fetch_data_for_channel(self, channel_id: str, channel_title: str, mode: str,
+                                     sort: str = ranking.DEFAULT_SORT) -> tuple[str, list[Video]]:
+        """(report ranked by `sort`, all of the channel's fetched videos)."""
+        # Concurrent requests for the same channel/mode share one cache lookup and API fetch
+        try:
+            videos = await self.fetch_flights.do((channel_id, mode), lambda: self._load_videos(channel_id, mode))
+        except QuotaExceededError:
+            return f"⚠️ Daily API quota exhausted, {mode} for <b>{html.quote(channel_title)}</b> are unavailable until it resets.", []
 
         if videos is None:
             # API Error
             return f"⚠️ Could not fetch {mode} for <b>{html.quote(channel_title)}</b> (API Error).", []
 
+        return self.render_report(channel_title, channel_id, videos, mode, sort), videos
+
+    def render_report(self, channel_title: str, channel_id: str, videos: list[Video], mode: str,
+                      sort: str = ranking.DEFAULT_SORT) -> str:
+        # Keyed by what the report shows, not the whole (possibly long) list: the leaders and
+        # their percentiles, which move with the list's length even when the leaders don't.
+        # views/day is left out: it drifts every second, and REPORT_RENDER_TTL bounds that.
+        ranked = ranking.top(videos, sort, self.REPORT_TOP)
+        shown = [(r.video, r.percentile) for r in ranked]
+        return self.render_cache.get_or_render(
+            'report', fingerprint(channel_id, channel_title, mode, sort, len(videos), shown), self.REPORT_RENDER_TTL,
+            lambda: self.generate_report(channel_title, channel_id, videos, mode, sort, ranked)
+        )
+
+    @classmethod
+    async def render_chart(cls, func, *args) -> bytes | None:
+        """
+        Runs a plotting function in the chart pool when there is one.
+        None when the pool is saturated, the render times out or fails (or its worker dies),
+        so the reply goes out text-only.
+        """
+        try:
+            if cls.chart_pool is None:
+                return func(*args)
+            return await cls.chart_pool.render(func, *args)
+        except (ChartPoolSaturated, asyncio.TimeoutError):
+            return None
+        except Exception as e:
+            logging.error(f"Chart render failed: {e!r}")
+            return None
+
+    @classmethod
+    async def comparison_chart(cls, channels_data: list[dict], sort: str = ranking.DEFAULT_SORT) -> bytes | None:
+        """generate_comparison_chart, reused while the compared channels' leaders are unchanged."""
+        # Only each channel's leader is plotted; don't fingerprint or ship the rest to a worker
+        leaders = [
+            {'title': data['title'], 'videos': [r.video for r in ranking.top(data['videos'], sort, 1)]}
+            for data in channels_data
+        ]
+        key = fingerprint(sort, [(data['title'], data['videos']) for data in leaders])
+        return await cls.render_cache.aget_or_render(
+            'chart', key, cls.VIDEOS_TTL, lambda: cls.render_chart(generate_comparison_chart, leaders, sort)
+        )
+
+    async def _load_videos(self, channel_id: str, mode: str) -> list[Video] | None:
+        """Cached videos for the channel, fetching from the API on a miss. None on API error."""
+        cache_key = self.cache_key(channel_id, mode)
+
+        # Try cache (it could be an empty list for 'no videos')
+        cached = await self._get_cached_entry(
+            cache_key, self.videos_max_age(), decode=self._decode_videos, ttl=self.VIDEOS_TTL
+        )
+        if cached is not None:
+            videos, timestamp = cached
+            age = time.time() - timestamp
+            if age < self.VIDEOS_TTL:
+                return videos
+            if age < min(self.VIDEOS_TTL + self.stale_grace, self.max_staleness):
+                # Stale-while-revalidate: answer now, refresh behind the user's back
+                self.swr_stats['stale_served'] += 1
+                self._schedule_refresh(channel_id, mode)
+                return videos
+
+        return await self._fetch_videos(channel_id, mode)
+
+    async def _fetch_videos(self, channel_id: str, mode: str) -> list[Video] | None:
+        cache_key = self.cache_key(channel_id, mode)
+        try:
+            if self.index:
+                return await self._load_from_index(channel_id, mode)
+            if self.client.combined_uploads:
+                return await self._load_uploads(channel_id, mode)
+            if mode == "Shorts":
+                videos = await self.client.get_shorts(channel_id)
+            else:
+                videos = await self.client.get_vods(channel_id)
+        except QuotaExceededError:
+            # Budget is low: serve whatever we still have, however old
+            stale = await self._get_cached_videos(cache_key, ttl=float('inf'))
+            if stale is None:
+                raise
+            return stale
+
+        if videos is None:
+            return None
+
         # Save to cache
-        await self.db.set_cache(cache_key, [v.model_dump(mode='json') for v in videos])
+        await self._cache_videos(cache_key, videos)
+        await self.db.add_video_stats(videos)
+        return videos
+
+    def _schedule_refresh(self, channel_id: str, mode: str):
+        key = (channel_id, mode)
+        if self.refresh_flights.running(key):
+            return
+        task = asyncio.create_task(self._background_refresh(channel_id, mode))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _background_refresh(self, channel_id: str, mode: str):
+        try:
+            with priority(Priority.BACKGROUND):
+                videos = await self.refresh_flights.do(
+                    (channel_id, mode), lambda: self._fetch_videos(channel_id, mode)
+                )
+            self.swr_stats['refreshed' if videos is not None else 'refresh_failed'] += 1
+        except Exception as e:
+            self.swr_stats['refresh_failed'] += 1
+            logging.error(f"Background refresh of {mode} for {channel_id} failed: {e}")
+
+    async def _load_from_index(self, channel_id: str, mode: str) -> list[Video] | None:
+        ok = await self.fetch_flights.do((channel_id, 'index'), lambda: self.index.update(channel_id))
+        if not ok:
+            return None
+        videos = await self.index.top(channel_id, mode, limit=self.index.candidates)
+        await self._cache_videos(self.cache_key(channel_id, mode), videos)
+        return videos
+
+    async def _load_uploads(self, channel_id: str, mode: str) -> list[Video] | None:
+        """Fills both the vods: and shorts: keys from one uploads fetch and returns the requested mode."""
+        uploads = await self.fetch_flights.do((channel_id, 'uploads'), lambda: self._refresh_uploads(channel_id))
+        if uploads is None:
+            return None
+        vods, shorts = uploads
+        return shorts if mode == "Shorts" else vods
+
+    async def _refresh_uploads(self, channel_id: str) -> tuple[list[Video], list[Video]] | None:
+        uploads = await self.client.get_uploads(channel_id)
+        if uploads is None:
+            return None
+        vods, shorts = uploads
+        await self._cache_videos(self.cache_key(channel_id, "VODs"), vods)
+        await self._cache_videos(self.cache_key(channel_id, "Shorts"), shorts)
+        await self.db.add_video_stats(vods + shorts)
+        return uploads
+
+    async def hot_channels(self, window: float, limit: int) -> list[str]:
+        """Favorited channels first, then the most compared ones within the last `window` seconds."""
+        channel_ids = [row[0] for row in await self.db.get_favorite_channels()]
+        popular = await self.db.get_popular_channels(time.time() - window, limit)
+        for channel_id, _, _ in popular:
+            if channel_id not in channel_ids:
+                channel_ids.append(channel_id)
+        return channel_ids[:limit]
+
+    def refresh_cost(self, mode: str) -> int:
+        """Estimated quota units for refreshing one channel/mode."""
+        if self.index:
+            return 3  # Head page + top stats refresh
+        if self.client.combined_uploads:
+            return 2  # Either mode's refresh fills the other too
+        return 101 if mode == "Shorts" else 2
+
+    def prewarm_budget(self, per_run: int, daily_fraction: float) -> int:
+        """
+        Units one pre-warming run may spend: `per_run`, but never taking the day's total
+        usage past `daily_fraction` of the daily quota, so interactive requests keep the rest.
+        """
+        quota = self.client.quota
+        if quota is None:
+            return per_run
+        used = quota.daily_limit - quota.remaining  # remaining rolls the counter over at midnight PT
+        return max(0, min(per_run, int(quota.daily_limit * daily_fraction) - used))
+
+    async def prewarm(self, channel_ids: list[str], budget_units: int, lead: float, spacing: float = 0) -> int:
+        """
+        Refreshes VOD/Shorts caches of the given channels that are missing or expire
+        within `lead` seconds, at background quota priority, spending at most
+        `budget_units` and pausing `spacing` seconds between refreshes. A refresh that
+        doesn't fit what's left of the budget is skipped; the run only stops early
+        when the quota budget refuses a call.
+        Returns the number of refreshed entries.
+        """
+        spent = 0
+        refreshed = 0
+        # One multi-get for every candidate instead of a round trip each
+        entries = await self._get_cached_entries(
+            [self.cache_key(c, mode) for c in channel_ids for mode in ("VODs", "Shorts")],
+            self.videos_max_age(), decode=self._decode_videos, ttl=self.VIDEOS_TTL - lead
+        )
+        with priority(Priority.BACKGROUND):
+            for channel_id in channel_ids:
+                for mode in ("VODs", "Shorts"):
+                    entry = entries.get(self.cache_key(channel_id, mode))
+                    if entry and time.time() - entry[1] < self.VIDEOS_TTL - lead:
+                        continue
+                    cost = self.refresh_cost(mode)
+                    if spent + cost > budget_units:
+                        # Skip just this one: cheaper refreshes further down may still fit
+                        continue
+                    try:
+                        videos = await self.refresh_flights.do(
+                            (channel_id, mode), lambda: self._fetch_videos(channel_id, mode)
+                        )
+                    except QuotaExceededError:
+                        return refreshed
+                    spent += cost
+                    if videos is not None:
+                        refreshed += 1
+                        # A refresh can fill more than its own key (combined uploads fill both modes)
+                        for filled in ("VODs", "Shorts"):
+                            filled_key = self.cache_key(channel_id, filled)
+                            entries[filled_key] = self.memory_cache.get_entry(filled_key) or entries.get(filled_key)
+                    if spacing:
+                        await asyncio.sleep(spacing)
+        return refreshed
+
+    async def view_velocity(self, channel_id: str, mode: str, window: float, bucket: int = 3600) -> list[dict]:
+        """
+        Views/hour over the last `window` seconds for the channel's cached top videos,
+        from recorded snapshots only (no API calls): [{'title': str, 'points': [(datetime, rate)]}].
+        Videos with fewer than two snapshots are left out.
+        """
+        videos = await self._get_cached_videos(self.cache_key(channel_id, mode), ttl=float('inf'))
+        if not videos:
+            return []
+        videos = [r.video for r in ranking.top(videos, 'views', self.REPORT_TOP)]
+        history = await self.db.get_video_stats(
+            [v.video_id for v in videos], since=time.time() - window, bucket=bucket
+        )
+        series = []
+        for video in videos:
+            snapshots = history.get(video.video_id, [])
+            points = []
+            for (t0, v0, _, _), (t1, v1, _, _) in zip(snapshots, snapshots[1:]):
+                rate = max(v1 - v0, 0) / ((t1 - t0) / 3600)
+                points.append((datetime.fromtimestamp(t1, timezone.utc), rate))
+            if points:
+                series.append({'title': video.title, 'points': points})
+        return series
+
+    @staticmethod
+    def cache_key(channel_id: str, mode: str) -> str:
+        return f"{'shorts' if mode == 'Shorts' else 'vods'}:{channel_id}"
+
+    async def _get_cached_entry(self, key: str, max_age: float, decode=None, ttl: float | None = None):
+        """
+        (value, timestamp) from L1 or L2 regardless of age, or None.
+        An L1 entry older than `ttl` is checked against L2 first, where another replica may
+        have stored a fresher one. L2 hits are decoded once and promoted to L1 with their
+        original timestamp.
+        """
+        entry = self.memory_cache.get_entry(key)
+        if entry is not None and (ttl is None or time.time() - entry[1] < ttl):
+            return entry
+        found = await self.cache.get_entry(key)
+        if found is None:
+            self.l2_stats['misses'] += 1
+            return entry
+        self.l2_stats['hits'] += 1
+        return self._promote(key, *found, max_age, decode, entry)
+
+    async def _get_cached_entries(self, keys: list[str], max_age: float, decode=None,
+                                  ttl: float | None = None) -> dict:
+        """Batch version of _get_cached_entry: {key: (value, timestamp)} for the keys found."""
+        entries = {}
+        missing = []
+        now = time.time()
+        for key in keys:
+            entry = self.memory_cache.get_entry(key)
+            if entry is not None:
+                entries[key] = entry
+            if entry is None or (ttl is not None and now - entry[1] >= ttl):
+                missing.append(key)
+        if not missing:
+            return entries
+        found = await self.cache.get_entries(missing)
+        self.l2_stats['hits'] += len(found)
+        self.l2_stats['misses'] += len(missing) - len(found)
+        for key, (data, timestamp) in found.items():
+            entries[key] = self._promote(key, data, timestamp, max_age, decode, entries.get(key))
+        return entries
+
+    def _promote(self, key: str, data, timestamp: float, max_age: float, decode, current=None):
+        """The L2 entry as (value, timestamp), moved into L1, unless L1's `current` one is as new."""
+        if current is not None and current[1] >= timestamp:
+            return current
+        value = decode(data) if decode else data
+        self.memory_cache.set(key, value, max_age=max_age, timestamp=timestamp)
+        return value, timestamp
+
+    async def _get_cached(self, key: str, ttl: float, max_age: float | None = None, decode=None):
+        entry = await self._get_cached_entry(key, max_age or ttl, decode, ttl=ttl)
+        if entry is not None and time.time() - entry[1] < ttl:
+            return entry[0]
+        return None
+
+    @staticmethod
+    def _decode_videos(data: list) -> list[Video]:
+        # The binary codec already returns trusted Video records; JSON rows are validated as a batch
+        if data and not isinstance(data[0], Video):
+            return validate_videos(data)
+        return data
+
+    @classmethod
+    def videos_max_age(cls) -> float:
+        # Video entries stay useful in L1 for as long as they may be served stale
+        return cls.VIDEOS_TTL + cls.stale_grace
+
+    async def _get_cached_videos(self, key: str, ttl: float = VIDEOS_TTL) -> list[Video] | None:
+        return await self._get_cached(key, ttl, self.videos_max_age(), decode=self._decode_videos)
+
+    async def _cache_videos(self, key: str, videos: list[Video]):
+        # Write-through: SQLite keeps it across restarts, L1 keeps the decoded objects
+        await self.cache.set(key, videos)
+        self.memory_cache.set(key, videos, max_age=self.videos_max_age())
+
+    async def _store_not_found(self, name: str):
+        key = f"not_found:{name.lower()}"
+        await self.cache.set(key, {"found": False}, ttl=self.NOT_FOUND_TTL)
+        self.memory_cache.set(key, {"found": False}, max_age=self.NOT_FOUND_TTL)
+
+    async def _get_channel_info(self, name: str):
+        """(channel_id, title, last_updated) from L1 or the channel_map table, stale or not."""
+        key = f"channel:{name.lower()}"
+        info = self.memory_cache.get(key, self.CHANNEL_TTL)
+        if info is not MISS:
+            return info
+        info = await self.cache.get_channel(name)
+        self.l2_stats['hits' if info else 'misses'] += 1
+        if info:
+            self.memory_cache.set(key, info, max_age=self.CHANNEL_TTL, timestamp=info[2] or 0)
+        return info
+
+    async def _store_channel(self, name: str, channel_id: str, title: str):
+        await self.cache.set_channel(name, channel_id, title)
+        self.memory_cache.set(f"channel:{name.lower()}", (channel_id, title, time.time()), max_age=self.CHANNEL_TTL)
 
-        return self.generate_report(channel_title, channel_id, videos, mode), videos
+    @classmethod
+    def cache_stats(cls) -> dict:
+        return {
+            'l1': cls.memory_cache.stats(), 'l2': dict(cls.l2_stats), 'swr': dict(cls.swr_stats),
+            'render': cls.render_cache.stats(),
+            'chart_pool': cls.chart_pool.stats() if cls.chart_pool else None,
+        }
 
-    def generate_report(self, channel_title: str, channel_id: str, videos: list[Video], mode: str) -> str:
+    def generate_report(self, channel_title: str, channel_id: str, videos: list[Video], mode: str,
+                        sort: str = ranking.DEFAULT_SORT, ranked: list[ranking.Ranked] | None = None) -> str:
+        """
+        The channel's top REPORT_TOP videos by `sort` ('views', 'engagement' or 'daily').
+        `ranked` is ranking.top's result when the caller already has it.
+        """
         safe_title = html.quote(channel_title)
         header = html.bold(html.link(safe_title, f"https://www.youtube.com/channel/{channel_id}"))
+        if sort != ranking.DEFAULT_SORT:
+            header += f" · <i>by {SORT_LABELS[sort]}</i>"
         lines = [header]
 
         if not videos:
             lines.append(f"<i>No {mode}s found or accessible.</i>")
         else:
             medals = ["🥇", "🥈", "🥉"]
-            for i, video in enumerate(videos):
+            if ranked is None:
+                ranked = ranking.top(videos, sort, self.REPORT_TOP)
+            for i, leader in enumerate(ranked):
+                video = leader.video
                 rank_icon = medals[i] if i < 3 else f"{i+1}."
                 safe_video_title = html.quote(video.title)
 
@@ -85,6 +559,9 @@ class ChannelService:
                     stats_part += f" • 💬 {format_number(video.comment_count)}"
 
                 line_2 = f"   {stats_part} • {time_ago(video.published_at)}"
+                if sort != ranking.DEFAULT_SORT:
+                    # What it was ranked by, and where it sits among the channel's videos
+                    line_2 += f"\n   {format_metric(leader, sort)} • top {max(100 - leader.percentile, 1):.0f}%"
 
                 lines.append(line_1)
                 lines.append(line_2)
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key.
+    The first caller starts the work, everyone arriving while it is in flight
+    awaits the same result (or exception). The entry is dropped as soon as the
+    call finishes, so the next caller after that starts a fresh one.
+    """
+    def __init__(self):
+        self._flights: dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._flights[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # Shielded so one impatient caller can't cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every waiter went away
+
+    def running(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        return {'started': self.started, 'coalesced': self.coalesced, 'in_flight': self.in_flight()}
@@ -2,14 +2,25 @@ import unittest
 import os
 import asyncio
 import json
+import subprocess
+import sys
 import time
 from unittest.mock import MagicMock, patch
-from datetime import datetime
+from datetime import datetime, timezone
+import numpy as np
 from database import Database
-from youtube_client import YoutubeClient, Video
+from youtube_client import YoutubeClient, Video, VideoBatcher, validate_videos
 from services import ChannelService, time_ago
-from utils import format_number, parse_compare_args, split_text
-from plotting import generate_comparison_chart
+from singleflight import SingleFlight
+from video_index import VideoIndex
+from memory_cache import MemoryCache, MISS
+from cache_codec import BinaryCodec, CacheDecodeError
+from cache_backend import KVCacheBackend
+from chart_pool import ChartPool, ChartPoolSaturated
+from quota import QuotaBudget, QuotaExceededError, Priority, priority as quota_priority
+from utils import format_number, parse_compare_args, split_text, parse_iso_duration, parse_channel_ref, StartupTimer
+from plotting import generate_comparison_chart, generate_trend_chart
+import ranking
 
 class TestUtils(unittest.TestCase):
     def test_format_number(self):
@@ -30,10 +41,64 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(len(chunks), 3) # aaaa, aaaa, aa
         self.assertEqual(chunks[0], "aaaa")
 
+    def test_parse_channel_ref(self):
+        channel_id = "UC_x5XG1OV2P6uZZ5FSM9Ttw"
+        self.assertEqual(parse_channel_ref(channel_id), ("id", channel_id))
+        self.assertEqual(parse_channel_ref(f"https://www.youtube.com/channel/{channel_id}"), ("id", channel_id))
+        self.assertEqual(parse_channel_ref("@MrBeast"), ("handle", "MrBeast"))
+        self.assertEqual(parse_channel_ref("youtube.com/@MrBeast/videos"), ("handle", "MrBeast"))
+        self.assertEqual(parse_channel_ref("https://youtube.com/user/pewdiepie"), ("username", "pewdiepie"))
+        self.assertEqual(parse_channel_ref("MrBeast Gaming"), ("name", "MrBeast Gaming"))
+
+    def test_parse_iso_duration(self):
+        self.assertEqual(parse_iso_duration("PT1M30S"), 90)
+        self.assertEqual(parse_iso_duration("P1DT2H"), 93600)
+        self.assertEqual(parse_iso_duration("P0D"), 0)
+        self.assertEqual(parse_iso_duration(None), 0)
+
     def test_time_ago(self):
         res = time_ago(datetime.now())
         self.assertIn("now", res)
 
+class TestColdStart(unittest.TestCase):
+    # Seconds the bot's own modules may add on top of the frameworks (aiogram alone takes
+    # seconds and can't be deferred). Eager matplotlib + discovery imports cost ~1s here.
+    IMPORT_BUDGET = 0.5
+
+    def test_import_budget(self):
+        script = (
+            "import sys, time\n"
+            "import aiogram, aiogram.types, aiogram.filters, aiohttp, pydantic\n"
+            "start = time.perf_counter()\n"
+            "import bot\n"
+            "elapsed = time.perf_counter() - start\n"
+            "heavy = [m for m in ('matplotlib', 'googleapiclient.discovery', 'PIL') if m in sys.modules]\n"
+            "print(elapsed, ','.join(heavy))\n"
+        )
+        env = dict(os.environ, BOT_TOKEN="x", YOUTUBE_API_KEY="y")
+        out = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True, env=env,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.split()
+        self.assertEqual(out[1:], [], "heavy modules imported at startup")
+        self.assertLess(float(out[0]), self.IMPORT_BUDGET)
+
+    def test_lazy_discovery_service(self):
+        client = YoutubeClient("k")
+        self.assertIsNone(client._service)
+        self.assertIsNotNone(client.service)
+        self.assertIs(client.service, client._service)
+
+    def test_startup_timer(self):
+        timer = StartupTimer()
+        with timer.phase("db"):
+            pass
+        with timer.phase("db"):
+            pass
+        self.assertEqual(list(timer.phases), ["db"])
+        self.assertIn("db=", timer.report())
+        self.assertIn("total=", timer.report())
+
 class TestDatabase(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self):
         self.db_path = "test_bot_data_v9.db"
@@ -57,6 +122,124 @@ class TestDatabase(unittest.IsolatedAsyncioTestCase):
         cached = await self.db.get_cache("old_key")
         self.assertIsNone(cached)
 
+    async def test_batched_prune(self):
+        now = time.time()
+        await self.db.db.executemany(
+            'INSERT INTO cache (key, data, timestamp) VALUES (?, ?, ?)',
+            [(f"old{i}", "{}", 0) for i in range(5)] + [("fresh", "{}", now)]
+        )
+        await self.db.save_message_state(1, 10, ["UC1"])
+        await self.db.save_message_state(1, 11, ["UC2"])
+        await self.db.db.execute('UPDATE message_state SET created_at = 0 WHERE message_id = 10')
+        await self.db.record_channel_requests([("UCold", "Old"), ("UCnew", "New")])
+        await self.db.db.execute("UPDATE channel_requests SET timestamp = 0 WHERE channel_id = 'UCold'")
+        await self.db.db.commit()
+
+        commits = self.db.commits
+        report = await self.db.prune(cache_ttl=3600, message_state_ttl=86400, channel_requests_ttl=86400, batch_size=2)
+        self.assertEqual(report['cache'], 5)
+        self.assertEqual(report['etag_cache'], 0)
+        self.assertEqual(report['message_state'], 1)
+        self.assertEqual(report['channel_requests'], 1)
+        self.assertIn('seconds', report)
+        # 2 + 2 + 1 cache rows, then the message_state and channel_requests rows: one transaction
+        # per batch, plus the cutoff of each video_stats compaction tier
+        self.assertEqual(self.db.commits - commits, 7)
+        self.assertEqual([row[0] for row in await self.db.get_popular_channels(0)], ["UCnew"])
+
+        self.assertIsNotNone(await self.db.get_cache("fresh"))
+        self.assertIsNone(await self.db.get_message_state(1, 10))
+        self.assertEqual(await self.db.get_message_state(1, 11), ["UC2"])
+
+        async with self.db.db.execute(
+            'EXPLAIN QUERY PLAN SELECT rowid FROM cache WHERE timestamp < ? LIMIT 500', (0,)
+        ) as cursor:
+            plan = " ".join(row[-1] for row in await cursor.fetchall())
+        self.assertIn("idx_cache_ts", plan)
+
+    async def test_video_stats_history(self):
+        def snap(views):
+            return Video(
+                title="T", view_count=views, like_count=0, comment_count=0,
+                url="url", video_id="v1", type="VOD", published_at=datetime.now()
+            )
+        now = int(time.time())
+        day = 86400
+        # Every 10 minutes for 2 hours, 40 days ago and 5 days ago, plus two recent points
+        for base in (now - 40 * day, now - 5 * day):
+            for i in range(12):
+                await self.db.add_video_stats([snap(base + i)], ts=base + i * 600)
+        await self.db.add_video_stats([snap(1)], ts=now - 60)
+        await self.db.add_video_stats([snap(2)], ts=now)
+
+        recent = await self.db.get_video_stats(["v1", "v2"], since=now - 3600)
+        self.assertEqual(list(recent), ["v1"])
+        self.assertEqual([p[1] for p in recent["v1"]], [1, 2])
+        # Bucketed reads keep the last point per window
+        hourly = await self.db.get_video_stats(["v1"], since=now - 6 * day, until=now - 4 * day, bucket=3600)
+        self.assertEqual(len(hourly["v1"]), len({(now - 5 * day + i * 600) // 3600 for i in range(12)}))
+
+        removed = await self.db.compact_video_stats()
+        history = (await self.db.get_video_stats(["v1"], since=0))["v1"]
+        self.assertEqual(removed, 24 - (len(history) - 2))
+        old = [p for p in history if p[0] < now - 30 * day]
+        mid = [p for p in history if now - 30 * day <= p[0] < now - day]
+        self.assertLessEqual(len(old), 2)  # At most one per day
+        self.assertLessEqual(len(mid), 3)  # At most one per hour
+        # The newest point of each window survives
+        self.assertEqual(old[-1][1], now - 40 * day + 11)
+
+    async def test_incremental_video_stats_compaction(self):
+        hour = 3600
+        now = int(time.time()) // hour * hour
+        tiers = ((hour, hour),)
+        rows = [(f"v{n}", now - 10 * hour + i * 600, i, 0, 0) for n in range(5) for i in range(6)]
+        await self.db.db.executemany('INSERT INTO video_stats VALUES (?, ?, ?, ?, ?)', rows)
+        await self.db.db.commit()
+
+        commits = self.db.commits
+        # 6 points in one hour per video thin to 1; videos 2 at a time, then the tier's cutoff
+        self.assertEqual(await self.db.compact_video_stats(tiers, batch_size=2), 25)
+        self.assertEqual(self.db.commits - commits, 4)
+
+        # Points below the previous cutoff aren't revisited, newly aged windows are
+        await self.db.db.executemany('INSERT INTO video_stats VALUES (?, ?, ?, ?, ?)', [
+            ("v0", now - 10 * hour + 1, 0, 0, 0),
+            ("v0", now + 5, 0, 0, 0), ("v0", now + 6, 0, 0, 0),
+        ])
+        await self.db.db.commit()
+        self.assertEqual(await self.db.compact_video_stats(tiers, batch_size=2), 0)
+        with patch('database.time.time', return_value=now + 2 * hour):
+            self.assertEqual(await self.db.compact_video_stats(tiers, batch_size=2), 1)
+        history = (await self.db.get_video_stats(["v0"], since=0, until=now + hour))["v0"]
+        self.assertEqual([p[0] - now for p in history], [-10 * hour + 1, -10 * hour + 3000, 6])
+
+        async with self.db.db.execute(
+            'EXPLAIN QUERY PLAN DELETE FROM video_stats WHERE video_id = ?1 AND ts >= ?2 AND ts < ?3 AND ts NOT IN '
+            '(SELECT MAX(ts) FROM video_stats WHERE video_id = ?1 AND ts >= ?2 AND ts < ?3 GROUP BY ts / ?4)',
+            ("v0", 0, now, hour)
+        ) as cursor:
+            plan = " ".join(row[-1] for row in await cursor.fetchall())
+        self.assertNotIn("SCAN video_stats", plan)
+
+    async def test_message_state_migration(self):
+        await self.db.close()
+        os.remove(self.db_path)
+        import aiosqlite
+        async with aiosqlite.connect(self.db_path) as old:
+            await old.execute(
+                'CREATE TABLE message_state (chat_id INTEGER, message_id INTEGER, channel_ids TEXT, '
+                'PRIMARY KEY (chat_id, message_id))'
+            )
+            await old.execute("INSERT INTO message_state VALUES (1, 1, '[\"UC1\"]')")
+            await old.commit()
+
+        self.db = Database(self.db_path)
+        await self.db.init_db()
+        # Pre-existing rows get a full retention window instead of being dropped at once
+        self.assertEqual(await self.db.prune_message_state(max_age=3600), 0)
+        self.assertEqual(await self.db.get_message_state(1, 1), ["UC1"])
+
     async def test_cache_ttl(self):
         await self.db.set_cache("key", {})
         await self.db.db.execute(
@@ -96,6 +279,162 @@ class TestDatabase(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(len(res), 3) # id, title, last_updated
         self.assertIsNotNone(res[2])
 
+class TestWriteBehind(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db_path = "test_write_behind.db"
+        self.db = Database(self.db_path, write_behind=True, flush_interval=0.05, flush_max_pending=3)
+        await self.db.init_db()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    async def committed_keys(self):
+        import aiosqlite
+        async with aiosqlite.connect(self.db_path) as other:
+            async with other.execute('SELECT key FROM cache ORDER BY key') as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def test_group_commit(self):
+        async with self.db.db.execute('PRAGMA journal_mode') as cursor:
+            self.assertEqual((await cursor.fetchone())[0], 'wal')
+
+        await self.db.set_cache("a", {"v": 1})
+        # Visible to this process right away, not yet committed for anyone else
+        self.assertEqual(await self.db.get_cache("a"), {"v": 1})
+        self.assertEqual(await self.committed_keys(), [])
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(await self.committed_keys(), ["a"])
+
+        commits = self.db.commits
+        for key in ("b", "c", "d"):
+            await self.db.set_cache(key, {})
+        # Hitting flush_max_pending commits without waiting for the timer
+        self.assertEqual(self.db.commits, commits + 1)
+        self.assertEqual(await self.committed_keys(), ["a", "b", "c", "d"])
+
+    async def test_close_flushes(self):
+        await self.db.set_channel_id("name", "UC1", "Title")
+        await self.db.close()
+        self.db = Database(self.db_path)
+        await self.db.init_db()
+        self.assertEqual((await self.db.get_channel_id("name"))[0], "UC1")
+
+class TestReadPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db_path = "test_read_pool.db"
+        self.db = Database(self.db_path, write_behind=True, flush_interval=0.05, read_pool_size=2)
+        await self.db.init_db()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    async def test_reads_use_pool_unless_writes_pending(self):
+        self.assertEqual(len(self.db.readers), 2)
+        self.assertIn(self.db._reader('cache', ("a",)), self.db.readers)
+
+        await self.db.set_cache("a", {"v": 1})
+        # Uncommitted rows are only visible on the writer, so reads of them stay there until the flush
+        self.assertIs(self.db._reader('cache', ("a",)), self.db.db)
+        self.assertEqual(await self.db.get_cache("a"), {"v": 1})
+        # Other keys and tables keep using the pool
+        self.assertIn(self.db._reader('cache', ("b",)), self.db.readers)
+        self.assertIn(self.db._reader('favorites'), self.db.readers)
+
+        await self.db.flush()
+        self.assertIn(self.db._reader('cache', ("a",)), self.db.readers)
+        self.assertEqual(await self.db.get_cache("a"), {"v": 1})
+
+    async def test_quota_writes_leave_cache_reads_on_pool(self):
+        # Every API call bumps quota_usage, so with write-behind it is almost always pending
+        await self.db.add_quota_usage("2024-01-01", 1)
+        self.assertIs(self.db._reader('quota_usage'), self.db.db)
+        self.assertEqual(await self.db.get_quota_usage("2024-01-01"), 1)
+        self.assertIn(self.db._reader('cache', ("a",)), self.db.readers)
+
+        await self.db.add_video_stats([Video(
+            title="t", view_count=1, like_count=0, comment_count=0,
+            url="url", video_id="v", type="VOD", published_at=datetime.now()
+        )])
+        # A table-wide write sends reads of any key in that table to the writer
+        self.assertIs(self.db._reader('video_stats'), self.db.db)
+        await self.db.flush()
+        self.assertFalse(self.db._pending)
+        self.assertIn(self.db._reader('quota_usage'), self.db.readers)
+
+    async def test_readers_are_read_only(self):
+        import sqlite3
+        with self.assertRaises(sqlite3.OperationalError):
+            await self.db.readers[0].execute("DELETE FROM cache")
+
+class TestRanking(unittest.TestCase):
+    NOW = datetime(2024, 6, 1, tzinfo=timezone.utc).timestamp()
+
+    def make_video(self, i, views, likes=0, comments=0, days_old=10):
+        return Video(
+            title=f"T{i}", view_count=views, like_count=likes, comment_count=comments, url="url",
+            video_id=f"v{i}", type="VOD", published_at=datetime.fromtimestamp(self.NOW - days_old * 86400, timezone.utc)
+        )
+
+    def test_metrics(self):
+        videos = [
+            self.make_video(0, 1000, likes=40, comments=10, days_old=10),
+            self.make_video(1, 0, likes=3),
+            self.make_video(2, 600, days_old=0.1),
+        ]
+        metrics = ranking.compute_metrics(videos, now=self.NOW)
+        self.assertEqual(list(metrics['views']), [1000, 0, 600])
+        self.assertAlmostEqual(metrics['engagement'][0], 0.05)
+        self.assertEqual(metrics['engagement'][1], 0.0)
+        self.assertAlmostEqual(metrics['daily'][0], 100.0)
+        # Under a day old counts as one day
+        self.assertAlmostEqual(metrics['daily'][2], 600.0)
+
+    def test_top_matches_full_sort(self):
+        import random
+        rng = random.Random(7)
+        values = np.array([rng.randint(0, 50) for _ in range(500)], dtype=np.int64)
+        for k in (1, 3, 10, 500, 600):
+            expected = sorted(range(len(values)), key=lambda i: -values[i])[:k]
+            self.assertEqual(list(ranking.top_indices(values, k)), expected)
+        self.assertEqual(len(ranking.top_indices(values[:0], 3)), 0)
+
+    def test_top_by_metric(self):
+        videos = [self.make_video(i, views=100 * (i + 1), likes=50 if i == 0 else 0, days_old=10 - i) for i in range(5)]
+        self.assertEqual([r.video.video_id for r in ranking.top(videos, 'views', 2, now=self.NOW)], ["v4", "v3"])
+        best = ranking.top(videos, 'engagement', 1, now=self.NOW)[0]
+        self.assertEqual(best.video.video_id, "v0")
+        # Ranked by the sort metric: the fewest views, but the best engagement of the five
+        self.assertEqual(best.percentile, 80.0)
+        self.assertEqual(ranking.top(videos, 'views', 1, now=self.NOW)[0].percentile, 80.0)
+        self.assertEqual(ranking.top([], 'daily'), [])
+        with self.assertRaises(ValueError):
+            ranking.top(videos, 'likes')
+
+    def test_report_and_chart_sort(self):
+        from handlers import pop_sort
+        self.assertEqual(pop_sort(["a", "sort=Engagement", "b"]), (["a", "b"], "engagement"))
+        self.assertEqual(pop_sort(["a"]), (["a"], "views"))
+        self.assertEqual(pop_sort(["a", "sort=likes"]), (["a"], None))
+
+        videos = [self.make_video(0, 1000), self.make_video(1, 10, likes=5)]
+        service = ChannelService(MagicMock(), MagicMock())
+        default = service.generate_report("Chan", "UC1", videos, "VODs")
+        self.assertLess(default.index("T0"), default.index("T1"))
+        self.assertNotIn("engagement", default)
+        by_engagement = service.generate_report("Chan", "UC1", videos, "VODs", sort="engagement")
+        self.assertLess(by_engagement.index("T1"), by_engagement.index("T0"))
+        self.assertIn("50.0% engagement • top 50%", by_engagement)
+
+        chart = generate_comparison_chart([{'title': 'A', 'videos': videos}], sort='engagement')
+        self.assertTrue(chart.startswith(b'\x89PNG'))
+
 class TestPlotting(unittest.TestCase):
     def test_generate_chart(self):
         video = Video(
@@ -109,6 +448,91 @@ class TestPlotting(unittest.TestCase):
         self.assertTrue(len(img_bytes) > 0)
         self.assertEqual(img_bytes[:8], b'\x89PNG\r\n\x1a\n')
 
+class TestChartBackends(unittest.TestCase):
+    def make_data(self, n):
+        return [
+            {'title': f'Channel {i}', 'videos': [Video(
+                title="T", view_count=1000 * (i + 1), like_count=0, comment_count=0,
+                url="url", video_id=f"v{i}", type="VOD", published_at=datetime.now()
+            )]}
+            for i in range(n)
+        ]
+
+    def test_agg_and_pyplot_formats(self):
+        from config import settings
+        for backend in ('agg', 'pyplot'):
+            with patch.object(settings, 'CHART_BACKEND', backend):
+                png = generate_comparison_chart(self.make_data(3))
+                self.assertEqual(png[:8], b'\x89PNG\r\n\x1a\n')
+                with patch.object(settings, 'CHART_FORMAT', 'webp'):
+                    webp = generate_comparison_chart(self.make_data(3))
+                self.assertEqual((webp[:4], webp[8:12]), (b'RIFF', b'WEBP'))
+        self.assertIsNone(generate_comparison_chart([{'title': 'Empty', 'videos': []}]))
+
+    def test_agg_canvas_is_reused(self):
+        from plotting import _agg_chart
+        chart = _agg_chart()
+        chart.render(['a', 'b', 'c', 'd'], [1, 2, 3, 4])
+        chart.render(['a', 'b'], [5, 6])
+        self.assertIs(_agg_chart(), chart)
+        # Only the latest bars (and their labels) are on the axes
+        self.assertEqual(len(chart.ax.patches), 2)
+        self.assertEqual([t.get_text() for t in chart.ax.texts], ['5', '6'])
+
+class TestTrendChart(unittest.TestCase):
+    def test_generate_trend_chart(self):
+        points = [(datetime(2024, 1, 1, h), h * 100.0) for h in range(5)]
+        img_bytes = generate_trend_chart([{'title': 'Video', 'points': points}], "Channel")
+        self.assertEqual(img_bytes[:8], b'\x89PNG\r\n\x1a\n')
+        self.assertIsNone(generate_trend_chart([{'title': 'Video', 'points': []}], "Channel"))
+
+class TestChartPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = ChartPool(workers=1, max_queue=1, timeout=5)
+        await self.pool.start()
+
+    async def asyncTearDown(self):
+        ChannelService.chart_pool = None
+        self.pool.close()
+
+    async def test_renders_in_worker(self):
+        video = Video(
+            title="Test", view_count=100, like_count=10, comment_count=5,
+            url="url", video_id="vid", type="VOD", published_at=datetime.now()
+        )
+        data = [{'title': 'A', 'videos': [video]}, {'title': 'B', 'videos': [video]}]
+        img_bytes = await self.pool.render(generate_comparison_chart, data)
+        self.assertEqual(img_bytes[:8], b'\x89PNG\r\n\x1a\n')
+        await asyncio.sleep(0.05)  # Let the done callback record metrics
+        stats = self.pool.stats()
+        self.assertEqual((stats['completed'], stats['in_flight']), (1, 0))
+        self.assertGreater(stats['render_p50_ms'], 0)
+
+    async def test_saturation_and_timeout_fall_back_to_text(self):
+        busy = [asyncio.create_task(self.pool.render(time.sleep, 0.5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with self.assertRaises(ChartPoolSaturated):
+            await self.pool.render(time.sleep, 0)
+        ChannelService.chart_pool = self.pool
+        self.assertIsNone(await ChannelService.render_chart(time.sleep, 0))
+        await asyncio.gather(*busy)
+        self.assertEqual(self.pool.stats()['rejected'], 2)
+
+        self.pool.timeout = 0.1
+        self.assertIsNone(await ChannelService.render_chart(time.sleep, 0.5))
+        self.assertEqual(self.pool.timeouts, 1)
+
+    async def test_worker_failures_fall_back_and_pool_recovers(self):
+        ChannelService.chart_pool = self.pool
+        # An exception in the plotting function
+        self.assertIsNone(await ChannelService.render_chart(int, "not a number"))
+        # A worker that dies breaks the executor; it is replaced for the next render
+        self.assertIsNone(await ChannelService.render_chart(os._exit, 1))
+        self.assertEqual(self.pool.restarts, 1)
+        self.assertEqual(await ChannelService.render_chart(abs, -3), 3)
+        await asyncio.sleep(0.05)  # Let the done callbacks record metrics
+        self.assertEqual((self.pool.stats()['failed'], self.pool.stats()['in_flight']), (2, 0))
+
 class TestYoutubeClient(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         self.client = YoutubeClient(api_key="TEST_KEY")
@@ -150,5 +574,955 @@ class TestYoutubeClient(unittest.IsolatedAsyncioTestCase):
         result = await self.client.get_vods("UC123")
         self.assertIsNone(result)
 
+class TestRestTransport(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        self.requests = []
+
+        async def search(request):
+            self.requests.append(('search', dict(request.query)))
+            return web.json_response({
+                "items": [{"snippet": {"channelId": "UC123", "channelTitle": "Stub Channel"}}]
+            })
+
+        async def playlist_items(request):
+            self.requests.append(('playlistItems', dict(request.query)))
+            if request.query['playlistId'] == 'UUbroken':
+                return web.Response(status=403, text='{"error": {"message": "forbidden"}}')
+            if request.headers.get('If-None-Match') == '"pl-1"':
+                return web.Response(status=304)
+            return web.json_response({
+                "etag": '"pl-1"',
+                "items": [{"contentDetails": {"videoId": v}} for v in ("a", "b", "c", "d")]
+            })
+
+        async def videos(request):
+            self.requests.append(('videos', dict(request.query)))
+            ids = request.query['id'].split(',')
+            etag = f'"v-{request.query["id"]}"'
+            if request.headers.get('If-None-Match') == etag:
+                return web.Response(status=304)
+            return web.json_response({"etag": etag, "items": [
+                {
+                    "id": v,
+                    "snippet": {"title": f"Video {v}", "publishedAt": "2023-10-27T10:00:00Z"},
+                    "statistics": {"viewCount": str(i * 100), "likeCount": "1", "commentCount": "2"},
+                    "contentDetails": {"duration": "PT45S" if v in ("a", "c") else "PT12M3S"},
+                }
+                for i, v in enumerate(ids)
+            ]})
+
+        app = web.Application()
+        app.router.add_get('/youtube/v3/search', search)
+        app.router.add_get('/youtube/v3/playlistItems', playlist_items)
+        app.router.add_get('/youtube/v3/videos', videos)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        self.client = YoutubeClient(
+            api_key="TEST_KEY", transport='rest',
+            base_url=str(self.server.make_url('/youtube/v3'))
+        )
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        await self.server.close()
+
+    async def test_search_channel(self):
+        result = await self.client.search_channel("Test")
+        self.assertEqual(result, ("UC123", "Stub Channel"))
+        self.assertEqual(self.requests[0][1]['key'], "TEST_KEY")
+        self.assertIsNone(self.client.service)
+
+    async def test_get_vods(self):
+        videos = await self.client.get_vods("UC123")
+        # All fetched uploads come back; ranking happens later
+        self.assertEqual([v.video_id for v in videos], ["a", "b", "c", "d"])
+        leaders = [r.video for r in ranking.top(videos, 'views', 3)]
+        self.assertEqual([v.video_id for v in leaders], ["d", "c", "b"])
+        self.assertEqual(leaders[0].view_count, 300)
+        self.assertEqual(leaders[0].type, 'VOD')
+        self.assertEqual(self.requests[0][1]['playlistId'], 'UU123')
+        # Every call carries a field mask
+        self.assertTrue(all('fields' in params for _, params in self.requests))
+        self.assertIn('statistics(viewCount,likeCount,commentCount)', self.requests[1][1]['fields'])
+
+    async def test_concurrent_vods_share_videos_call(self):
+        await asyncio.gather(self.client.get_vods("UC1"), self.client.get_vods("UC2"))
+        self.assertEqual(len([r for r in self.requests if r[0] == 'videos']), 1)
+
+    async def test_get_uploads_classifies_by_duration(self):
+        vods, shorts = await self.client.get_uploads("UC123")
+        self.assertEqual([v.video_id for v in vods], ["b", "d"])
+        self.assertEqual([v.video_id for v in shorts], ["a", "c"])
+        self.assertTrue(shorts[0].url.startswith("https://www.youtube.com/shorts/"))
+        self.assertEqual(self.requests[1][1]['part'], 'snippet,statistics,contentDetails')
+
+    async def test_etag_revalidation(self):
+        db = Database("test_etag_data.db")
+        await db.init_db()
+        try:
+            self.client.etag_store = db
+            first = await self.client.get_vods("UC123")
+            second = await self.client.get_vods("UC123")
+            self.assertEqual([v.video_id for v in first], [v.video_id for v in second])
+            # Only the playlist page is revalidated; batched videos.list calls aren't conditional
+            stats = self.client.etag_stats()
+            self.assertEqual(stats['revalidations'], 1)
+            self.assertEqual(stats['not_modified'], 1)
+            self.assertGreater(stats['bytes_saved'], 0)
+            async with db.db.execute('SELECT key FROM etag_cache') as cursor:
+                keys = [row[0] for row in await cursor.fetchall()]
+            self.assertEqual([k.split(':')[0] for k in keys], ['playlistItems'])
+        finally:
+            await db.close()
+            os.remove("test_etag_data.db")
+
+    async def test_http_error_returns_none(self):
+        self.assertIsNone(await self.client.get_vods("UCbroken"))
+
+class TestVideoBatcher(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = []
+
+        async def fetch(video_ids, part):
+            self.calls.append(list(video_ids))
+            return {"items": [{"id": v, "part": part} for v in video_ids if v != "gone"]}
+
+        self.batcher = VideoBatcher(fetch, window=0.01, max_batch_size=4)
+
+    async def test_concurrent_callers_share_batches(self):
+        results = await asyncio.gather(
+            self.batcher.get(["a", "b"], "snippet"),
+            self.batcher.get(["c", "gone"], "snippet"),
+            self.batcher.get(["a", "e", "f"], "snippet"),
+        )
+        self.assertEqual([[i["id"] for i in r] for r in results], [["a", "b"], ["c"], ["a", "e", "f"]])
+        # Batch fills up at 4 IDs and flushes, the remainder goes out on the timer
+        self.assertEqual([len(c) for c in self.calls], [4, 3])
+        stats = self.batcher.stats()
+        self.assertEqual(stats["batches_sent"], 2)
+        self.assertEqual(stats["ids_requested"], 7)
+        self.assertEqual(stats["fill_ratio"], 0.875)
+
+    async def test_error_reaches_every_caller(self):
+        async def failing_fetch(video_ids, part):
+            raise RuntimeError("boom")
+        self.batcher.fetch = failing_fetch
+
+        results = await asyncio.gather(
+            self.batcher.get(["a"], "snippet"),
+            self.batcher.get(["b"], "snippet"),
+            return_exceptions=True,
+        )
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+    async def test_batch_is_charged_at_highest_waiting_priority(self):
+        budget = QuotaBudget(daily_limit=250, background_reserve=0.2)
+        budget.used = 200  # At the background reserve, 50 units left for interactive calls
+
+        async def fetch(video_ids, part):
+            await budget.charge('videos')
+            return {"items": [{"id": v} for v in video_ids]}
+        self.batcher.fetch = fetch
+
+        async def background_get():
+            with quota_priority(Priority.BACKGROUND):
+                return await self.batcher.get(["a"], "snippet")
+
+        background = asyncio.create_task(background_get())
+        await asyncio.sleep(0)  # The background caller starts the batch
+        interactive = await self.batcher.get(["b"], "snippet")
+        self.assertEqual([i["id"] for i in interactive], ["b"])
+        self.assertEqual([i["id"] for i in await background], ["a"])
+
+        # Alone, a background batch is still refused
+        with quota_priority(Priority.BACKGROUND):
+            with self.assertRaises(QuotaExceededError):
+                await self.batcher.get(["c"], "snippet")
+
+class FakeClient:
+    """Stands in for YoutubeClient in service tests, counting API calls."""
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.calls = []
+        self.error = None
+        self.combined_uploads = False
+        self.quota = None
+
+    async def search_channel(self, name):
+        self.calls.append(('search', name))
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return "UC" + name.lower(), name
+
+    async def get_channels_by_ids(self, channel_ids):
+        self.calls.append(('channels', tuple(channel_ids)))
+        return {c: f"Title {c}" for c in channel_ids if not c.endswith("missing")}
+
+    async def get_channel(self, handle=None, username=None):
+        self.calls.append(('channel', handle or username))
+        return None if handle == "nobody" else ("UC" + (handle or username), handle or username)
+
+    async def get_vods(self, channel_id):
+        self.calls.append(('vods', channel_id))
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [Video(
+            title="Top", view_count=100, like_count=1, comment_count=1,
+            url="url", video_id="v1", type="VOD", published_at=datetime.now()
+        )]
+
+    async def get_shorts(self, channel_id):
+        self.calls.append(('shorts', channel_id))
+        await asyncio.sleep(self.delay)
+        return []
+
+    async def get_uploads(self, channel_id):
+        self.calls.append(('uploads', channel_id))
+        await asyncio.sleep(self.delay)
+        short = Video(
+            title="Short", view_count=50, like_count=0, comment_count=0,
+            url="url", video_id="s1", type="Short", published_at=datetime.now()
+        )
+        return (await self.get_vods(channel_id)), [short]
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_coalesces_and_cleans_up(self):
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*[flight.do("k", work) for _ in range(5)])
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(flight.in_flight(), 0)
+        self.assertEqual(await flight.do("k", work), 2)
+
+    async def test_errors_are_shared(self):
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("bad")
+
+        results = await asyncio.gather(*[flight.do("k", work) for _ in range(3)], return_exceptions=True)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(flight.in_flight(), 0)
+
+class TestChannelService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db_path = "test_service_data.db"
+        self.db = Database(self.db_path)
+        await self.db.init_db()
+        self.client = FakeClient()
+        self.service = ChannelService(self.db, self.client)
+        ChannelService.memory_cache.clear()
+        ChannelService.render_cache.clear()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    async def test_concurrent_fetches_hit_api_once(self):
+        results = await asyncio.gather(*[
+            ChannelService(self.db, self.client).fetch_data_for_channel("UC1", f"Title {i}", "VODs")
+            for i in range(10)
+        ])
+        self.assertEqual(self.client.calls, [('vods', 'UC1')])
+        # Each caller still gets a report with its own title
+        self.assertIn("Title 7", results[7][0])
+        self.assertEqual(len(results[7][1]), 1)
+
+    async def test_view_velocity_from_snapshots(self):
+        await self.service.fetch_data_for_channel("UC1", "Title", "VODs")
+        now = time.time()
+        video = (await self.service._get_cached_videos("vods:UC1"))[0]
+        for hours_ago, views in ((3, 1000), (2, 1600), (1, 2800)):
+            await self.db.add_video_stats([video._replace(view_count=views)], ts=now - hours_ago * 3600)
+
+        calls = len(self.client.calls)
+        series = await self.service.view_velocity("UC1", "VODs", window=86400, bucket=0)
+        self.assertEqual(len(self.client.calls), calls)
+        self.assertEqual(series[0]['title'], "Top")
+        rates = [round(rate) for _, rate in series[0]['points']]
+        # 1000 -> 1600 -> 2800 hourly, then the live fetch (100 views) doesn't go negative
+        self.assertEqual(rates[:2], [600, 1200])
+        self.assertEqual(rates[2], 0)
+
+        self.assertEqual(await self.service.view_velocity("UCnone", "VODs", window=86400), [])
+
+    async def test_render_cache(self):
+        renders = ChannelService.render_cache.renders
+        with patch.object(ChannelService, 'generate_report', wraps=self.service.generate_report) as render:
+            first, videos = await self.service.fetch_data_for_channel("UC1", "Title", "VODs")
+            second, _ = await ChannelService(self.db, self.client).fetch_data_for_channel("UC1", "Title", "VODs")
+            self.assertEqual(first, second)
+            self.assertEqual(render.call_count, 1)
+            # Changed stats are a different fingerprint
+            changed = [videos[0]._replace(view_count=101)]
+            self.service.render_report("Title", "UC1", changed, "VODs")
+            self.assertEqual(render.call_count, 2)
+
+            # Same leader, but a new upload moves its percentile from "top 100%" to "top 50%"
+            grown = changed + [videos[0]._replace(video_id="new", view_count=1, like_count=0, comment_count=0)]
+            by_engagement = self.service.render_report("Title", "UC1", changed, "VODs", sort="engagement")
+            regrown = self.service.render_report("Title", "UC1", grown, "VODs", sort="engagement")
+            self.assertEqual(render.call_count, 4)
+            self.assertIn("top 100%", by_engagement)
+            self.assertIn("top 50%", regrown)
+
+        data = [{'title': 'A', 'videos': videos}, {'title': 'B', 'videos': videos}]
+        with patch('services.generate_comparison_chart', return_value=b'png') as chart:
+            self.assertEqual(await ChannelService.comparison_chart(data), b'png')
+            self.assertEqual(await ChannelService.comparison_chart([dict(d) for d in data]), b'png')
+            self.assertEqual(chart.call_count, 1)
+            await ChannelService.comparison_chart([data[0], {'title': 'B', 'videos': changed}])
+            self.assertEqual(chart.call_count, 2)
+        self.assertEqual(ChannelService.cache_stats()['render']['renders'] - renders, 6)
+
+    async def test_concurrent_resolves_share_search(self):
+        results = await asyncio.gather(
+            self.service.resolve_channel("Creator"),
+            self.service.resolve_channel("creator "),
+        )
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual(results[0], ("UCcreator", "Creator", "Creator"))
+        self.assertEqual(results[1][2], "creator ")
+
+    async def test_resolution_tiers(self):
+        id_a, id_b, id_missing = "UC" + "a" * 22, "UC" + "b" * 22, "UC" + "x" * 15 + "missing"
+        ChannelService.resolution_stats.clear()
+        results = await self.service.resolve_channels(
+            [id_a, id_b, id_missing, "@handle", "https://youtube.com/@nobody", "Free Text"]
+        )
+        self.assertEqual(results[0], (id_a, f"Title {id_a}", id_a))
+        self.assertIsNone(results[2])
+        self.assertEqual(results[3], ("UChandle", "handle", "@handle"))
+        # Unknown handle falls back to search, free text goes straight to search
+        self.assertEqual(results[4][0], "UCnobody")
+        self.assertEqual(sorted(c for c in self.client.calls), sorted([
+            ('channels', (id_a, id_b, id_missing)),
+            ('channel', 'handle'), ('channel', 'nobody'),
+            ('search', 'nobody'), ('search', 'Free Text'),
+        ]))
+        self.assertEqual(ChannelService.resolution_stats['id'], 2)
+        self.assertEqual(ChannelService.resolution_stats['handle'], 1)
+        self.assertEqual(ChannelService.resolution_stats['search'], 2)
+
+        # Second round is answered from the cache
+        self.client.calls.clear()
+        await self.service.resolve_channels([id_a, "@handle"])
+        self.assertEqual(self.client.calls, [])
+        self.assertEqual(ChannelService.resolution_stats['cache'], 2)
+
+    async def test_memory_tier_serves_decoded_hits(self):
+        ChannelService.l2_stats.clear()
+        await self.service.fetch_data_for_channel("UC4", "T", "VODs")
+        _, first = await self.service.fetch_data_for_channel("UC4", "T", "VODs")
+
+        # A fresh process-level tier falls back to SQLite and promotes the entry
+        ChannelService.memory_cache.clear()
+        _, second = await self.service.fetch_data_for_channel("UC4", "T", "VODs")
+        _, third = await self.service.fetch_data_for_channel("UC4", "T", "VODs")
+        self.assertEqual(self.client.calls, [('vods', 'UC4')])
+        self.assertEqual(second[0].video_id, first[0].video_id)
+        self.assertIs(second, third)
+        self.assertEqual(ChannelService.l2_stats['hits'], 1)
+
+    async def test_stale_while_revalidate(self):
+        old = Video(
+            title="Old", view_count=5, like_count=0, comment_count=0,
+            url="url", video_id="old", type="VOD", published_at=datetime.now()
+        )
+        await self.db.set_cache("vods:UC5", [old.to_json()])
+        await self.db.db.execute('UPDATE cache SET timestamp = ? WHERE key = ?', (time.time() - 6.5 * 3600, "vods:UC5"))
+        await self.db.db.commit()
+
+        with patch.object(ChannelService, 'stale_grace', 3600):
+            first = await self.service.fetch_data_for_channel("UC5", "T", "VODs")
+            second = await self.service.fetch_data_for_channel("UC5", "T", "VODs")
+            # Both answered from the stale entry, only one refresh went out
+            self.assertEqual([first[1][0].video_id, second[1][0].video_id], ["old", "old"])
+            await asyncio.gather(*ChannelService._background_tasks)
+            self.assertEqual(self.client.calls, [('vods', 'UC5')])
+
+            _, fresh = await self.service.fetch_data_for_channel("UC5", "T", "VODs")
+            self.assertEqual(fresh[0].video_id, "v1")
+
+            # Past the grace window the request blocks on the API as before
+            await self.db.db.execute('UPDATE cache SET timestamp = ? WHERE key = ?', (time.time() - 8 * 3600, "vods:UC5"))
+            await self.db.db.commit()
+            ChannelService.memory_cache.clear()
+            self.client.calls.clear()
+            _, blocked = await self.service.fetch_data_for_channel("UC5", "T", "VODs")
+            self.assertEqual(self.client.calls, [('vods', 'UC5')])
+            self.assertEqual(len(ChannelService._background_tasks), 0)
+
+    async def test_prewarm_hot_channels(self):
+        await self.db.add_favorite(1, "UCfav", "Fav")
+        await self.db.record_channel_requests([("UCpop", "Pop"), ("UCfav", "Fav")])
+        await self.db.record_channel_requests([("UCpop", "Pop")])
+        hot = await self.service.hot_channels(window=3600, limit=10)
+        self.assertEqual(hot, ["UCfav", "UCpop"])
+
+        # UCpop VODs are fresh and skipped; the Shorts search for UCpop doesn't fit the budget
+        await self.service._cache_videos("vods:UCpop", [])
+        refreshed = await self.service.prewarm(hot, budget_units=110, lead=600)
+        self.assertEqual(refreshed, 2)
+        self.assertEqual(self.client.calls, [('vods', 'UCfav'), ('shorts', 'UCfav')])
+        self.assertIsNotNone(await self.db.get_cache("shorts:UCfav"))
+
+    def test_prewarm_daily_share(self):
+        self.assertEqual(self.service.prewarm_budget(300, 0.3), 300)  # No quota tracking
+        self.client.quota = QuotaBudget(daily_limit=1000)
+        self.assertEqual(self.service.prewarm_budget(200, 0.3), 200)
+        # The day's total usage, interactive included, caps what pre-warming may add
+        self.client.quota.used = 250
+        self.assertEqual(self.service.prewarm_budget(200, 0.3), 50)
+        self.client.quota.used = 400
+        self.assertEqual(self.service.prewarm_budget(200, 0.3), 0)
+
+    async def test_prewarm_skips_only_unaffordable_refreshes(self):
+        # Each 101-unit Shorts search is over budget, the 2-unit VOD refreshes after it still run
+        refreshed = await self.service.prewarm(["UCa", "UCb", "UCc"], budget_units=10, lead=600)
+        self.assertEqual(refreshed, 3)
+        self.assertEqual(self.client.calls, [('vods', 'UCa'), ('vods', 'UCb'), ('vods', 'UCc')])
+
+    async def test_prewarm_combined_uploads_fetches_once(self):
+        self.client.combined_uploads = True
+        # The VODs refresh fills Shorts as well, so the Shorts key is skipped, not fetched again
+        refreshed = await self.service.prewarm(["UCx"], budget_units=2, lead=600)
+        self.assertEqual(refreshed, 1)
+        self.assertEqual([c[0] for c in self.client.calls], ['uploads', 'vods'])
+        self.assertIsNotNone(await self.db.get_cache("shorts:UCx"))
+
+        # Only stale Shorts: one uploads fetch at its real cost, which a 1-unit budget can't cover
+        await self.db.db.execute('UPDATE cache SET timestamp = 0 WHERE key = ?', ("shorts:UCx",))
+        await self.db.db.commit()
+        ChannelService.memory_cache.clear()
+        self.client.calls.clear()
+        self.assertEqual(await self.service.prewarm(["UCx"], budget_units=1, lead=600), 0)
+        self.assertEqual(self.client.calls, [])
+        self.assertEqual(await self.service.prewarm(["UCx"], budget_units=2, lead=600), 1)
+        self.assertEqual([c[0] for c in self.client.calls], ['uploads', 'vods'])
+
+    async def test_fetch_error_shared(self):
+        self.client.error = RuntimeError("down")
+        results = await asyncio.gather(
+            self.service.fetch_data_for_channel("UC2", "T", "VODs"),
+            self.service.fetch_data_for_channel("UC2", "T", "VODs"),
+            return_exceptions=True,
+        )
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual(ChannelService.fetch_flights.in_flight(), 0)
+
+    async def test_combined_uploads_fill_both_modes(self):
+        self.client.combined_uploads = True
+        _, vods = await self.service.fetch_data_for_channel("UC3", "T", "VODs")
+        _, shorts = await self.service.fetch_data_for_channel("UC3", "T", "Shorts")
+        self.assertEqual(vods[0].video_id, "v1")
+        self.assertEqual(shorts[0].video_id, "s1")
+        # Switching modes was served from the cache filled by the one uploads call
+        self.assertEqual([c[0] for c in self.client.calls], ['uploads', 'vods'])
+
+class TestQuotaBudget(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db_path = "test_quota_data.db"
+        self.db = Database(self.db_path)
+        await self.db.init_db()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    async def test_spend_is_persisted(self):
+        budget = QuotaBudget(self.db, daily_limit=1000)
+        await budget.charge('search')
+        await budget.charge('videos')
+        self.assertEqual(budget.remaining, 899)
+
+        restored = QuotaBudget(self.db, daily_limit=1000)
+        await restored.load()
+        self.assertEqual(restored.used, 101)
+
+    async def test_priorities_and_search_floor(self):
+        budget = QuotaBudget(daily_limit=1000, background_reserve=0.2, search_floor=0.1)
+        budget.used = 750
+        # Background work stops at the reserve, interactive work continues
+        with quota_priority(Priority.BACKGROUND):
+            self.assertFalse(budget.can_spend('search'))
+            self.assertTrue(budget.can_spend('videos'))
+        self.assertTrue(budget.can_spend('search'))
+
+        budget.used = 850
+        self.assertFalse(budget.can_spend('search'))
+        self.assertTrue(budget.can_spend('playlistItems'))
+        with self.assertRaises(QuotaExceededError):
+            await budget.charge('search')
+        self.assertEqual(budget.snapshot()['refused'], 1)
+
+    async def test_client_charges_per_call(self):
+        client = YoutubeClient(api_key="TEST_KEY", quota=QuotaBudget(daily_limit=150))
+        client.service = MagicMock()
+        client.service.search().list().execute = MagicMock(return_value={"items": []})
+
+        async def mock_runner(func, *args, **kwargs):
+            return func(*args, **kwargs)
+        client._run_in_executor = mock_runner
+
+        await client.search_channel("a")
+        self.assertEqual(client.quota.remaining, 50)
+        with self.assertRaises(QuotaExceededError):
+            await client.search_channel("b")
+        client.close()
+
+    async def test_service_serves_stale_cache_when_out_of_quota(self):
+        ChannelService.memory_cache.clear()
+        video = Video(
+            title="Old", view_count=5, like_count=0, comment_count=0,
+            url="url", video_id="v", type="VOD", published_at=datetime.now()
+        )
+        await self.db.set_cache("vods:UCx", [video.to_json()])
+        await self.db.db.execute('UPDATE cache SET timestamp = 0 WHERE key = ?', ("vods:UCx",))
+        await self.db.db.commit()
+
+        client = FakeClient()
+        async def refuse(channel_id):
+            raise QuotaExceededError('playlistItems', 1, 0)
+        client.get_vods = refuse
+
+        report, videos = await ChannelService(self.db, client).fetch_data_for_channel("UCx", "Chan", "VODs")
+        self.assertEqual(videos[0].title, "Old")
+
+        report, videos = await ChannelService(self.db, client).fetch_data_for_channel("UCy", "Chan", "VODs")
+        self.assertEqual(videos, [])
+        self.assertIn("quota", report)
+
+class PagedClient:
+    """Serves a fake uploads playlist (newest first) 50 videos per page."""
+    def __init__(self, count):
+        self.uploads = [self.make(i) for i in range(count)][::-1]
+        self.pages_fetched = 0
+
+    @staticmethod
+    def make(i):
+        return Video(
+            title=f"Video {i}", view_count=(i * 37) % 1000, like_count=0, comment_count=0,
+            url="url", video_id=f"v{i}", type='Short' if i % 4 == 0 else 'VOD', published_at=datetime.now()
+        )
+
+    async def get_uploads_page(self, channel_id, page_token=None):
+        self.pages_fetched += 1
+        start = int(page_token or 0)
+        page = self.uploads[start:start + 50]
+        next_token = str(start + 50) if start + 50 < len(self.uploads) else None
+        return page, next_token
+
+    async def get_videos(self, video_ids):
+        return [v for v in self.uploads if v.video_id in video_ids]
+
+class TestCacheCodec(unittest.IsolatedAsyncioTestCase):
+    def make_videos(self, n):
+        from datetime import timezone
+        return [
+            Video(
+                title=f"Видео {i} 🎬", view_count=1_000_000 + i, like_count=i, comment_count=0,
+                url=f"https://www.youtube.com/watch?v=vid{i}", video_id=f"vid{i}",
+                type="Short" if i % 2 else "VOD",
+                published_at=datetime(2024, 3, 1, 17, 0, 12, tzinfo=timezone.utc)
+            )
+            for i in range(n)
+        ]
+
+    def test_validate_videos(self):
+        rows = [v.to_json() for v in self.make_videos(3)]
+        rows[0]['view_count'] = "1000000"
+        videos = validate_videos(rows)
+        self.assertTrue(all(isinstance(v, Video) for v in videos))
+        self.assertEqual(videos, self.make_videos(3))
+        rows[1]['published_at'] = "yesterday"
+        with self.assertRaises(ValueError):
+            validate_videos(rows)
+
+    def test_round_trip(self):
+        codec = BinaryCodec()
+        videos = self.make_videos(20)
+        videos[0] = videos[0]._replace(url="https://youtu.be/custom")
+        raw = codec.encode(videos)
+        self.assertEqual(raw[:2], BinaryCodec.MAGIC)
+        self.assertTrue(raw[3] & BinaryCodec.FLAG_ZLIB)
+        self.assertEqual(codec.decode(raw), videos)
+        self.assertLess(len(raw), len(json.dumps([v.to_json() for v in videos])) / 3)
+
+        self.assertEqual(codec.decode(codec.encode({"found": False})), {"found": False})
+        self.assertEqual(BinaryCodec(level=0).encode(videos)[3], 0)
+
+    def test_legacy_and_unknown_rows(self):
+        codec = BinaryCodec()
+        self.assertEqual(codec.decode('[{"a": 1}]'), [{"a": 1}])
+        newer = BinaryCodec.MAGIC + bytes([BinaryCodec.VERSION + 1, 0, 0])
+        with self.assertRaises(CacheDecodeError):
+            codec.decode(newer)
+
+    async def test_database_mixed_rows(self):
+        db_path = "test_codec.db"
+        db = Database(db_path, codec=BinaryCodec())
+        await db.init_db()
+        try:
+            videos = self.make_videos(3)
+            await db.db.execute(
+                'INSERT INTO cache (key, data, timestamp) VALUES (?, ?, ?)',
+                ("vods:old", json.dumps([v.to_json() for v in videos]), time.time())
+            )
+            await db.set_cache("vods:new", videos)
+            await db.db.execute(
+                'INSERT INTO cache (key, data, timestamp) VALUES (?, ?, ?)',
+                ("vods:future", BinaryCodec.MAGIC + b'\x09\x00\x01', time.time())
+            )
+
+            old = ChannelService._decode_videos(await db.get_cache("vods:old"))
+            new = ChannelService._decode_videos(await db.get_cache("vods:new"))
+            self.assertEqual(old, videos)
+            self.assertEqual(new, videos)
+            self.assertIsNone(await db.get_cache("vods:future"))
+        finally:
+            await db.close()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+class FakeKVServer:
+    """In-process stand-in for a Redis-compatible server: GET/SET EX/MGET/TTL/DEL/PING over RESP."""
+    def __init__(self):
+        self.data = {}  # key -> (value, expires_at)
+        self.commands = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def lookup(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            return None
+        return value
+
+    @staticmethod
+    def bulk(value):
+        return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                command = args[0].decode().upper()
+                self.commands.append(command)
+                if command == 'GET':
+                    reply = self.bulk(self.lookup(args[1]))
+                elif command == 'MGET':
+                    reply = b'*%d\r\n' % (len(args) - 1) + b''.join(self.bulk(self.lookup(k)) for k in args[1:])
+                elif command == 'SET':
+                    expires_at = time.monotonic() + int(args[4]) if len(args) > 4 else None
+                    self.data[args[1]] = (args[2], expires_at)
+                    reply = b'+OK\r\n'
+                elif command == 'TTL':
+                    expires_at = self.data.get(args[1], (None, None))[1]
+                    reply = b':%d\r\n' % (round(expires_at - time.monotonic()) if expires_at else -1)
+                elif command == 'PING':
+                    reply = b'+PONG\r\n'
+                else:
+                    reply = b'-ERR unknown command\r\n'
+                writer.write(reply)
+                await writer.drain()
+        finally:
+            writer.close()
+
+# A /start message as Telegram posts it to a webhook
+RECORDED_UPDATE = {
+    "update_id": 918273645,
+    "message": {
+        "message_id": 42,
+        "from": {"id": 1001, "is_bot": False, "first_name": "Ann", "username": "ann", "language_code": "en"},
+        "chat": {"id": 1001, "first_name": "Ann", "username": "ann", "type": "private"},
+        "date": 1717000000,
+        "text": "/start",
+        "entities": [{"offset": 0, "length": 6, "type": "bot_command"}],
+    },
+}
+
+class TestWebhook(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        from aiogram import Bot, Dispatcher, Router
+        from aiogram.types import Message
+        from aiohttp.test_utils import TestClient, TestServer
+        from webhook import WebhookServer
+
+        self.seen = []
+        self.release = asyncio.Event()
+        router = Router()
+
+        @router.message()
+        async def record(message: Message, db):
+            self.seen.append((message.text, db))
+            await self.release.wait()
+
+        self.dp = Dispatcher()
+        self.dp.include_router(router)
+        self.dp.workflow_data.update({"db": "the-db"})
+        self.bot = Bot(token="123456:TEST")
+        self.server = WebhookServer(self.dp, self.bot, secret_token="s3cret", max_in_flight=2, drain_timeout=1.0)
+        self.http = TestClient(TestServer(self.server.app()))
+        await self.http.start_server()
+
+    async def asyncTearDown(self):
+        self.release.set()
+        await self.server.close()
+        await self.http.close()
+        await self.bot.session.close()
+
+    def post(self, update=RECORDED_UPDATE, secret="s3cret"):
+        return self.http.post("/webhook", json=update, headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+
+    async def test_dispatches_recorded_update(self):
+        self.release.set()
+        self.assertEqual((await self.post(secret="wrong")).status, 401)
+        self.assertEqual((await self.http.post("/webhook", json=RECORDED_UPDATE)).status, 401)
+        self.assertEqual((await self.post(update={"message": "nope"})).status, 400)
+        self.assertEqual((await self.post()).status, 200)
+        await self.server.drain()
+        # Routed through the Dispatcher with its workflow_data, like polling
+        self.assertEqual(self.seen, [("/start", "the-db")])
+        self.assertEqual(self.server.stats()['unauthorized'], 2)
+
+    async def test_in_flight_limit_and_drain(self):
+        for i in range(2):
+            update = dict(RECORDED_UPDATE, update_id=i)
+            self.assertEqual((await self.post(update)).status, 200)
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.server.stats()['in_flight'], 2)
+        self.assertEqual((await self.post()).status, 503)
+
+        drain = asyncio.create_task(self.server.drain())
+        await asyncio.sleep(0.01)
+        self.assertEqual((await self.http.get("/healthz")).status, 503)
+        self.assertFalse(drain.done())
+        self.release.set()
+        await drain
+        self.assertEqual(self.server.stats()['in_flight'], 0)
+        self.assertEqual(len(self.seen), 2)
+        # Nothing new is taken once draining
+        self.assertEqual((await self.post()).status, 503)
+
+    def test_secret_is_required(self):
+        from webhook import WebhookServer
+        for secret in ("", "has spaces", "x" * 257):
+            with self.assertRaises(ValueError):
+                WebhookServer(self.dp, self.bot, secret_token=secret)
+
+    async def test_drain_timeout_cancels(self):
+        self.server.drain_timeout = 0.05
+        self.assertEqual((await self.post()).status, 200)
+        await asyncio.sleep(0.01)
+        await self.server.drain()
+        self.assertEqual(self.server.stats()['in_flight'], 0)
+
+class TestKVCacheBackend(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = FakeKVServer()
+        port = await self.server.start()
+        self.backend = KVCacheBackend.from_url(f"redis://127.0.0.1:{port}", codec=BinaryCodec(), retention=7200)
+        self.db_paths = []
+        ChannelService.memory_cache.clear()
+
+    async def asyncTearDown(self):
+        ChannelService.cache_backend = None
+        ChannelService.memory_cache.clear()
+        await self.backend.close()
+        await self.server.stop()
+        for path in self.db_paths:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    async def make_db(self, path):
+        self.db_paths.append(path)
+        db = Database(path)
+        await db.init_db()
+        return db
+
+    async def test_entries_channels_and_native_ttl(self):
+        video = Video(
+            title="Top", view_count=100, like_count=1, comment_count=1,
+            url="https://www.youtube.com/watch?v=v1", video_id="v1", type="VOD",
+            published_at=datetime(2024, 1, 1, tzinfo=__import__('datetime').timezone.utc)
+        )
+        await self.backend.set("vods:UC1", [video])
+        await self.backend.set("not_found:x", {"found": False}, ttl=60)
+        await self.backend.set_channel("Creator", "UC1", "Creator")
+
+        data, timestamp = await self.backend.get_entry("vods:UC1")
+        self.assertEqual(data, [video])
+        self.assertAlmostEqual(timestamp, time.time(), delta=5)
+
+        before = len(self.server.commands)
+        entries = await self.backend.get_entries(["vods:UC1", "not_found:x", "vods:missing"])
+        self.assertEqual(set(entries), {"vods:UC1", "not_found:x"})
+        self.assertEqual(self.server.commands[before:], ["MGET"])
+
+        channel_id, title, _ = await self.backend.get_channel("creator")
+        self.assertEqual((channel_id, title), ("UC1", "Creator"))
+
+        self.assertEqual(await self.backend.conn.execute('TTL', 'vantage:vods:UC1'), 7200)
+        self.assertEqual(await self.backend.conn.execute('TTL', 'vantage:not_found:x'), 60)
+
+    async def test_concurrent_commands_share_one_connection(self):
+        for i in range(20):
+            await self.backend.set(f"k{i}", {"i": i})
+        results = await asyncio.gather(*[self.backend.get_entry(f"k{i}") for i in range(20)])
+        self.assertEqual([r[0]["i"] for r in results], list(range(20)))
+
+    async def test_replicas_share_cache(self):
+        ChannelService.cache_backend = self.backend
+        client = FakeClient()
+        replica_a = ChannelService(await self.make_db("test_replica_a.db"), client)
+        replica_b = ChannelService(await self.make_db("test_replica_b.db"), client)
+
+        await replica_a.fetch_data_for_channel("UC1", "Title", "VODs")
+        ChannelService.memory_cache.clear()  # Replica B has its own L1
+        _, videos = await replica_b.fetch_data_for_channel("UC1", "Title", "VODs")
+        self.assertEqual(client.calls, [('vods', 'UC1')])
+        self.assertEqual(videos[0].video_id, "v1")
+
+        for replica in (replica_a, replica_b):
+            await replica.db.close()
+
+    async def test_expired_l1_defers_to_fresher_l2(self):
+        ChannelService.cache_backend = self.backend
+        client = FakeClient()
+        service = ChannelService(await self.make_db("test_replica_l1.db"), client)
+        published = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        old = Video(title="Old", view_count=1, like_count=0, comment_count=0,
+                    url="url", video_id="old", type="VOD", published_at=published)
+        new = old._replace(title="New", video_id="new")
+        expired = time.time() - ChannelService.VIDEOS_TTL - 60
+        ChannelService.memory_cache.set("vods:UC1", [old], max_age=86400, timestamp=expired)
+        ChannelService.memory_cache.set("vods:UC2", [old], max_age=86400, timestamp=expired)
+        # Another replica refreshed UC1 in the shared cache
+        await self.backend.set("vods:UC1", [new])
+
+        _, videos = await service.fetch_data_for_channel("UC1", "Title", "VODs")
+        self.assertEqual(videos[0].video_id, "new")
+        self.assertEqual(ChannelService.memory_cache.get_entry("vods:UC1")[0][0].video_id, "new")
+        self.assertEqual(await service.prewarm(["UC1"], budget_units=101, lead=600), 1)
+        # Only the Shorts key was missing everywhere
+        self.assertEqual(client.calls, [('shorts', 'UC1')])
+
+        # Nothing newer in L2: the expired L1 entry is refreshed from the API as before
+        _, videos = await service.fetch_data_for_channel("UC2", "Title", "VODs")
+        self.assertEqual(client.calls[-1], ('vods', 'UC2'))
+        await service.db.close()
+
+    async def test_server_down_degrades_to_misses(self):
+        await self.server.stop()
+        await self.backend.close()
+        self.assertIsNone(await self.backend.get_entry("k"))
+        await self.backend.set("k", {})
+        self.assertIsNone(await self.backend.get_channel("name"))
+        self.assertEqual(self.backend.errors, 3)
+
+class TestMemoryCache(unittest.TestCase):
+    def test_ttl_and_lru_eviction(self):
+        cache = MemoryCache(max_entries=3)
+        cache.set("dead", 1, max_age=10, timestamp=time.time() - 60)
+        cache.set("a", 1, max_age=60)
+        cache.set("b", 2, max_age=60)
+        self.assertIs(cache.get("dead", ttl=10), MISS)
+        self.assertEqual(cache.get_entry("dead")[0], 1)
+
+        cache.get("a", ttl=60)
+        cache.set("c", 3, max_age=60)
+        # Over the limit: the expired entry goes first, even though "b" is older in LRU order
+        self.assertIsNone(cache.get_entry("dead"))
+        self.assertEqual(cache.get("b", ttl=60), 2)
+
+        cache.set("d", 4, max_age=60)
+        self.assertIs(cache.get("a", ttl=60), MISS)
+        self.assertEqual(len(cache), 3)
+
+    def test_byte_limit(self):
+        cache = MemoryCache(max_entries=100, max_bytes=1000)
+        for i in range(10):
+            cache.set(i, "x", max_age=60, size=300)
+        self.assertEqual(len(cache), 3)
+        self.assertLessEqual(cache.bytes, 1000)
+        self.assertEqual(cache.stats()['evictions'], 7)
+
+class TestVideoIndex(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db_path = "test_index_data.db"
+        self.db = Database(self.db_path)
+        await self.db.init_db()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    async def test_incremental_crawl(self):
+        client = PagedClient(120)
+        index = VideoIndex(self.db, client, pages_per_visit=2, min_interval=0)
+
+        self.assertTrue(await index.update("UC1"))
+        self.assertEqual(client.pages_fetched, 2)
+        newest, token, complete, _ = await self.db.get_crawl_state("UC1")
+        self.assertEqual((newest, token, complete), ("v119", "100", 0))
+
+        # Three new uploads: one head page reaches known videos, the rest of the budget finishes the backfill
+        client.uploads = [client.make(i) for i in (122, 121, 120)] + client.uploads
+        client.pages_fetched = 0
+        await index.update("UC1")
+        self.assertEqual(client.pages_fetched, 2)
+        newest, token, complete, _ = await self.db.get_crawl_state("UC1")
+        self.assertEqual((newest, complete), ("v122", 1))
+
+        all_videos = client.uploads
+        expected = sorted((v for v in all_videos if v.type == 'VOD'), key=lambda v: v.view_count, reverse=True)[:3]
+        top = await index.top("UC1", "VODs")
+        self.assertEqual([v.video_id for v in top], [v.video_id for v in expected])
+        self.assertTrue(all(v.type == 'Short' for v in await index.top("UC1", "Shorts")))
+
+    async def test_rank_query_uses_index(self):
+        async with self.db.db.execute(
+            "EXPLAIN QUERY PLAN SELECT video_id FROM videos WHERE channel_id = ? AND type = ? ORDER BY view_count DESC LIMIT 3",
+            ("UC1", "VOD")
+        ) as cursor:
+            plan = " ".join(str(row) for row in await cursor.fetchall())
+        self.assertIn("idx_videos_rank", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,4 +1,7 @@
+import re
 import shlex
+import time
+from contextlib import contextmanager
 from typing import List
 from datetime import datetime, timezone
 
@@ -19,6 +22,50 @@ def time_ago(dt: datetime) -> str:
     else:
         return "Just now"
 
+_DURATION_RE = re.compile(
+    r'^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+)
+
+def parse_iso_duration(value: str | None) -> int:
+    """Parses an ISO 8601 duration like PT1M30S into seconds (0 if unparseable)."""
+    match = _DURATION_RE.match(value or '')
+    if not match:
+        return 0
+    parts = {k: int(v) for k, v in match.groupdict(default='0').items()}
+    return parts['days'] * 86400 + parts['hours'] * 3600 + parts['minutes'] * 60 + parts['seconds']
+
+_CHANNEL_ID_RE = re.compile(r'^UC[A-Za-z0-9_-]{22}$')
+_CHANNEL_URL_RE = re.compile(
+    r'^(?:https?://)?(?:www\.|m\.)?youtube\.com/(?:(?P<kind>channel|user|c)/)?(?P<value>@?[^/?#\s]+)',
+    re.IGNORECASE
+)
+
+def parse_channel_ref(text: str) -> tuple[str, str]:
+    """
+    Works out what the user typed. Returns (kind, value) where kind is
+    'id' (UC... channel ID), 'handle' (without the @), 'username' (legacy /user/ URL)
+    or 'name' (free text that needs a search).
+    """
+    text = text.strip()
+    match = _CHANNEL_URL_RE.match(text)
+    if match:
+        kind, value = (match.group('kind') or '').lower(), match.group('value')
+        if kind == 'channel' and _CHANNEL_ID_RE.match(value):
+            return 'id', value
+        if kind == 'user':
+            return 'username', value
+        if not kind and value.startswith('@'):
+            return 'handle', value[1:]
+        if kind == 'c':
+            # Custom URLs have no lookup endpoint, search for the name
+            return 'name', value
+        return 'name', text
+    if _CHANNEL_ID_RE.match(text):
+        return 'id', text
+    if text.startswith('@') and len(text) > 1 and ' ' not in text:
+        return 'handle', text[1:]
+    return 'name', text
+
 def format_number(num: int) -> str:
     """Formats a number into K/M suffix string."""
     if num >= 1_000_000:
@@ -67,3 +114,26 @@ def split_text(text: str, limit: int = 4096) -> List[str]:
         chunks.append(current_chunk)
 
     return chunks
+
+class StartupTimer:
+    """Wall time of named startup phases, for the log line that shows where a cold start goes."""
+    def __init__(self, started: float | None = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def record(self, name: str, since: float):
+        """Records a phase that began at perf_counter() value `since` and ends now."""
+        self.phases[name] = time.perf_counter() - since
+
+    def report(self) -> str:
+        parts = [f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.phases.items()]
+        total = (time.perf_counter() - self.started) * 1000
+        return f"{', '.join(parts)}; total={total:.0f}ms"
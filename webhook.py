@@ -0,0 +1,150 @@
+import asyncio
+import hmac
+import logging
+import re
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from pydantic import ValidationError
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# What setWebhook accepts as secret_token
+SECRET_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
+class WebhookServer:
+    """
+    Receives Telegram updates as HTTP POSTs and feeds them to the Dispatcher, so the
+    same routers, middlewares and workflow_data serve webhook and polling alike.
+
+    Each accepted update is answered 200 right away and handled in a task. Requests
+    without the secret token get 401; a server can't be built without one, since
+    anyone who finds the URL could otherwise post forged updates. Once `max_in_flight` updates are being handled,
+    further ones get 503; Telegram redelivers them later (or, behind a load balancer,
+    possibly to another replica). drain() stops taking updates and waits for the ones
+    in flight. GET /healthz answers 503 while draining so balancers stop routing here.
+    """
+    def __init__(self, dp: Dispatcher, bot: Bot, secret_token: str, path: str = '/webhook',
+                 max_in_flight: int = 100, drain_timeout: float = 25.0):
+        if not SECRET_PATTERN.fullmatch(secret_token or ''):
+            raise ValueError("Webhook mode needs a secret token of 1-256 characters A-Z, a-z, 0-9, _ or -")
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.max_in_flight = max_in_flight
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self._tasks: set[asyncio.Task] = set()
+        self._runner: web.AppRunner | None = None
+        self.accepted = 0
+        self.rejected = 0
+        self.unauthorized = 0
+        self.invalid = 0
+        self.failed = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get('/healthz', self.handle_health)
+        return app
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.Response(status=503, text='draining')
+        return web.Response(text='ok')
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, '').encode(), self.secret_token.encode()):
+            self.unauthorized += 1
+            return web.Response(status=401)
+        if self.draining or len(self._tasks) >= self.max_in_flight:
+            self.rejected += 1
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={'bot': self.bot})
+        except (ValueError, ValidationError):
+            self.invalid += 1
+            return web.Response(status=400)
+
+        self.accepted += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({})
+
+    async def _process(self, update: Update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.failed += 1
+            logging.error(f"Error handling update {update.update_id}: {e}")
+
+    async def start(self, host: str, port: int):
+        self._runner = web.AppRunner(self.app(), handle_signals=False)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def drain(self):
+        """Refuses new updates, waits up to drain_timeout for in-flight ones, cancels the rest."""
+        self.draining = True
+        if self._tasks:
+            logging.info(f"Draining {len(self._tasks)} in-flight updates...")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logging.warning(f"Cancelled {len(pending)} updates still running after {self.drain_timeout}s")
+                await asyncio.wait(pending)
+
+    async def close(self):
+        await self.drain()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': len(self._tasks),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'unauthorized': self.unauthorized,
+            'invalid': self.invalid,
+            'failed': self.failed,
+        }
+
+async def run_webhook(dp: Dispatcher, bot: Bot, server: WebhookServer, host: str, port: int, url: str = ''):
+    """
+    The webhook counterpart of dp.start_polling: emits startup, serves until SIGINT/SIGTERM,
+    drains, emits shutdown. The webhook is registered with Telegram when `url` is given;
+    it isn't removed on exit, since other replicas may still be serving it.
+    """
+    workflow_data = {'dispatcher': dp, 'bots': [bot], **dp.workflow_data}
+    workflow_data.pop('bot', None)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await dp.emit_startup(bot=bot, **workflow_data)
+    try:
+        await server.start(host, port)
+        if url:
+            await bot.set_webhook(
+                url.rstrip('/') + server.path,
+                secret_token=server.secret_token,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=min(server.max_in_flight, 100),
+            )
+        logging.info(f"Serving webhook on {host}:{port}{server.path}")
+        await stop.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        await server.close()
+        logging.info(f"Webhook stopped: {server.stats()}")
+        try:
+            await dp.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()
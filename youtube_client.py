@@ -1,15 +1,25 @@
 import asyncio
-from typing import List, Optional
+import json
+from typing import List, NamedTuple, Optional
 import time
 import functools
-from googleapiclient.discovery import build
+import aiohttp
+import httplib2
+import threading
 from googleapiclient.errors import HttpError
-from pydantic import BaseModel
+from pydantic import TypeAdapter
 from concurrent.futures import ThreadPoolExecutor
+from quota import QuotaBudget, Priority, current_priority, priority
+from utils import parse_iso_duration
 
 from datetime import datetime
 
-class Video(BaseModel):
+class Video(NamedTuple):
+    """
+    One video's stats. A plain immutable tuple: cheap to build, compact, safe to share
+    between cache tiers and requests. Nothing is validated on construction; data from
+    outside the process (JSON cache rows, DB rows) goes through validate_videos().
+    """
     title: str
     view_count: int
     like_count: int
@@ -19,6 +29,19 @@ class Video(BaseModel):
     type: str  # 'VOD' or 'Short'
     published_at: datetime
 
+    def to_json(self) -> dict:
+        return {
+            'title': self.title, 'view_count': self.view_count, 'like_count': self.like_count,
+            'comment_count': self.comment_count, 'url': self.url, 'video_id': self.video_id,
+            'type': self.type, 'published_at': self.published_at.isoformat(),
+        }
+
+_video_list = TypeAdapter(list[Video])
+
+def validate_videos(rows: list[dict]) -> list[Video]:
+    """Validates and converts a whole batch of video dicts in one pydantic call."""
+    return _video_list.validate_python(rows)
+
 def retry_async(max_retries=3, delay=1.0, backoff=2.0):
     def decorator(func):
         @functools.wraps(func)
@@ -39,19 +62,314 @@ def retry_async(max_retries=3, delay=1.0, backoff=2.0):
         return wrapper
     return decorator
 
+YOUTUBE_API_URL = "https://www.googleapis.com/youtube/v3"
+
+# Returned by the transports when the API answers 304 to an If-None-Match request
+NOT_MODIFIED = object()
+
+# Partial-response masks: only what Video (and revalidation) needs comes back over the wire
+SEARCH_CHANNEL_FIELDS = 'items(snippet(channelId,channelTitle))'
+SEARCH_VIDEO_FIELDS = 'items(id(videoId))'
+CHANNEL_FIELDS = 'items(id,snippet(title))'
+PLAYLIST_FIELDS = 'etag,nextPageToken,items(contentDetails(videoId))'
+
+def video_fields(part: str) -> str:
+    fields = 'id,snippet(title,publishedAt),statistics(viewCount,likeCount,commentCount)'
+    if 'contentDetails' in part:
+        fields += ',contentDetails(duration)'
+    return f'etag,items({fields})'
+
+def uploads_playlist_id(channel_id: str) -> str:
+    # Convert UC to UU
+    if channel_id.startswith('UC'):
+        return 'UU' + channel_id[2:]
+    return channel_id # Should not happen usually
+
+def parse_video(item: dict, video_type: str) -> Video:
+    """
+    Builds a Video from a (field-masked) videos.list item.
+    Values are converted here, so no validation pass is needed.
+    """
+    stats = item.get('statistics', {})
+    snippet = item.get('snippet', {})
+
+    published_at_str = snippet.get('publishedAt')
+    # format: 2023-10-27T10:00:00Z
+    try:
+        published_at = datetime.fromisoformat(published_at_str.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        published_at = datetime.now() # Fallback
+
+    if video_type == 'Short':
+        url = f"https://www.youtube.com/shorts/{item['id']}"
+    else:
+        url = f"https://www.youtube.com/watch?v={item['id']}"
+
+    return Video(
+        title=snippet.get('title', 'Unknown'),
+        view_count=int(stats.get('viewCount', 0)),
+        like_count=int(stats.get('likeCount', 0)),
+        comment_count=int(stats.get('commentCount', 0)),
+        url=url,
+        video_id=item['id'],
+        type=video_type,
+        published_at=published_at
+    )
+
+class VideoBatcher:
+    """
+    Coalesces videos.list lookups from concurrent callers.
+    IDs are collected for `window` seconds (or until `max_batch_size` are pending),
+    then sent as one request per chunk. Each caller only gets the items it asked for.
+    A chunk is charged at the highest quota priority among the callers waiting on it,
+    not at the priority of whichever caller happened to start the batch.
+    """
+    def __init__(self, fetch, window: float = 0.005, max_batch_size: int = 50):
+        self.fetch = fetch  # async (video_ids, part) -> response dict
+        self.window = window
+        self.max_batch_size = max(1, min(max_batch_size, 50))  # API hard limit is 50 IDs
+        self._pending: dict[str, dict[str, list[asyncio.Future]]] = {}  # part -> video_id -> waiters
+        self._levels: dict[str, dict[str, Priority]] = {}  # part -> video_id -> highest waiting priority
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._tasks = set()
+        self.requests = 0
+        self.ids_requested = 0
+        self.batches_sent = 0
+        self.ids_sent = 0
+
+    async def get(self, video_ids: List[str], part: str) -> List[dict]:
+        """Returns the API items for video_ids (missing/private videos are skipped)."""
+        if not video_ids:
+            return []
+        loop = asyncio.get_running_loop()
+        pending = self._pending.setdefault(part, {})
+        levels = self._levels.setdefault(part, {})
+        level = current_priority()
+        futures = []
+        for video_id in video_ids:
+            future = loop.create_future()
+            pending.setdefault(video_id, []).append(future)
+            levels[video_id] = min(levels.get(video_id, level), level)
+            futures.append(future)
+
+        self.requests += 1
+        self.ids_requested += len(video_ids)
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(part)
+        elif part not in self._timers:
+            self._timers[part] = loop.call_later(self.window, self._flush, part)
+
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return [r for r in results if r is not None]
+
+    def _flush(self, part: str):
+        timer = self._timers.pop(part, None)
+        if timer:
+            timer.cancel()
+        pending = self._pending.pop(part, {})
+        levels = self._levels.pop(part, {})
+        ids = list(pending)
+        for i in range(0, len(ids), self.max_batch_size):
+            chunk = {video_id: pending[video_id] for video_id in ids[i:i + self.max_batch_size]}
+            # Priority.INTERACTIVE is the lowest value
+            level = min(levels[video_id] for video_id in chunk)
+            task = asyncio.create_task(self._send(part, chunk, level))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, part: str, chunk: dict[str, list[asyncio.Future]], level: Priority):
+        self.batches_sent += 1
+        self.ids_sent += len(chunk)
+        try:
+            # The task inherited the context of whoever started the batch; charge for its waiters instead
+            with priority(level):
+                response = await self.fetch(list(chunk), part)
+        except Exception as e:
+            for waiters in chunk.values():
+                for future in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        items = {item['id']: item for item in response.get('items', [])}
+        for video_id, waiters in chunk.items():
+            for future in waiters:
+                if not future.done():
+                    future.set_result(items.get(video_id))
+
+    def stats(self) -> dict:
+        fill_ratio = self.ids_sent / (self.batches_sent * self.max_batch_size) if self.batches_sent else 0.0
+        return {
+            'requests': self.requests,
+            'ids_requested': self.ids_requested,
+            'batches_sent': self.batches_sent,
+            'ids_sent': self.ids_sent,
+            'fill_ratio': round(fill_ratio, 3),
+        }
+
 class YoutubeClient:
-    def __init__(self, api_key: str):
+    """
+    transport='discovery' runs googleapiclient in a thread pool.
+    transport='rest' calls the REST endpoints directly on the event loop
+    through a pooled keep-alive aiohttp session.
+    """
+    def __init__(self, api_key: str, transport: str = 'discovery',
+                 max_concurrency: int = 20, base_url: str = YOUTUBE_API_URL,
+                 batch_window: float = 0.005, batch_max_size: int = 50,
+                 quota: Optional[QuotaBudget] = None,
+                 combined_uploads: bool = False, shorts_max_duration: int = 60,
+                 etag_store=None):
+        if transport not in ('discovery', 'rest'):
+            raise ValueError(f"Unknown YouTube transport: {transport}")
         self.api_key = api_key
-        self.service = build('youtube', 'v3', developerKey=self.api_key)
+        self.transport = transport
+        self.max_concurrency = max_concurrency
+        self.base_url = base_url.rstrip('/')
+        # Built on first use (or by warm_up): loading the discovery client and document is slow
+        self._service = None
+        self._service_lock = threading.Lock()
         self.executor = ThreadPoolExecutor(max_workers=5)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.quota = quota
+        # When set, ChannelService fills both VODs and Shorts from one get_uploads call
+        self.combined_uploads = combined_uploads
+        self.shorts_max_duration = shorts_max_duration
+        # Database holding ETags + payloads for conditional requests (None disables revalidation)
+        self.etag_store = etag_store
+        self.revalidations = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+        self.video_batcher = VideoBatcher(self._fetch_video_batch, window=batch_window, max_batch_size=batch_max_size)
 
     def close(self):
         self.executor.shutdown(wait=False)
 
+    async def aclose(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.close()
+
     async def _run_in_executor(self, func, *args, **kwargs):
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running loop
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=30),
+            )
+        return self.session
+
+    async def _rest_get(self, resource: str, params: dict, etag: Optional[str] = None):
+        url = f"{self.base_url}/{resource}"
+        query = {k: str(v) for k, v in params.items()}
+        query['key'] = self.api_key
+        headers = {'If-None-Match': etag} if etag else None
+        try:
+            async with self._get_session().get(url, params=query, headers=headers) as resp:
+                body = await resp.read()
+                status = resp.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Treat connection failures as 503 so retry_async picks them up
+            raise HttpError(httplib2.Response({'status': 503}), str(e).encode(), uri=url)
+        if status == 304:
+            return NOT_MODIFIED
+        if status >= 400:
+            # Same error type as the discovery transport so retries and callers behave identically
+            raise HttpError(httplib2.Response({'status': status}), body, uri=url)
+        return json.loads(body)
+
+    @property
+    def service(self):
+        if self._service is None and self.transport == 'discovery':
+            # Executor threads may race to build it; only one does
+            with self._service_lock:
+                if self._service is None:
+                    from googleapiclient.discovery import build
+                    self._service = build('youtube', 'v3', developerKey=self.api_key)
+        return self._service
+
+    @service.setter
+    def service(self, service):
+        self._service = service
+
+    def warm_up(self):
+        """Builds the discovery service ahead of the first request (blocking; run it in a thread)."""
+        self.service
+
+    async def _send(self, resource: str, params: dict, etag: Optional[str] = None):
+        """Calls `<resource>.list` on the configured transport. Returns NOT_MODIFIED on a 304."""
+        if self.quota:
+            # Raises QuotaExceededError before anything goes over the wire
+            await self.quota.charge(resource)
+        if self.transport == 'rest':
+            return await self._rest_get(resource, params, etag)
+        if self._service is None:
+            # Keep the one-time build off the event loop
+            await self._run_in_executor(self.warm_up)
+        request = getattr(self.service, resource)().list(**params)
+        if etag:
+            request.headers['If-None-Match'] = etag
+        try:
+            return await self._run_in_executor(request.execute)
+        except HttpError as e:
+            if etag and e.resp.status == 304:
+                return NOT_MODIFIED
+            raise
+
+    async def _request(self, resource: str, conditional: bool = False, **params) -> dict:
+        """
+        Calls `<resource>.list` with the given params.
+        With conditional=True the response is stored with its ETag and later calls
+        revalidate it with If-None-Match, reusing the stored payload on a 304.
+        """
+        if not (conditional and self.etag_store):
+            return await self._send(resource, params)
+
+        key = f"{resource}:{json.dumps(params, sort_keys=True)}"
+        stored = await self.etag_store.get_etag_entry(key)
+        if stored:
+            self.revalidations += 1
+        response = await self._send(resource, params, etag=stored[0] if stored else None)
+
+        if response is NOT_MODIFIED:
+            etag, data, size = stored
+            self.not_modified += 1
+            self.bytes_saved += size
+            await self.etag_store.touch_etag_entry(key)
+            return data
+
+        if response.get('etag'):
+            await self.etag_store.set_etag_entry(key, response['etag'], response)
+        return response
+
+    def etag_stats(self) -> dict:
+        hit_rate = self.not_modified / self.revalidations if self.revalidations else 0.0
+        return {
+            'revalidations': self.revalidations,
+            'not_modified': self.not_modified,
+            'hit_rate': round(hit_rate, 3),
+            'bytes_saved': self.bytes_saved,
+        }
+
+    @retry_async()
+    async def _fetch_video_batch(self, video_ids: List[str], part: str) -> dict:
+        # Not conditional: a batch mixes the IDs of whichever callers were concurrent, so the
+        # same ID set (and ETag) rarely comes back, and view counts change between calls anyway
+        return await self._request(
+            'videos',
+            id=','.join(video_ids),
+            part=part,
+            fields=video_fields(part)
+        )
+
     @retry_async()
     async def search_channel(self, name: str) -> Optional[tuple[str, str]]:
         """
@@ -59,13 +377,13 @@ class YoutubeClient:
         Returns (channel_id, title) or None if not found.
         """
         try:
-            response = await self._run_in_executor(
-                self.service.search().list(
-                    q=name,
-                    type='channel',
-                    part='snippet',
-                    maxResults=1
-                ).execute
+            response = await self._request(
+                'search',
+                q=name,
+                type='channel',
+                part='snippet',
+                fields=SEARCH_CHANNEL_FIELDS,
+                maxResults=1
             )
             items = response.get('items', [])
             if not items:
@@ -79,68 +397,81 @@ class YoutubeClient:
             return None
 
     @retry_async()
-    async def get_vods(self, channel_id: str) -> List[Video]:
+    async def get_channels_by_ids(self, channel_ids: List[str]) -> Optional[dict[str, str]]:
         """
-        Fetches top 3 most watched VODs from the last 50 uploads.
-        Returns empty list on API error or no videos.
+        Looks up up to 50 channel IDs in one 1-unit channels.list call.
+        Returns {channel_id: title} for the ones that exist, or None on API error.
         """
-        # Convert UC to UU
-        if channel_id.startswith('UC'):
-            uploads_playlist_id = 'UU' + channel_id[2:]
-        else:
-            uploads_playlist_id = channel_id # Should not happen usually
-
         try:
-            # Fetch top 50 uploads
-            pl_response = await self._run_in_executor(
-                self.service.playlistItems().list(
-                    playlistId=uploads_playlist_id,
-                    part='contentDetails',
-                    maxResults=50
-                ).execute
+            response = await self._request(
+                'channels',
+                id=','.join(channel_ids[:50]),
+                part='snippet',
+                fields=CHANNEL_FIELDS,
+                maxResults=50
             )
+            return {item['id']: item['snippet']['title'] for item in response.get('items', [])}
+        except HttpError as e:
+            print(f"Error looking up channels {channel_ids}: {e}")
+            return None
 
-            video_ids = [item['contentDetails']['videoId'] for item in pl_response.get('items', [])]
+    @retry_async()
+    async def get_channel(self, handle: Optional[str] = None, username: Optional[str] = None) -> Optional[tuple[str, str]]:
+        """
+        Exact 1-unit lookup by @handle or legacy username.
+        Returns (channel_id, title) or None if not found.
+        """
+        params = {'forHandle': handle} if handle else {'forUsername': username}
+        try:
+            response = await self._request('channels', part='snippet', fields=CHANNEL_FIELDS, **params)
+            items = response.get('items', [])
+            if not items:
+                return None
+            return items[0]['id'], items[0]['snippet']['title']
+        except HttpError as e:
+            print(f"Error looking up channel {handle or username}: {e}")
+            return None
+
+    async def _get_upload_ids(self, channel_id: str, page_token: Optional[str] = None) -> tuple[List[str], Optional[str]]:
+        """One page (50 IDs, newest first) of the uploads playlist and the token of the next page."""
+        params = {'pageToken': page_token} if page_token else {}
+        pl_response = await self._request(
+            'playlistItems',
+            conditional=True,
+            playlistId=uploads_playlist_id(channel_id),
+            part='contentDetails',
+            fields=PLAYLIST_FIELDS,
+            maxResults=50,
+            **params
+        )
+        video_ids = [item['contentDetails']['videoId'] for item in pl_response.get('items', [])]
+        return video_ids, pl_response.get('nextPageToken')
+
+    async def _get_classified(self, video_ids: List[str]) -> List[Video]:
+        """Fetches the videos with contentDetails and labels each as a Short or VOD by duration."""
+        items = await self.video_batcher.get(video_ids, 'snippet,statistics,contentDetails')
+        videos = []
+        for item in items:
+            duration = parse_iso_duration(item.get('contentDetails', {}).get('duration'))
+            # Upcoming/live streams report a zero duration, they're not Shorts
+            is_short = 0 < duration <= self.shorts_max_duration
+            videos.append(parse_video(item, 'Short' if is_short else 'VOD'))
+        return videos
+
+    @retry_async()
+    async def get_vods(self, channel_id: str) -> List[Video]:
+        """
+        Fetches the last 50 uploads as VODs, unranked (see ranking.top).
+        Returns empty list if there are no videos, None on API error.
+        """
+        try:
+            video_ids, _ = await self._get_upload_ids(channel_id)
             if not video_ids:
                 return []
 
             # Fetch details (statistics) for these videos
-            vid_response = await self._run_in_executor(
-                self.service.videos().list(
-                    id=','.join(video_ids),
-                    part='snippet,statistics'
-                ).execute
-            )
-
-            videos = []
-            for item in vid_response.get('items', []):
-                stats = item.get('statistics', {})
-                snippet = item.get('snippet', {})
-                view_count = int(stats.get('viewCount', 0))
-                like_count = int(stats.get('likeCount', 0))
-                comment_count = int(stats.get('commentCount', 0))
-
-                published_at_str = snippet.get('publishedAt')
-                # format: 2023-10-27T10:00:00Z
-                try:
-                    published_at = datetime.fromisoformat(published_at_str.replace('Z', '+00:00'))
-                except (ValueError, AttributeError):
-                    published_at = datetime.now() # Fallback
-
-                videos.append(Video(
-                    title=snippet.get('title', 'Unknown'),
-                    view_count=view_count,
-                    like_count=like_count,
-                    comment_count=comment_count,
-                    url=f"https://www.youtube.com/watch?v={item['id']}",
-                    video_id=item['id'],
-                    type='VOD',
-                    published_at=published_at
-                ))
-
-            # Sort by view count desc and take top 3
-            videos.sort(key=lambda x: x.view_count, reverse=True)
-            return videos[:3]
+            items = await self.video_batcher.get(video_ids, 'snippet,statistics')
+            return [parse_video(item, 'VOD') for item in items]
 
         except HttpError as e:
             print(f"Error fetching VODs for {channel_id}: {e}")
@@ -149,19 +480,20 @@ class YoutubeClient:
     @retry_async()
     async def get_shorts(self, channel_id: str) -> List[Video]:
         """
-        Fetches top 3 most watched Shorts.
+        Fetches the channel's most watched Shorts (up to 50), unranked.
+        The search costs the same 100 units whatever maxResults is.
         """
         try:
             # Search for shorts ordered by viewCount
-            search_response = await self._run_in_executor(
-                self.service.search().list(
-                    channelId=channel_id,
-                    type='video',
-                    videoDuration='short',
-                    order='viewCount',
-                    part='id',
-                    maxResults=3
-                ).execute
+            search_response = await self._request(
+                'search',
+                channelId=channel_id,
+                type='video',
+                videoDuration='short',
+                order='viewCount',
+                part='id',
+                fields=SEARCH_VIDEO_FIELDS,
+                maxResults=50
             )
 
             video_ids = [item['id']['videoId'] for item in search_response.get('items', [])]
@@ -169,42 +501,54 @@ class YoutubeClient:
                 return []
 
             # Fetch details to get exact view count and title
-            vid_response = await self._run_in_executor(
-                self.service.videos().list(
-                    id=','.join(video_ids),
-                    part='snippet,statistics'
-                ).execute
-            )
+            items = await self.video_batcher.get(video_ids, 'snippet,statistics')
+            return [parse_video(item, 'Short') for item in items]
 
-            videos = []
-            for item in vid_response.get('items', []):
-                stats = item.get('statistics', {})
-                snippet = item.get('snippet', {})
-                view_count = int(stats.get('viewCount', 0))
-                like_count = int(stats.get('likeCount', 0))
-                comment_count = int(stats.get('commentCount', 0))
+        except HttpError as e:
+            print(f"Error fetching Shorts for {channel_id}: {e}")
+            return None # None indicates API error
 
-                published_at_str = snippet.get('publishedAt')
-                try:
-                    published_at = datetime.fromisoformat(published_at_str.replace('Z', '+00:00'))
-                except (ValueError, AttributeError):
-                    published_at = datetime.now() # Fallback
-
-                videos.append(Video(
-                    title=snippet.get('title', 'Unknown'),
-                    view_count=view_count,
-                    like_count=like_count,
-                    comment_count=comment_count,
-                    url=f"https://www.youtube.com/shorts/{item['id']}",
-                    video_id=item['id'],
-                    type='Short',
-                    published_at=published_at
-                ))
-
-            # Sort again just in case (though API should have sorted it)
-            videos.sort(key=lambda x: x.view_count, reverse=True)
-            return videos
+    @retry_async()
+    async def get_uploads(self, channel_id: str) -> Optional[tuple[List[Video], List[Video]]]:
+        """
+        Fetches the last 50 uploads once and splits them into VODs and Shorts by duration.
+        Returns (VODs, Shorts), unranked, or None on API error.
+        Costs 2 quota units instead of the 100-unit search get_shorts needs.
+        """
+        try:
+            video_ids, _ = await self._get_upload_ids(channel_id)
+            if not video_ids:
+                return [], []
+
+            videos = await self._get_classified(video_ids)
+            vods = [v for v in videos if v.type == 'VOD']
+            shorts = [v for v in videos if v.type == 'Short']
+            return vods, shorts
 
         except HttpError as e:
-            print(f"Error fetching Shorts for {channel_id}: {e}")
+            print(f"Error fetching uploads for {channel_id}: {e}")
             return None # None indicates API error
+
+    @retry_async()
+    async def get_uploads_page(self, channel_id: str, page_token: Optional[str] = None) -> Optional[tuple[List[Video], Optional[str]]]:
+        """
+        Fetches one page of the uploads playlist with stats, classified by duration.
+        Returns (videos, next_page_token), or None on API error.
+        """
+        try:
+            video_ids, next_page_token = await self._get_upload_ids(channel_id, page_token)
+            if not video_ids:
+                return [], next_page_token
+            return await self._get_classified(video_ids), next_page_token
+        except HttpError as e:
+            print(f"Error fetching uploads page for {channel_id}: {e}")
+            return None # None indicates API error
+
+    @retry_async()
+    async def get_videos(self, video_ids: List[str]) -> Optional[List[Video]]:
+        """Fresh stats for known video IDs (1 unit per 50), or None on API error."""
+        try:
+            return await self._get_classified(video_ids)
+        except HttpError as e:
+            print(f"Error fetching videos: {e}")
+            return None